@@ -38,6 +38,9 @@ def create_app(config_class=Config):
 
     migrate.init_app(app, db)
     jwt.init_app(app)
+
+    from .cli import register_commands
+    register_commands(app)
     
     # Asegurar que existe la carpeta de uploads
     import os
@@ -60,6 +63,7 @@ def create_app(config_class=Config):
     from .routes.profile import profile_bp
     from .routes.community import community_bp
     from .routes.admin import admin_bp
+    from .routes.sync import sync_bp
 
     @app.route('/')
     def index():
@@ -79,6 +83,7 @@ def create_app(config_class=Config):
     app.register_blueprint(profile_bp, url_prefix='/api/profile')
     app.register_blueprint(community_bp, url_prefix='/api/community')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(sync_bp, url_prefix='/api/sync')
 
     @app.errorhandler(Exception)
     def handle_exception(e):
@@ -0,0 +1,142 @@
+import click
+from flask.cli import AppGroup
+
+analytics_cli = AppGroup('analytics', help='Mantenimiento de las tablas derivadas de analíticas.')
+gamification_cli = AppGroup('gamification', help='Mantenimiento de contadores y logros de gamificación.')
+
+
+@analytics_cli.command('rebuild-rollups')
+@click.option('--user-id', type=int, default=None, help='Reconstruir solo este usuario.')
+def rebuild_rollups_command(user_id):
+    """Reconstruye el rollup diario de entrenamiento desde el historial."""
+    from .utils.rollups import rebuild_rollups
+    from .utils.versioning import bump_all_data_versions
+    created = rebuild_rollups(user_id)
+    bump_all_data_versions(user_id)
+    click.echo(f"✅ Rollup diario reconstruido ({created} filas).")
+
+
+@analytics_cli.command('rebuild-records')
+@click.option('--user-id', type=int, default=None, help='Reconstruir solo este usuario.')
+def rebuild_records_command(user_id):
+    """Recalcula el índice de récords personales desde el historial."""
+    from .utils.records import rebuild_personal_records
+    from .utils.versioning import bump_all_data_versions
+    count = rebuild_personal_records(user_id)
+    bump_all_data_versions(user_id)
+    click.echo(f"✅ Récords personales reconstruidos ({count} ejercicios).")
+
+
+@analytics_cli.command('rebuild-load')
+@click.option('--user-id', type=int, default=None, help='Reconstruir solo este usuario.')
+def rebuild_load_command(user_id):
+    """Recalcula la carga aguda/crónica (ACWR) desde el rollup diario."""
+    from .utils.training_load import rebuild_training_load
+    from .utils.versioning import bump_all_data_versions
+    count = rebuild_training_load(user_id)
+    bump_all_data_versions(user_id)
+    click.echo(f"✅ Carga de entrenamiento reconstruida ({count} series).")
+
+
+@analytics_cli.command('rebuild-cohorts')
+def rebuild_cohorts_command():
+    """Recalcula los histogramas de percentiles por cohorte desde el índice de récords."""
+    from .utils.cohorts import rebuild_cohort_histograms
+    count = rebuild_cohort_histograms()
+    click.echo(f"✅ Histogramas de cohortes reconstruidos ({count} cohortes).")
+
+
+@analytics_cli.command('rebuild-calendar')
+@click.option('--user-id', type=int, default=None, help='Reconstruir solo este usuario.')
+def rebuild_calendar_command(user_id):
+    """Recalcula los bitsets de días entrenados y las rachas desde las sesiones finalizadas."""
+    from .utils.training_calendar import rebuild_training_calendars
+    from .utils.versioning import bump_all_data_versions
+    count = rebuild_training_calendars(user_id)
+    bump_all_data_versions(user_id)
+    click.echo(f"✅ Calendarios de entrenamiento reconstruidos ({count} usuarios).")
+
+
+@analytics_cli.command('archive-logs')
+@click.option('--older-than-days', type=int, default=None, help='Antigüedad mínima (por defecto LOG_ARCHIVE_AFTER_DAYS).')
+@click.option('--user-id', type=int, default=None, help='Archivar solo este usuario.')
+def archive_logs_command(older_than_days, user_id):
+    """Mueve las series de sesiones finalizadas antiguas al almacenamiento frío (.npz)."""
+    from .utils.archive import archive_old_logs
+    users, sessions, sets = archive_old_logs(older_than_days, user_id)
+    click.echo(f"✅ Archivadas {sets} series de {sessions} sesiones ({users} usuarios).")
+
+
+@analytics_cli.command('backfill-log-owners')
+def backfill_log_owners_command():
+    """Copia user_id y training_date de la sesión a las series antiguas que no los tienen."""
+    from .utils.db_sync import backfill_log_owners
+    filled = backfill_log_owners()
+    click.echo(f"✅ {filled} series completadas con usuario y fecha de entrenamiento.")
+
+
+@analytics_cli.command('backfill-session-summaries')
+def backfill_session_summaries_command():
+    """Calcula el resumen de las sesiones finalizadas que no lo tienen, también las archivadas."""
+    from .utils.db_sync import backfill_session_summaries
+    live, archived = backfill_session_summaries()
+    click.echo(f"✅ {live + archived} sesiones completadas con su resumen ({archived} archivadas).")
+
+
+@analytics_cli.command('prune-reports')
+def prune_reports_command():
+    """Borra los trabajos de informe caducados y los PDF que ya no usa ningún trabajo."""
+    from .utils.reports import prune_reports
+    jobs, files = prune_reports()
+    click.echo(f"✅ Informes limpiados ({jobs} trabajos, {files} ficheros).")
+
+
+@gamification_cli.command('reconcile-stats')
+@click.option('--user-id', type=int, default=None, help='Reconciliar solo este usuario.')
+def reconcile_stats_command(user_id):
+    """Recalcula los contadores de user_stats desde las tablas y corrige las desviaciones."""
+    from .utils.user_stats import reconcile_user_stats
+    created, repaired = reconcile_user_stats(user_id)
+    click.echo(f"✅ Contadores reconciliados ({created} creados, {repaired} corregidos).")
+
+
+@gamification_cli.command('recompute')
+@click.option('--workers', type=int, default=None, help='Procesos en paralelo (por defecto hasta 4).')
+@click.option('--chunk-size', type=int, default=1000, show_default=True, help='Usuarios por lote.')
+@click.option('--restart', is_flag=True, help='Empezar de cero en lugar de continuar el último recálculo interrumpido.')
+@click.option('--dry-run', is_flag=True, help='Calcular y contar los cambios sin escribirlos.')
+def recompute_command(workers, chunk_size, restart, dry_run):
+    """Recalcula XP, nivel, rachas, contadores y logros de todos los usuarios desde el historial."""
+    from .utils.recompute import run_recompute
+
+    def progress(processed, total, changed):
+        click.echo(f"⏳ {processed}/{total} usuarios ({changed} con cambios)")
+
+    run, unlocked = run_recompute(workers, chunk_size, restart, dry_run, progress)
+    verb = 'cambiarían' if dry_run else 'actualizados'
+    click.echo(f"✅ Recálculo #{run.id} completado: {run.processed} usuarios, {run.changed} {verb}, {unlocked} logros nuevos.")
+
+
+@gamification_cli.command('drain-events')
+@click.option('--older-than-seconds', type=int, default=0, show_default=True, help='Solo los pendientes con al menos esta antigüedad.')
+def drain_events_command(older_than_seconds):
+    """Evalúa ahora los eventos de logros que quedaron pendientes (p. ej. tras un reinicio)."""
+    from .utils.notifications import stale_event_ids, run_pending_event
+    pending = stale_event_ids(older_than_seconds)
+    for pending_id in pending:
+        run_pending_event(pending_id)
+    click.echo(f"✅ {len(pending)} eventos de logros evaluados.")
+
+
+@gamification_cli.command('prune-xp-events')
+def prune_xp_events_command():
+    """Borra los xp_events anteriores a la semana y el mes en curso."""
+    from .utils.leaderboard import prune_xp_events
+    deleted = prune_xp_events()
+    click.echo(f"✅ {deleted} eventos de XP antiguos borrados.")
+
+
+def register_commands(app):
+    """Registra los grupos de comandos `flask <grupo> <comando>`."""
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(gamification_cli)
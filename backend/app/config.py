@@ -45,5 +45,41 @@ class Config:
     
     SQLALCHEMY_ENGINE_OPTIONS["connect_args"] = connect_args
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Informes en segundo plano (caché de PDFs en disco)
+    REPORTS_CACHE_DIR = os.environ.get('REPORTS_CACHE_DIR')
+    REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', 2))
+    # Horas que se guardan los trabajos de informe (y sus PDF) antes de limpiarlos
+    REPORT_JOB_TTL_HOURS = int(os.environ.get('REPORT_JOB_TTL_HOURS', 24))
+    
+    # Almacenamiento frío: series de sesiones finalizadas más antiguas que N días en ficheros .npz
+    LOG_ARCHIVE_DIR = os.environ.get('LOG_ARCHIVE_DIR')
+    LOG_ARCHIVE_AFTER_DAYS = int(os.environ.get('LOG_ARCHIVE_AFTER_DAYS', 365))
+    
+    # Sincronización offline: el cursor del pull va este margen por detrás del reloj
+    SYNC_CURSOR_LAG_SECONDS = int(os.environ.get('SYNC_CURSOR_LAG_SECONDS', 30))
+    
+    # Caché de resultados de analíticas (LRU en proceso o Redis compartido si hay URL)
+    ANALYTICS_CACHE_ENABLED = os.environ.get('ANALYTICS_CACHE_ENABLED', '1') != '0'
+    ANALYTICS_CACHE_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL', 300))
+    ANALYTICS_CACHE_MAX_ENTRIES = int(os.environ.get('ANALYTICS_CACHE_MAX_ENTRIES', 2048))
+    ANALYTICS_CACHE_REDIS_URL = os.environ.get('ANALYTICS_CACHE_REDIS_URL')
+    # Endpoints sin caché, separados por comas (p.ej. "heatmap,dashboard") para depurar
+    ANALYTICS_CACHE_DISABLED = {e.strip() for e in os.environ.get('ANALYTICS_CACHE_DISABLED', '').split(',') if e.strip()}
+
+    # Instantáneas de comunidad (feed y perfiles públicos): frescas TTL segundos y
+    # servidas caducadas STALE segundos más mientras se recalculan; Redis las comparte entre workers
+    COMMUNITY_CACHE_ENABLED = os.environ.get('COMMUNITY_CACHE_ENABLED', '1') != '0'
+    COMMUNITY_CACHE_TTL = int(os.environ.get('COMMUNITY_CACHE_TTL', 30))
+    COMMUNITY_CACHE_STALE_SECONDS = int(os.environ.get('COMMUNITY_CACHE_STALE_SECONDS', 120))
+    COMMUNITY_CACHE_LOCK_SECONDS = int(os.environ.get('COMMUNITY_CACHE_LOCK_SECONDS', 10))
+    COMMUNITY_CACHE_MAX_ENTRIES = int(os.environ.get('COMMUNITY_CACHE_MAX_ENTRIES', 1024))
+    COMMUNITY_CACHE_REDIS_URL = os.environ.get('COMMUNITY_CACHE_REDIS_URL') or ANALYTICS_CACHE_REDIS_URL
+
+    # Clasificación en memoria: lee los xp_events nuevos como mucho cada N segundos y se
+    # reconstruye entera cada LEADERBOARD_REBUILD_SECONDS (recoge bajas y correcciones)
+    LEADERBOARD_REFRESH_SECONDS = int(os.environ.get('LEADERBOARD_REFRESH_SECONDS', 2))
+    LEADERBOARD_REBUILD_SECONDS = int(os.environ.get('LEADERBOARD_REBUILD_SECONDS', 600))
+    LEADERBOARD_SYNC_LAG_SECONDS = int(os.environ.get('LEADERBOARD_SYNC_LAG_SECONDS', 30))
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
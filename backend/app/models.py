@@ -6,7 +6,8 @@ from werkzeug.security import generate_password_hash, check_password_hash
 followers = db.Table('followers',
     db.Column('follower_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
     db.Column('followed_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
-    db.Column('created_at', db.DateTime, default=datetime.utcnow)
+    db.Column('created_at', db.DateTime, default=datetime.utcnow),
+    db.Index('ix_followers_followed', 'followed_id')
 )
 
 class User(db.Model):
@@ -18,7 +19,7 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Gamificación
-    xp = db.Column(db.Integer, default=0)
+    xp = db.Column(db.Integer, default=0, index=True)
     level = db.Column(db.Integer, default=1)
     coins = db.Column(db.Integer, default=0)
 
@@ -44,6 +45,9 @@ class User(db.Model):
     trainer_note = db.Column(db.String(255), default=None)
     trainer_note_date = db.Column(db.DateTime, default=None)
 
+    # Versión de datos: se incrementa en cada escritura del usuario (ETags / cachés)
+    data_version = db.Column(db.BigInteger, nullable=False, default=0)
+
     routines = db.relationship('Routine', backref='author', lazy='dynamic', cascade='all, delete-orphan')
     sessions = db.relationship('WorkoutSession', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     achievements = db.relationship('UserAchievement', backref='user', lazy='dynamic', cascade='all, delete-orphan')
@@ -61,9 +65,20 @@ class User(db.Model):
     
     # Nuevas relaciones para asegurar el borrado completo
     likes = db.relationship('RoutineLike', backref='user_who_liked', cascade='all, delete-orphan')
-    saved_routines = db.relationship('SavedRoutine', backref='user_who_saved', cascade='all, delete-orphan')
+    saved_routines = db.relationship('SavedRoutine', backref='user_who_saved', cascade='all, delete-orphan', foreign_keys='SavedRoutine.user_id')
     body_metrics = db.relationship('BodyMetric', backref='user', cascade='all, delete-orphan')
     routine_reviews_list = db.relationship('RoutineReview', backref='reviewer', cascade='all, delete-orphan')
+    training_rollups = db.relationship('DailyTrainingRollup', backref='user', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    personal_records = db.relationship('PersonalRecord', backref='user', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    cohort_samples = db.relationship('CohortSample', backref='user', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    training_load = db.relationship('TrainingLoadState', backref='user', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    training_calendars = db.relationship('TrainingCalendar', backref='user', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    report_jobs = db.relationship('ReportJob', backref='user', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    log_archives = db.relationship('LogArchive', backref='user', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    sync_tombstones = db.relationship('SyncTombstone', backref='user', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    notifications = db.relationship('Notification', backref='user', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    stats = db.relationship('UserStats', backref='user', uselist=False, cascade='all, delete-orphan', passive_deletes=True)
+    xp_events = db.relationship('XpEvent', backref='user', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -74,36 +89,46 @@ class User(db.Model):
     def add_xp(self, amount):
         """Añadir XP aplicando multiplicadores si existen"""
         final_xp = amount
+        multiplier = 1.0
         if self.xp_booster_sessions > 0:
-            final_xp = int(amount * self.xp_booster_multiplier)
+            multiplier = self.xp_booster_multiplier
+            final_xp = int(amount * multiplier)
             self.xp_booster_sessions -= 1
             if self.xp_booster_sessions == 0:
                 self.xp_booster_multiplier = 1.0
 
+        res = self.add_reward_xp(final_xp)
+        res['multiplier'] = multiplier
+        return res
+
+    def add_reward_xp(self, amount):
+        """Añadir XP sin potenciador (recompensas de logros) recalculando nivel y monedas de subida"""
         if self.xp is None: self.xp = 0
         if self.level is None: self.level = 1
         if self.coins is None: self.coins = 0
         
-        self.xp += final_xp
+        self.xp += amount
         
         # Recalcular nivel basado siempre en la XP total para evitar errores
         correct_level = self.calculate_level()
         
-        res = {'level_up': False, 'applied_xp': final_xp}
+        res = {'level_up': False, 'applied_xp': amount, 'multiplier': 1.0}
         
         if correct_level > (self.level or 1):
             levels_gained = correct_level - (self.level or 1)
             self.level = correct_level
-            if self.coins is None: self.coins = 0
             self.coins += levels_gained * 10
             res.update({'level_up': True, 'new_level': correct_level, 'coins_earned': levels_gained * 10})
         
         return res
     
     def calculate_level(self):
+        return User.level_for_xp(self.xp)
+    
+    @staticmethod
+    def level_for_xp(xp):
         import math
-        current_xp = self.xp if self.xp is not None else 0
-        return int(math.sqrt(current_xp / 100)) + 1
+        return int(math.sqrt((xp or 0) / 100)) + 1
     
     def xp_for_next_level(self):
         current_level = self.level if self.level is not None else 1
@@ -134,6 +159,11 @@ class User(db.Model):
             if self.use_streak_shield():
                 self.current_streak = (self.current_streak or 0) + 1
                 shield_used = True
+                if self.last_workout_date:
+                    # Marcar en el calendario los días que cubre el escudo
+                    from .utils.training_calendar import mark_days
+                    gap = (yesterday - self.last_workout_date).days
+                    mark_days(self.id, [yesterday - timedelta(days=i) for i in range(gap)], shielded=True)
             else:
                 self.current_streak = 1
 
@@ -171,6 +201,12 @@ class Routine(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_public = db.Column(db.Boolean, default=False)
     music_url = db.Column(db.String(500), default=None) # URL de Spotify o YouTube
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Sincronización offline
+    __table_args__ = (
+        db.Index('ix_routines_public_created', 'is_public', 'created_at'),
+        db.Index('ix_routines_user_public', 'user_id', 'is_public'),
+        db.Index('ix_routines_user_updated', 'user_id', 'updated_at'),
+    )
 
     exercises = db.relationship('RoutineExercise', backref='routine', cascade='all, delete-orphan')
     likes = db.relationship('RoutineLike', backref='routine', cascade='all, delete-orphan')
@@ -205,19 +241,187 @@ class WorkoutSession(db.Model):
     routine_id = db.Column(db.Integer, db.ForeignKey('routines.id', ondelete='SET NULL'), nullable=True, index=True)
     start_time = db.Column(db.DateTime, default=datetime.utcnow)
     end_time = db.Column(db.DateTime)
+    archived = db.Column(db.Boolean, default=False, nullable=False)  # Sus series están en un fichero de archivo
+    # Sincronización offline: última modificación y clave de idempotencia de las sesiones creadas sin conexión
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    client_key = db.Column(db.String(64), nullable=True)
+    # Resumen calculado al finalizar (NULL en sesiones abiertas): el historial no relee las series
+    total_volume = db.Column(db.Float)
+    set_count = db.Column(db.Integer)
+    exercise_count = db.Column(db.Integer)
+    duration_seconds = db.Column(db.Integer)
+    # Multiplicador de XP (potenciador) aplicado al finalizar: permite recalcular la XP desde el historial
+    xp_multiplier = db.Column(db.Float)
+    __table_args__ = (
+        db.Index('ix_sessions_user_start', 'user_id', 'start_time'),
+        db.Index('ix_sessions_user_updated', 'user_id', 'updated_at'),
+        db.UniqueConstraint('user_id', 'client_key', name='uq_sessions_user_client_key'),
+    )
     
     logs = db.relationship('WorkoutLog', backref='session', cascade='all, delete-orphan')
+    detail = db.relationship('SessionDetail', backref='session', uselist=False, cascade='all, delete-orphan', passive_deletes=True)
+
+class SessionDetail(db.Model):
+    """
+    Detalle ya serializado (JSON) de una sesión finalizada y su ETag. Se genera en la primera
+    visita y solo se descarta si la sesión se edita después de finalizarla.
+    """
+    __tablename__ = 'session_details'
+    session_id = db.Column(db.Integer, db.ForeignKey('workout_sessions.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    payload = db.Column(db.LargeBinary(16777215), nullable=False)  # MEDIUMBLOB en MySQL
+    etag = db.Column(db.String(40), nullable=False)  # SHA-1 del payload
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class WorkoutLog(db.Model):
     __tablename__ = 'workout_logs'
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey('workout_sessions.id'), nullable=False, index=True)
     exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id'), nullable=False, index=True)
+    # Copias de la sesión (dueño y día de entrenamiento) para filtrar sin unir con workout_sessions
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    training_date = db.Column(db.Date, nullable=True)
     set_number = db.Column(db.Integer, nullable=False)
     weight = db.Column(db.Float)
     reps = db.Column(db.Integer)
     rpe = db.Column(db.Integer)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    # Clave de idempotencia generada por el cliente (registro por lotes): un reintento no duplica la serie
+    client_key = db.Column(db.String(64), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Sincronización offline
+    __table_args__ = (
+        db.UniqueConstraint('session_id', 'client_key', name='uq_logs_session_client_key'),
+        db.Index('ix_logs_user_updated', 'user_id', 'updated_at'),
+        # Cubre los agregados por sesión (volumen, ejercicios únicos) sin leer la fila
+        db.Index('ix_logs_session_exercise', 'session_id', 'exercise_id', 'weight', 'reps'),
+        db.Index('ix_logs_exercise_timestamp', 'exercise_id', 'timestamp'),
+        # Progresión de un ejercicio del usuario e historial por rango de fechas
+        db.Index('ix_logs_user_exercise_timestamp', 'user_id', 'exercise_id', 'timestamp'),
+        db.Index('ix_logs_user_date', 'user_id', 'training_date'),
+    )
+
+class DailyTrainingRollup(db.Model):
+    """
+    Agregado diario por usuario y ejercicio, mantenido en escritura (log_set / finish_session).
+    Las filas con exercise_id = DAY_TOTAL (0) guardan el total del día (sesiones completadas).
+    Es 0 y no NULL para que la clave única también las cubra (MySQL no iguala los NULL), y
+    por eso la columna no tiene clave foránea.
+    """
+    __tablename__ = 'daily_training_rollups'
+    DAY_TOTAL = 0
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    exercise_id = db.Column(db.Integer, nullable=False, default=0)
+    set_count = db.Column(db.Integer, nullable=False, default=0)
+    total_reps = db.Column(db.Integer, nullable=False, default=0)
+    total_volume = db.Column(db.Float, nullable=False, default=0)
+    best_e1rm = db.Column(db.Float, nullable=False, default=0)
+    session_count = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', 'exercise_id', name='uq_rollup_day_exercise'),
+        db.Index('ix_rollup_user_day', 'user_id', 'day'),
+    )
+
+class PersonalRecord(db.Model):
+    """Récords personales por usuario y ejercicio, actualizados en O(1) al registrar cada serie."""
+    __tablename__ = 'personal_records'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id'), primary_key=True)
+    # Mejor 1RM estimado y la serie que lo produjo
+    best_e1rm = db.Column(db.Float, nullable=False, default=0)
+    best_e1rm_weight = db.Column(db.Float)
+    best_e1rm_reps = db.Column(db.Integer)
+    best_e1rm_date = db.Column(db.DateTime)
+    # Mayor peso levantado
+    max_weight = db.Column(db.Float, nullable=False, default=0)
+    max_weight_reps = db.Column(db.Integer)
+    max_weight_date = db.Column(db.DateTime)
+    # Más repeticiones en una serie (y con qué peso)
+    max_reps = db.Column(db.Integer, nullable=False, default=0)
+    max_reps_weight = db.Column(db.Float)
+    max_reps_date = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    exercise = db.relationship('Exercise')
+
+class CohortBin(db.Model):
+    """
+    Una cubeta del histograma del mejor 1RM estimado por ejercicio y cohorte (franja de nivel y
+    clase de peso corporal), ver utils/cohorts.py. Una fila por cubeta para que cada escritura
+    sea un incremento atómico de su contador y no bloquee el histograma entero.
+    """
+    __tablename__ = 'cohort_bins'
+    exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id'), primary_key=True)
+    level_band = db.Column(db.Integer, primary_key=True)
+    weight_class = db.Column(db.Integer, primary_key=True)  # -1 = sin peso corporal registrado
+    bin = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class CohortSample(db.Model):
+    """Valor con el que cada usuario cuenta en un histograma, para poder retirarlo al batir su récord."""
+    __tablename__ = 'cohort_samples'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id'), primary_key=True)
+    level_band = db.Column(db.Integer, nullable=False)
+    weight_class = db.Column(db.Integer, nullable=False)
+    e1rm = db.Column(db.Float, nullable=False)
+
+class TrainingLoadState(db.Model):
+    """
+    Estado EWMA de carga de entrenamiento (aguda 7 días / crónica 28 días) por usuario y grupo muscular.
+    Se avanza en O(1) al finalizar cada sesión. muscle_group 'Total' agrega todos los grupos.
+    """
+    __tablename__ = 'training_load_states'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    muscle_group = db.Column(db.String(50), primary_key=True)
+    acute = db.Column(db.Float, nullable=False, default=0)
+    chronic = db.Column(db.Float, nullable=False, default=0)
+    last_load = db.Column(db.Float, nullable=False, default=0)  # Carga acumulada de last_day
+    last_day = db.Column(db.Date)
+
+class TrainingCalendar(db.Model):
+    """
+    Días entrenados de un usuario en un año como bitset de 366 bits (bit i = día del año i+1,
+    el menos significativo de cada byte primero). shielded marca los días cubiertos por un
+    escudo de racha, para que las rachas se puedan recalcular desde los bits.
+    """
+    __tablename__ = 'training_calendars'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    days = db.Column(db.LargeBinary(46), nullable=False)
+    shielded = db.Column(db.LargeBinary(46), nullable=False)
+    day_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ReportJob(db.Model):
+    """Trabajo de generación de informes en segundo plano (visible desde cualquier worker)."""
+    __tablename__ = 'report_jobs'
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False, default='pdf')
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'done', 'failed'
+    cache_key = db.Column(db.String(64))  # Huella del historial (último log) con la que se generó
+    file_path = db.Column(db.String(255))
+    error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class LogArchive(db.Model):
+    """
+    Manifiesto del almacenamiento frío: cada fila es un fichero .npz con las series de
+    sesiones finalizadas antiguas de un usuario, ya borradas de workout_logs.
+    """
+    __tablename__ = 'log_archives'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    file_path = db.Column(db.String(500), nullable=False)
+    first_day = db.Column(db.Date, nullable=False)
+    last_day = db.Column(db.Date, nullable=False)
+    session_count = db.Column(db.Integer, nullable=False, default=0)
+    set_count = db.Column(db.Integer, nullable=False, default=0)
+    size_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class BodyMetric(db.Model):
     __tablename__ = 'body_metrics'
@@ -230,6 +434,23 @@ class BodyMetric(db.Model):
     waist_cm = db.Column(db.Float) # Cintura
     chest_cm = db.Column(db.Float) # Pecho
     leg_cm = db.Column(db.Float)   # Piernas
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Sincronización offline
+    __table_args__ = (
+        db.Index('ix_body_metrics_user_date', 'user_id', 'date'),
+        db.Index('ix_body_metrics_user_updated', 'user_id', 'updated_at'),
+    )
+
+class SyncTombstone(db.Model):
+    """Registro de un borrado para que la sincronización offline lo propague a los clientes."""
+    __tablename__ = 'sync_tombstones'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    entity = db.Column(db.String(20), nullable=False)  # 'routine', 'session', 'log', 'body_metric'
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    __table_args__ = (
+        db.Index('ix_tombstones_user_deleted', 'user_id', 'deleted_at'),
+    )
 
 # Sistema de Logros/Achievements
 class Achievement(db.Model):
@@ -249,10 +470,85 @@ class UserAchievement(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     achievement_id = db.Column(db.Integer, db.ForeignKey('achievements.id'), nullable=False)
     unlocked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        # Un logro se desbloquea una sola vez: las evaluaciones concurrentes insertan con IGNORE
+        db.UniqueConstraint('user_id', 'achievement_id', name='uq_user_achievements_user_achievement'),
+    )
     
     # La relación 'user' ya está definida por el backref en User.achievements
     achievement = db.relationship('Achievement') # Esta sí es necesaria porque Achievement no tiene backref
 
+class PendingAchievementEvent(db.Model):
+    """
+    Evento de gamificación encolado para evaluarse en segundo plano. Se borra al evaluarlo:
+    los que quedan (reinicio del worker a medias) se vuelven a encolar, ver utils/notifications.py.
+    """
+    __tablename__ = 'pending_achievement_events'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    event = db.Column(db.String(30), nullable=False)
+    values = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class Notification(db.Model):
+    """Aviso para el usuario generado fuera de la petición (p. ej. logros evaluados en diferido)."""
+    __tablename__ = 'notifications'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(30), nullable=False)  # 'achievement'
+    data = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    read_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('ix_notifications_user_read', 'user_id', 'read_at'),
+    )
+
+class UserStats(db.Model):
+    """
+    Contadores del usuario mantenidos en la misma transacción que cada escritura, para no
+    agregar con COUNT(*) en perfiles, follows y logros. `flask gamification reconcile-stats`
+    los recalcula desde las tablas y corrige cualquier desviación.
+    """
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    sessions_count = db.Column(db.Integer, nullable=False, default=0)  # Sesiones finalizadas
+    routines_count = db.Column(db.Integer, nullable=False, default=0)
+    following_count = db.Column(db.Integer, nullable=False, default=0)
+    followers_count = db.Column(db.Integer, nullable=False, default=0)
+    reviews_count = db.Column(db.Integer, nullable=False, default=0)
+    saves_count = db.Column(db.Integer, nullable=False, default=0)
+    likes_received_count = db.Column(db.Integer, nullable=False, default=0)
+    likes_given_count = db.Column(db.Integer, nullable=False, default=0)
+
+class RecomputeRun(db.Model):
+    """
+    Ejecución de `flask gamification recompute`. last_user_id es el punto de reanudación:
+    todos los usuarios con id <= last_user_id ya están recalculados.
+    """
+    __tablename__ = 'recompute_runs'
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='running')  # 'running', 'done'
+    dry_run = db.Column(db.Boolean, nullable=False, default=False)
+    last_user_id = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    changed = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class XpEvent(db.Model):
+    """
+    XP ganada (o corregida por el recálculo) por un usuario. Las clasificaciones semanal y
+    mensual suman estas filas (sin las correcciones) y cada proceso las lee para mantener la
+    suya al día. Las anteriores a la semana y el mes en curso se purgan (prune_xp_events).
+    """
+    __tablename__ = 'xp_events'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    amount = db.Column(db.Integer, nullable=False)
+    source = db.Column(db.String(20), nullable=False)  # 'session', 'achievement', 'recompute'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
 # Tienda de Premios
 class ShopItem(db.Model):
     __tablename__ = 'shop_items'
@@ -285,7 +581,10 @@ class RoutineLike(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     routine_id = db.Column(db.Integer, db.ForeignKey('routines.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    __table_args__ = (db.UniqueConstraint('user_id', 'routine_id', name='uq_like'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'routine_id', name='uq_like'),
+        db.Index('ix_routine_likes_routine', 'routine_id'),
+    )
 
 
 class SavedRoutine(db.Model):
@@ -296,4 +595,5 @@ class SavedRoutine(db.Model):
     original_routine_id = db.Column(db.Integer, db.ForeignKey('routines.id'), nullable=False)
     saved_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_assigned = db.Column(db.Boolean, default=False) # True si la asignó un coach
+    assigned_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True, index=True)  # Coach que la asignó
     __table_args__ = (db.UniqueConstraint('user_id', 'original_routine_id', name='uq_save'),)
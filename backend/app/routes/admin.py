@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models import User, db
+from ..utils.versioning import bump_data_version
 from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__)
@@ -125,9 +126,18 @@ def delete_user(user_id):
         if not user:
             return jsonify({"msg": "Usuario no encontrado"}), 404
             
-        db.session.delete(user)
+        from ..utils.user_stats import remove_user
+        remove_user(user)
         db.session.commit()
         
+        # Sus rutinas y likes salen del feed; los contadores de seguidores de otros perfiles cambian
+        from ..utils.cache import community_cache
+        community_cache.invalidate('feed')
+        community_cache.invalidate('profile')
+        
+        from ..utils.archive import remove_user_archives
+        remove_user_archives(user_id)
+        
         return jsonify({"msg": "Usuario eliminado correctamente"}), 200
     except Exception as e:
         db.session.rollback()
@@ -171,24 +181,21 @@ def get_client_stats(client_id):
         if not client:
             return jsonify({"msg": "Cliente no encontrado"}), 404
             
-        from ..models import WorkoutSession, WorkoutLog, Exercise
+        from ..models import WorkoutSession, Exercise, DailyTrainingRollup, PersonalRecord
         from sqlalchemy import func
         
         total_sessions = WorkoutSession.query.filter_by(user_id=client_id).count()
         
-        # Volumen total
-        total_volume = db.session.query(func.sum(WorkoutLog.weight * WorkoutLog.reps))\
-            .join(WorkoutSession)\
-            .filter(WorkoutSession.user_id == client_id).scalar() or 0
+        # Volumen total (totales diarios del rollup: incluyen las series archivadas)
+        total_volume = db.session.query(func.sum(DailyTrainingRollup.total_volume))\
+            .filter(DailyTrainingRollup.user_id == client_id, DailyTrainingRollup.exercise_id == DailyTrainingRollup.DAY_TOTAL).scalar() or 0
             
-        # Mejores levantamientos (PRs)
+        # Mejores levantamientos (PRs) desde el índice de récords
         # Necesitamos unir con Exercise para obtener el nombre
-        best_lifts = db.session.query(Exercise.name, func.max(WorkoutLog.weight))\
-            .join(WorkoutLog, WorkoutLog.exercise_id == Exercise.id)\
-            .join(WorkoutSession, WorkoutSession.id == WorkoutLog.session_id)\
-            .filter(WorkoutSession.user_id == client_id)\
-            .group_by(Exercise.name)\
-            .order_by(func.max(WorkoutLog.weight).desc())\
+        best_lifts = db.session.query(Exercise.name, PersonalRecord.max_weight)\
+            .join(PersonalRecord, PersonalRecord.exercise_id == Exercise.id)\
+            .filter(PersonalRecord.user_id == client_id)\
+            .order_by(PersonalRecord.max_weight.desc())\
             .limit(5).all()
 
         return jsonify({
@@ -249,6 +256,8 @@ def reward_user(client_id):
             return jsonify({"msg": "Cliente no encontrado"}), 404
             
         client.coins = (client.coins or 0) + amount
+        # Las monedas salen en el perfil, servido con ETag por versión de datos
+        bump_data_version(client_id)
         db.session.commit()
         
         return jsonify({"msg": f"Se han enviado {amount} monedas de recompensa"}), 200
@@ -293,14 +302,24 @@ def assign_routine(client_id):
             new_save = SavedRoutine(
                 user_id=client_id,
                 original_routine_id=routine_id,
-                is_assigned=True
+                is_assigned=True,
+                assigned_by=current_user_id
             )
             db.session.add(new_save)
-        else:
-            existing_save.is_assigned = True # Marcar como asignada aunque ya la tuviera
-            
+            from ..utils.user_stats import adjust_stats
+            adjust_stats(client_id, saves_count=1)
+        elif not existing_save.is_assigned:
+            # Marcar como asignada aunque ya la tuviera; si ya la asignó otro coach, sigue siendo suya
+            existing_save.is_assigned = True
+            existing_save.assigned_by = current_user_id
+        
+        bump_data_version(client_id)
         db.session.commit()
         
+        # Comprobar logros del coach (rutinas asignadas)
+        from ..utils.gamification import emit_event
+        emit_event(current_user_id, 'routine_assigned')
+        
         return jsonify({"msg": "Rutina asignada correctamente y añadida a la biblioteca del atleta"}), 200
     except Exception as e:
         db.session.rollback()
@@ -320,3 +339,17 @@ def clear_nudge():
     except Exception as e:
         db.session.rollback()
         return jsonify({"msg": "Error", "error": str(e)}), 500
+
+@admin_bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    """Contadores de las cachés de analíticas y de comunidad de este worker (aciertos, fallos, expulsiones)."""
+    try:
+        current_user_id = get_jwt_identity()
+        if not is_admin(current_user_id):
+            return jsonify({"msg": "No autorizado"}), 403
+        
+        from ..utils.cache import analytics_cache, community_cache
+        return jsonify({**analytics_cache.stats(), 'community': community_cache.stats()}), 200
+    except Exception as e:
+        return jsonify({"msg": "Error al obtener estadísticas de caché", "error": str(e)}), 500
@@ -1,20 +1,21 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, case
 from datetime import datetime, timedelta
-from ..models import WorkoutSession, WorkoutLog, Exercise, Routine, db
+from ..models import WorkoutSession, WorkoutLog, Exercise, Routine, DailyTrainingRollup, PersonalRecord, db
+from ..utils.versioning import etag_by_data_version
+from ..utils.cache import analytics_cache
+from ..utils.strength import FORMULAS, estimate_1rm, group_max
+from ..utils.history import history_rows
+from ..utils.archive import load_archived_logs, archived_rows
 from collections import defaultdict
 
 analytics_bp = Blueprint('analytics', __name__)
 
-def calculate_1rm(weight: float, reps: int) -> float:
-    """Calcula el 1RM usando la fórmula de Epley"""
-    if reps == 1:
-        return weight
-    return weight * (1 + reps / 30.0)
-
 @analytics_bp.route('/volume', methods=['GET'])
 @jwt_required()
+@etag_by_data_version
+@analytics_cache.cached('volume')
 def get_volume_analytics():
     """
     Retorna el volumen total por grupo muscular en un periodo de tiempo.
@@ -23,24 +24,17 @@ def get_volume_analytics():
     user_id = get_jwt_identity()
     days = request.args.get('days', 30, type=int)
     
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    # Obtener sesiones del usuario en el periodo
-    sessions = WorkoutSession.query.filter(
-        WorkoutSession.user_id == user_id,
-        WorkoutSession.start_time >= start_date
-    ).all()
-    
-    session_ids = [s.id for s in sessions]
+    start_day = (datetime.utcnow() - timedelta(days=days)).date()
     
-    # Calcular volumen por grupo muscular
+    # Calcular volumen por grupo muscular desde el rollup diario
     volume_by_muscle = db.session.query(
         Exercise.muscle_group,
-        func.sum(WorkoutLog.weight * WorkoutLog.reps).label('total_volume')
+        func.sum(DailyTrainingRollup.total_volume).label('total_volume')
     ).join(
-        WorkoutLog, WorkoutLog.exercise_id == Exercise.id
+        DailyTrainingRollup, DailyTrainingRollup.exercise_id == Exercise.id
     ).filter(
-        WorkoutLog.session_id.in_(session_ids)
+        DailyTrainingRollup.user_id == user_id,
+        DailyTrainingRollup.day >= start_day
     ).group_by(
         Exercise.muscle_group
     ).all()
@@ -55,171 +49,309 @@ def get_volume_analytics():
     
     return jsonify(result), 200
 
+def _requested_formula():
+    """Fórmula de 1RM pedida por query param (?formula=epley|brzycki|lombardi|rpe)."""
+    formula = request.args.get('formula', 'epley').lower()
+    return formula if formula in FORMULAS else None
+
+def _daily_progression(user_id, exercise_ids, start_date, formula):
+    """
+    Máximo 1RM estimado por día de varios ejercicios con una sola consulta agrupada
+    (más las series archivadas). Devuelve {exercise_id: (días, valores)}.
+    """
+    import numpy as np
+    
+    logs = db.session.query(
+        WorkoutLog.exercise_id,
+        WorkoutLog.timestamp,
+        WorkoutLog.weight,
+        WorkoutLog.reps,
+        WorkoutLog.rpe
+    ).filter(
+        WorkoutLog.user_id == user_id,
+        WorkoutLog.exercise_id.in_(exercise_ids)
+    )
+    if start_date:
+        logs = logs.filter(WorkoutLog.timestamp >= start_date)
+    logs = logs.order_by(WorkoutLog.exercise_id, WorkoutLog.timestamp).all()
+    
+    # Series del almacenamiento frío (solo si la ventana llega a días archivados)
+    archived = [
+        (row['exercise_id'], row['timestamp'], row['weight'], row['reps'], row['rpe'])
+        for row in archived_rows(load_archived_logs(
+            user_id, start_date.date() if start_date else None, exercise_ids=exercise_ids
+        ))
+        if row['timestamp'] and (not start_date or row['timestamp'] >= start_date)
+    ]
+    if archived:
+        logs = sorted(archived + list(logs), key=lambda log: (log[0], log[1]))
+    
+    if not logs:
+        return {}
+    
+    # Calcular el 1RM de todas las series de una vez y quedarse con el máximo de cada día y ejercicio
+    ids, timestamps, weights, reps, rpes = zip(*logs)
+    estimated = estimate_1rm(weights, reps, rpes, formula=formula)
+    ids = np.array(ids)
+    days = np.array(timestamps, dtype='datetime64[D]')
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    ends = np.r_[starts[1:], len(ids)]
+    return {
+        int(ids[start]): group_max(days[start:end], estimated[start:end])
+        for start, end in zip(starts, ends)
+    }
+
 @analytics_bp.route('/progression/<int:exercise_id>', methods=['GET'])
 @jwt_required()
+@etag_by_data_version
+@analytics_cache.cached('progression')
 def get_exercise_progression(exercise_id):
     """
     Retorna la progresión de 1RM estimado de un ejercicio específico.
+    Query params: days (default 90), formula (default epley)
     """
     user_id = get_jwt_identity()
     days = request.args.get('days', 90, type=int)
     start_date = datetime.utcnow() - timedelta(days=days)
+    formula = _requested_formula()
+    if not formula:
+        return jsonify({"msg": f"Fórmula no soportada. Opciones: {', '.join(FORMULAS)}"}), 400
     
-    # Obtener todos los logs del ejercicio
-    logs = db.session.query(
-        WorkoutLog.timestamp,
-        WorkoutLog.weight,
-        WorkoutLog.reps
-    ).join(
-        WorkoutSession, WorkoutSession.id == WorkoutLog.session_id
-    ).filter(
-        WorkoutSession.user_id == user_id,
-        WorkoutLog.exercise_id == exercise_id,
-        WorkoutLog.timestamp >= start_date
-    ).order_by(WorkoutLog.timestamp).all()
-    
-    # Calcular 1RM para cada log y agrupar por día (tomar el máximo del día)
-    daily_1rm = defaultdict(float)
-    for log in logs:
-        date_key = log.timestamp.date().isoformat()
-        estimated_1rm = calculate_1rm(log.weight, log.reps)
-        daily_1rm[date_key] = max(daily_1rm[date_key], estimated_1rm)
+    series = _daily_progression(user_id, [exercise_id], start_date, formula)
+    if exercise_id not in series:
+        return jsonify([]), 200
     
+    days_trained, daily_1rm = series[exercise_id]
     progression = [
-        {"date": date, "estimated_1rm": round(max_1rm, 2)}
-        for date, max_1rm in sorted(daily_1rm.items())
+        {"date": str(day), "estimated_1rm": round(float(max_1rm), 2)}
+        for day, max_1rm in zip(days_trained, daily_1rm)
     ]
     
     return jsonify(progression), 200
 
+MAX_PROGRESSION_EXERCISES = 20
+DEFAULT_MAX_POINTS = 200
+MAX_POINTS_LIMIT = 1000
+
+@analytics_bp.route('/progression', methods=['GET'])
+@jwt_required()
+@etag_by_data_version
+@analytics_cache.cached('progression-multi')
+def get_multi_progression():
+    """
+    Progresión de 1RM estimado de varios ejercicios en una sola petición. Cada serie se
+    reduce en el servidor con LTTB a como mucho max_points puntos, conservando su forma.
+    Query params: exercise_ids (obligatorio, separados por comas), days (default 90; 0 = todo
+    el historial), max_points (default 200, máx. 1000), formula (default epley)
+    """
+    from ..utils.downsampling import lttb
+    
+    user_id = get_jwt_identity()
+    raw_ids = request.args.get('exercise_ids', '')
+    exercise_ids = list(dict.fromkeys(int(x) for x in raw_ids.split(',') if x.strip().isdigit()))
+    if not exercise_ids:
+        return jsonify({"msg": "Indica exercise_ids (p.ej. ?exercise_ids=1,2,3)"}), 400
+    if len(exercise_ids) > MAX_PROGRESSION_EXERCISES:
+        return jsonify({"msg": f"Máximo {MAX_PROGRESSION_EXERCISES} ejercicios por petición"}), 400
+    
+    days = request.args.get('days', 90, type=int)
+    start_date = datetime.utcnow() - timedelta(days=days) if days and days > 0 else None
+    max_points = min(max(request.args.get('max_points', DEFAULT_MAX_POINTS, type=int), 3), MAX_POINTS_LIMIT)
+    formula = _requested_formula()
+    if not formula:
+        return jsonify({"msg": f"Fórmula no soportada. Opciones: {', '.join(FORMULAS)}"}), 400
+    
+    names = dict(db.session.query(Exercise.id, Exercise.name).filter(Exercise.id.in_(exercise_ids)).all())
+    series = _daily_progression(user_id, exercise_ids, start_date, formula)
+    
+    result = []
+    for exercise_id in exercise_ids:
+        days_trained, daily_1rm = series.get(exercise_id, ([], []))
+        keep = lttb(days_trained.astype('int64'), daily_1rm, max_points) if len(days_trained) else []
+        result.append({
+            'exercise_id': exercise_id,
+            'exercise_name': names.get(exercise_id),
+            'total_points': len(days_trained),
+            'points': [
+                {"date": str(days_trained[i]), "estimated_1rm": round(float(daily_1rm[i]), 2)}
+                for i in keep
+            ]
+        })
+    
+    return jsonify(result), 200
+
+def _serialize_record(record, exercise):
+    """Formato público de un récord personal."""
+    return {
+        'exercise_id': exercise.id,
+        'exercise_name': exercise.name,
+        'muscle_group': exercise.muscle_group,
+        'estimated_1rm': round(record.best_e1rm, 2),
+        'weight': record.best_e1rm_weight,
+        'reps': record.best_e1rm_reps,
+        'date': record.best_e1rm_date.isoformat() if record.best_e1rm_date else None,
+        'max_weight': record.max_weight,
+        'max_weight_reps': record.max_weight_reps,
+        'max_reps': record.max_reps,
+        'max_reps_weight': record.max_reps_weight
+    }
+
 @analytics_bp.route('/personal-records', methods=['GET'])
 @jwt_required()
+@etag_by_data_version
+@analytics_cache.cached('personal-records')
 def get_personal_records():
     """
-    Detecta y retorna los récords personales (PRs) del usuario.
-    Un PR es el mayor 1RM estimado para cada ejercicio.
+    Retorna los récords personales (PRs) del usuario desde el índice de récords.
+    Un PR es el mayor 1RM estimado para cada ejercicio; se incluyen también
+    el mayor peso y el máximo de repeticiones.
+    Query params: formula (default epley). Con otra fórmula el mejor 1RM se
+    recalcula en bloque sobre todo el historial.
     """
+    import numpy as np
+    
     user_id = get_jwt_identity()
+    formula = _requested_formula()
+    if not formula:
+        return jsonify({"msg": f"Fórmula no soportada. Opciones: {', '.join(FORMULAS)}"}), 400
     
-    # Obtener todos los logs del usuario
-    logs = db.session.query(
-        Exercise.id,
-        Exercise.name,
-        Exercise.muscle_group,
-        WorkoutLog.weight,
-        WorkoutLog.reps,
-        WorkoutLog.timestamp
-    ).join(
-        WorkoutSession, WorkoutSession.id == WorkoutLog.session_id
-    ).join(
-        Exercise, Exercise.id == WorkoutLog.exercise_id
+    records = db.session.query(PersonalRecord, Exercise).join(
+        Exercise, Exercise.id == PersonalRecord.exercise_id
     ).filter(
-        WorkoutSession.user_id == user_id
+        PersonalRecord.user_id == user_id
     ).all()
     
-    # Calcular PRs por ejercicio
-    prs = {}
-    for log in logs:
-        exercise_id = log.id
-        estimated_1rm = calculate_1rm(log.weight, log.reps)
+    result = {exercise.id: _serialize_record(record, exercise) for record, exercise in records}
+    
+    if formula != 'epley' and result:
+        # El índice guarda Epley; para otra fórmula se evalúa todo el historial como un lote
+        logs = db.session.query(
+            WorkoutLog.exercise_id,
+            WorkoutLog.weight,
+            WorkoutLog.reps,
+            WorkoutLog.rpe,
+            WorkoutLog.timestamp
+        ).filter(
+            WorkoutLog.user_id == user_id
+        ).all()
+        logs += [
+            (row['exercise_id'], row['weight'], row['reps'], row['rpe'], row['timestamp'])
+            for row in archived_rows(load_archived_logs(user_id))
+        ]
         
-        if exercise_id not in prs or estimated_1rm > prs[exercise_id]['estimated_1rm']:
-            prs[exercise_id] = {
-                'exercise_id': exercise_id,
-                'exercise_name': log.name,
-                'muscle_group': log.muscle_group,
-                'estimated_1rm': round(estimated_1rm, 2),
-                'weight': log.weight,
-                'reps': log.reps,
-                'date': log.timestamp.isoformat()
-            }
-    
-    return jsonify(list(prs.values())), 200
+        exercise_ids, weights, reps, rpes, timestamps = zip(*logs)
+        estimated = estimate_1rm(weights, reps, rpes, formula=formula)
+        exercise_ids = np.array(exercise_ids)
+        
+        # Índice de la mejor serie de cada ejercicio: ordenar por (ejercicio, 1RM) y tomar el último de cada grupo
+        order = np.lexsort((estimated, exercise_ids))
+        last_of_group = np.r_[exercise_ids[order][1:] != exercise_ids[order][:-1], True]
+        for i in order[last_of_group]:
+            pr = result.get(int(exercise_ids[i]))
+            if pr:
+                pr.update({
+                    'estimated_1rm': round(float(estimated[i]), 2),
+                    'weight': weights[i],
+                    'reps': reps[i],
+                    'date': timestamps[i].isoformat()
+                })
+    
+    return jsonify(list(result.values())), 200
 
 @analytics_bp.route('/heatmap', methods=['GET'])
 @jwt_required()
+@etag_by_data_version
+@analytics_cache.cached('heatmap')
 def get_training_heatmap():
     """
     Retorna un mapa de frecuencia de entrenamiento (días entrenados).
-    Query params: days (default 365)
+    Query params: days (default 365), format (list | bitmap)
+    Con format=bitmap devuelve el bitset de cada año en base64, los días entrenados
+    y las rachas, leídos del calendario sin recorrer sesiones ni rollups.
     """
     user_id = get_jwt_identity()
     days = request.args.get('days', 365, type=int)
     start_date = datetime.utcnow() - timedelta(days=days)
     
-    # Obtener sesiones agrupadas por fecha
-    sessions = db.session.query(
-        func.date(WorkoutSession.start_time).label('date'),
-        func.count(WorkoutSession.id).label('session_count')
-    ).filter(
-        WorkoutSession.user_id == user_id,
-        WorkoutSession.start_time >= start_date
-    ).group_by(
-        func.date(WorkoutSession.start_time)
-    ).all()
+    if request.args.get('format') == 'bitmap':
+        from ..utils.training_calendar import calendar_bitmap
+        return jsonify(calendar_bitmap(int(user_id), start_date.date(), datetime.utcnow().date())), 200
+    
+    # Días entrenados desde las filas de total diario del rollup
+    days_trained = DailyTrainingRollup.query.filter(
+        DailyTrainingRollup.user_id == user_id,
+        DailyTrainingRollup.exercise_id == DailyTrainingRollup.DAY_TOTAL,
+        DailyTrainingRollup.day >= start_date.date(),
+        DailyTrainingRollup.session_count > 0
+    ).order_by(DailyTrainingRollup.day).all()
     
     heatmap = [
         {
-            "date": session.date.isoformat(),
-            "count": session.session_count
+            "date": row.day.isoformat(),
+            "count": row.session_count
         }
-        for session in sessions
+        for row in days_trained
     ]
     
     return jsonify(heatmap), 200
 
 @analytics_bp.route('/stats-summary', methods=['GET'])
 @jwt_required()
+@etag_by_data_version
+@analytics_cache.cached('stats-summary')
 def get_stats_summary():
     """
     Retorna un resumen de estadísticas generales del usuario.
     """
-    user_id = get_jwt_identity()
-    
-    # Total de sesiones
-    total_sessions = WorkoutSession.query.filter_by(user_id=user_id).count()
-    
-    # Sesiones en los últimos 30 días
+    return jsonify(_stats_summary(get_jwt_identity())), 200
+
+def _stats_summary(user_id):
+    """
+    Resumen histórico agregado en la base de datos: el volumen sale solo de las filas de
+    total diario y el ejercicio favorito de un GROUP BY, sin traer el rollup completo.
+    """
+    # Total y recientes en una sola consulta sobre las sesiones
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_sessions = WorkoutSession.query.filter(
-        WorkoutSession.user_id == user_id,
-        WorkoutSession.start_time >= thirty_days_ago
-    ).count()
+    total_sessions, recent_sessions = db.session.query(
+        func.count(WorkoutSession.id),
+        func.coalesce(func.sum(case((WorkoutSession.start_time >= thirty_days_ago, 1), else_=0)), 0)
+    ).filter(
+        WorkoutSession.user_id == user_id
+    ).one()
     
-    # Volumen total levantado (histórico)
+    # Volumen total levantado (histórico), sumando los totales diarios
     total_volume = db.session.query(
-        func.sum(WorkoutLog.weight * WorkoutLog.reps)
-    ).join(
-        WorkoutSession, WorkoutSession.id == WorkoutLog.session_id
+        func.sum(DailyTrainingRollup.total_volume)
     ).filter(
-        WorkoutSession.user_id == user_id
+        DailyTrainingRollup.user_id == user_id,
+        DailyTrainingRollup.exercise_id == DailyTrainingRollup.DAY_TOTAL
     ).scalar() or 0
     
-    # Ejercicio más frecuente
+    # Ejercicio más frecuente (por número de series)
     most_common_exercise = db.session.query(
         Exercise.name,
-        func.count(WorkoutLog.id).label('count')
+        func.sum(DailyTrainingRollup.set_count).label('count')
     ).join(
-        WorkoutLog, WorkoutLog.exercise_id == Exercise.id
-    ).join(
-        WorkoutSession, WorkoutSession.id == WorkoutLog.session_id
+        DailyTrainingRollup, DailyTrainingRollup.exercise_id == Exercise.id
     ).filter(
-        WorkoutSession.user_id == user_id
+        DailyTrainingRollup.user_id == user_id
     ).group_by(
         Exercise.name
     ).order_by(
         desc('count')
     ).first()
     
-    return jsonify({
+    return {
         'total_sessions': total_sessions,
-        'recent_sessions': recent_sessions,
+        'recent_sessions': int(recent_sessions),
         'total_volume_kg': round(float(total_volume), 2),
         'favorite_exercise': most_common_exercise[0] if most_common_exercise else "N/A"
-    }), 200
+    }
 
 @analytics_bp.route('/weekly-volume', methods=['GET'])
 @jwt_required()
+@etag_by_data_version
+@analytics_cache.cached('weekly-volume')
 def get_weekly_volume():
     """
     Retorna el volumen total por semana en las últimas 12 semanas.
@@ -228,16 +360,15 @@ def get_weekly_volume():
     weeks = request.args.get('weeks', 12, type=int)
     start_date = datetime.utcnow() - timedelta(weeks=weeks)
     
-    # Obtener logs agrupados por semana
+    # Agrupar por semana los totales diarios del rollup
     weekly_data = db.session.query(
-        func.year(WorkoutLog.timestamp).label('year'),
-        func.week(WorkoutLog.timestamp).label('week'),
-        func.sum(WorkoutLog.weight * WorkoutLog.reps).label('volume')
-    ).join(
-        WorkoutSession, WorkoutSession.id == WorkoutLog.session_id
+        func.year(DailyTrainingRollup.day).label('year'),
+        func.week(DailyTrainingRollup.day).label('week'),
+        func.sum(DailyTrainingRollup.total_volume).label('volume')
     ).filter(
-        WorkoutSession.user_id == user_id,
-        WorkoutLog.timestamp >= start_date
+        DailyTrainingRollup.user_id == user_id,
+        DailyTrainingRollup.exercise_id == DailyTrainingRollup.DAY_TOTAL,
+        DailyTrainingRollup.day >= start_date.date()
     ).group_by(
         'year', 'week'
     ).order_by(
@@ -254,144 +385,283 @@ def get_weekly_volume():
     
     return jsonify(result), 200
 
-@analytics_bp.route('/export-csv', methods=['GET'])
+@analytics_bp.route('/load', methods=['GET'])
 @jwt_required()
-def export_csv():
-    """Genera y descarga un archivo CSV con el historial de entrenamiento."""
-    import csv
-    import io
-    from flask import Response
+@etag_by_data_version
+@analytics_cache.cached('load')
+def get_training_load():
+    """
+    Carga de entrenamiento por grupo muscular: carga diaria, aguda (EWMA 7 días),
+    crónica (EWMA 28 días) y ratio agudo:crónico (ACWR) con su nivel de riesgo.
+    """
+    from ..models import TrainingLoadState
+    from ..utils.training_load import load_snapshot, TOTAL_GROUP
     
     user_id = get_jwt_identity()
+    states = TrainingLoadState.query.filter_by(user_id=user_id).all()
+    snapshots = [load_snapshot(state) for state in states]
     
-    # Obtener logs
-    logs = db.session.query(
-        WorkoutSession.start_time,
-        Exercise.name,
-        WorkoutLog.set_number,
-        WorkoutLog.weight,
-        WorkoutLog.reps,
-        WorkoutLog.rpe
-    ).join(
-        WorkoutLog, WorkoutSession.id == WorkoutLog.session_id
-    ).join(
-        Exercise, Exercise.id == WorkoutLog.exercise_id
-    ).filter(
-        WorkoutSession.user_id == user_id
-    ).order_by(
-        WorkoutSession.start_time.desc(), WorkoutLog.set_number
-    ).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
+    total = next((s for s in snapshots if s['muscle_group'] == TOTAL_GROUP), None)
+    return jsonify({
+        'total': total,
+        'muscle_groups': sorted(
+            [s for s in snapshots if s['muscle_group'] != TOTAL_GROUP],
+            key=lambda s: s['acute_load'], reverse=True
+        )
+    }), 200
+
+@analytics_bp.route('/percentiles', methods=['GET'])
+@jwt_required()
+def get_cohort_percentiles():
+    """
+    Percentil del mejor 1RM estimado de cada ejercicio entre los usuarios de la misma franja
+    de nivel y clase de peso corporal. Se lee de histogramas precalculados por cohorte, sin
+    recorrer las series de nadie. Sin ETag: depende también de los datos de otros usuarios.
+    """
+    from ..models import User
+    from ..utils.cohorts import cohort_percentiles
     
-    writer.writerow(['Fecha', 'Ejercicio', 'Serie', 'Peso (kg)', 'Repeticiones', 'RPE'])
+    user = User.query.get_or_404(get_jwt_identity())
+    return jsonify(cohort_percentiles(user)), 200
+
+DASHBOARD_WIDGETS = ('volume', 'heatmap', 'stats-summary', 'weekly-volume', 'personal-records')
+
+@analytics_bp.route('/dashboard', methods=['GET'])
+@jwt_required()
+@etag_by_data_version
+@analytics_cache.cached('dashboard')
+def get_dashboard():
+    """
+    Resuelve varios widgets del panel en una sola petición con una única lectura del rollup.
+    Cada clave de la respuesta tiene el mismo formato que su endpoint individual.
+    Query params: widgets (lista separada por comas, default todos),
+                  volume_days (30), heatmap_days (365), weeks (12)
+    """
+    user_id = get_jwt_identity()
+    requested = [w.strip() for w in request.args.get('widgets', ','.join(DASHBOARD_WIDGETS)).split(',') if w.strip()]
+    unknown = [w for w in requested if w not in DASHBOARD_WIDGETS]
+    if unknown:
+        return jsonify({"msg": f"Widgets desconocidos: {', '.join(unknown)}", "available": list(DASHBOARD_WIDGETS)}), 400
+    
+    today = datetime.utcnow()
+    windows = {
+        'volume': (today - timedelta(days=request.args.get('volume_days', 30, type=int))).date(),
+        'heatmap': (today - timedelta(days=request.args.get('heatmap_days', 365, type=int))).date(),
+        'weekly-volume': (today - timedelta(weeks=request.args.get('weeks', 12, type=int))).date(),
+    }
+    
+    result = {}
+    
+    # Plan: una sola lectura del rollup que cubre la ventana más amplia pedida
+    scan_widgets = [w for w in requested if w in windows]
+    if scan_widgets:
+        scan_start = min(windows[w] for w in scan_widgets)
+        
+        rows = db.session.query(
+            DailyTrainingRollup.day,
+            DailyTrainingRollup.exercise_id,
+            DailyTrainingRollup.set_count,
+            DailyTrainingRollup.total_volume,
+            DailyTrainingRollup.session_count,
+            Exercise.name,
+            Exercise.muscle_group
+        ).outerjoin(
+            Exercise, Exercise.id == DailyTrainingRollup.exercise_id
+        ).filter(
+            DailyTrainingRollup.user_id == user_id,
+            DailyTrainingRollup.day >= scan_start
+        ).order_by(DailyTrainingRollup.day).all()
+        
+        day_rows = [r for r in rows if r.exercise_id == DailyTrainingRollup.DAY_TOTAL]
+        exercise_rows = [r for r in rows if r.exercise_id != DailyTrainingRollup.DAY_TOTAL]
+        
+        if 'volume' in requested:
+            by_muscle = defaultdict(float)
+            for r in exercise_rows:
+                if r.day >= windows['volume']:
+                    by_muscle[r.muscle_group or "Sin categoría"] += r.total_volume or 0
+            result['volume'] = [
+                {"muscle_group": muscle, "volume": float(volume)}
+                for muscle, volume in by_muscle.items()
+            ]
+        
+        if 'heatmap' in requested:
+            result['heatmap'] = [
+                {"date": r.day.isoformat(), "count": r.session_count}
+                for r in day_rows
+                if r.day >= windows['heatmap'] and r.session_count > 0
+            ]
+        
+        if 'weekly-volume' in requested:
+            # %U equivale a WEEK(fecha) de MySQL (modo 0, semanas que empiezan en domingo)
+            by_week = defaultdict(float)
+            for r in day_rows:
+                if r.day >= windows['weekly-volume']:
+                    by_week[(r.day.year, int(r.day.strftime('%U')))] += r.total_volume or 0
+            result['weekly-volume'] = [
+                {"week": f"{year}-W{week:02d}", "volume": round(float(volume), 2)}
+                for (year, week), volume in sorted(by_week.items())
+            ]
+    
+    # El histórico completo se agrega en SQL: no amplía la ventana de la lectura del rollup
+    if 'stats-summary' in requested:
+        result['stats-summary'] = _stats_summary(user_id)
+    
+    if 'personal-records' in requested:
+        records = db.session.query(PersonalRecord, Exercise).join(
+            Exercise, Exercise.id == PersonalRecord.exercise_id
+        ).filter(
+            PersonalRecord.user_id == user_id
+        ).all()
+        result['personal-records'] = [_serialize_record(record, exercise) for record, exercise in records]
     
-    for log in logs:
-        writer.writerow([
-            log.start_time.strftime('%Y-%m-%d %H:%M') if log.start_time else 'N/A',
-            log.name,
-            log.set_number,
-            log.weight,
-            log.reps,
-            log.rpe or ''
-        ])
+    return jsonify(result), 200
+
+EXPORT_BATCH_SIZE = 1000
+
+def _parse_export_filters():
+    """
+    Lee los filtros opcionales de exportación.
+    Query params: from / to (YYYY-MM-DD, inclusivos), exercise_ids (lista separada por comas)
+    """
+    def parse_day(name):
+        value = request.args.get(name)
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+    start = parse_day('from')
+    end = parse_day('to')
+    if end:
+        end = end + timedelta(days=1)
+    raw_ids = request.args.get('exercise_ids', '')
+    exercise_ids = [int(x) for x in raw_ids.split(',') if x.strip().isdigit()]
+    return start, end, exercise_ids
+
+@analytics_bp.route('/export-csv', methods=['GET'])
+@jwt_required()
+def export_csv():
+    """
+    Genera y descarga un archivo CSV con el historial de entrenamiento.
+    Se transmite por lotes para que la memoria del worker no dependa del tamaño del historial.
+    Query params: from, to, exercise_ids, gzip (1 para comprimir al vuelo)
+    """
+    import csv
+    import io
+    import zlib
+    from flask import Response, stream_with_context
     
-    output.seek(0)
+    user_id = get_jwt_identity()
+    try:
+        start, end, exercise_ids = _parse_export_filters()
+    except ValueError:
+        return jsonify({"msg": "Fecha inválida, usa el formato YYYY-MM-DD"}), 400
+    compress = request.args.get('gzip', '0') in ('1', 'true')
+    
+    # Cursor de servidor: las filas llegan en lotes de EXPORT_BATCH_SIZE (y después las archivadas)
+    logs = history_rows(user_id, start, end, exercise_ids, batch_size=EXPORT_BATCH_SIZE)
+    
+    def generate_rows():
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['Fecha', 'Ejercicio', 'Serie', 'Peso (kg)', 'Repeticiones', 'RPE'])
+        
+        for index, log in enumerate(logs, start=1):
+            writer.writerow([
+                log.start_time.strftime('%Y-%m-%d %H:%M') if log.start_time else 'N/A',
+                log.name,
+                log.set_number,
+                log.weight,
+                log.reps,
+                log.rpe or ''
+            ])
+            if index % EXPORT_BATCH_SIZE == 0:
+                yield output.getvalue().encode('utf-8')
+                output.seek(0)
+                output.truncate(0)
+        
+        yield output.getvalue().encode('utf-8')
+    
+    def generate_gzip():
+        # wbits=31 -> cabecera y cola gzip
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in generate_rows():
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    
+    if compress:
+        return Response(
+            stream_with_context(generate_gzip()),
+            mimetype="application/gzip",
+            headers={"Content-disposition": "attachment; filename=historial_entrenamiento.csv.gz"}
+        )
     
     return Response(
-        output.getvalue(),
+        stream_with_context(generate_rows()),
         mimetype="text/csv",
         headers={"Content-disposition": "attachment; filename=historial_entrenamiento.csv"}
     )
 
-@analytics_bp.route('/export-pdf', methods=['GET'])
+
+@analytics_bp.route('/reports/pdf', methods=['POST'])
 @jwt_required()
-def export_pdf():
-    """Genera y descarga un archivo PDF con el historial de entrenamiento."""
-    from fpdf import FPDF
-    from flask import Response, make_response
-    from ..models import User
+def submit_pdf_report():
+    """
+    Encola la generación del informe PDF en segundo plano.
+    Si el historial no ha cambiado desde el último informe, el trabajo vuelve ya terminado.
+    """
+    from ..utils.reports import submit_pdf_report as submit, job_payload
     
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    # Obtener logs
-    logs = db.session.query(
-        WorkoutSession.start_time,
-        Exercise.name,
-        WorkoutLog.set_number,
-        WorkoutLog.weight,
-        WorkoutLog.reps,
-        WorkoutLog.rpe
-    ).join(
-        WorkoutLog, WorkoutSession.id == WorkoutLog.session_id
-    ).join(
-        Exercise, Exercise.id == WorkoutLog.exercise_id
-    ).filter(
-        WorkoutSession.user_id == user_id
-    ).order_by(
-        WorkoutSession.start_time.desc(), WorkoutLog.set_number
-    ).all()
+    job = submit(user_id)
+    payload = job_payload(job)
+    return jsonify(payload), 200 if job.status == 'done' else 202
+
+@analytics_bp.route('/reports/<job_id>', methods=['GET'])
+@jwt_required()
+def get_report_status(job_id):
+    """Consulta el estado de un trabajo de informe."""
+    from ..models import ReportJob
+    from ..utils.reports import job_payload
     
-    class PDF(FPDF):
-        def header(self):
-            # Logo/Título
-            self.set_font('Arial', 'B', 20)
-            self.set_text_color(43, 238, 108) # Color primario #2bee6c
-            self.cell(0, 10, 'GymTrack Pro', 0, 1, 'C')
-            self.set_font('Arial', 'I', 10)
-            self.set_text_color(100, 100, 100)
-            self.cell(0, 10, 'Tu Progresión de Fuerza Documentada', 0, 1, 'C')
-            self.ln(10)
-            
-        def footer(self):
-            self.set_y(-15)
-            self.set_font('Arial', 'I', 8)
-            self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+    user_id = get_jwt_identity()
+    job = ReportJob.query.filter_by(id=job_id, user_id=user_id).first_or_404()
+    return jsonify(job_payload(job)), 200
 
-    pdf = PDF()
-    pdf.add_page()
-    
-    # Info de Usuario
-    pdf.set_font('Arial', 'B', 12)
-    pdf.set_text_color(0, 0, 0)
-    pdf.cell(0, 10, f'Informe de Entrenamiento: {user.username}', 0, 1, 'L')
-    pdf.set_font('Arial', '', 10)
-    pdf.cell(0, 10, f'Fecha de generación: {datetime.now().strftime("%d/%m/%Y %H:%M")}', 0, 1, 'L')
-    pdf.ln(5)
-    
-    # Tabla Header
-    pdf.set_fill_color(43, 238, 108)
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font('Arial', 'B', 10)
-    
-    col_widths = [35, 75, 20, 25, 25]
-    headers = ['Fecha', 'Ejercicio', 'Serie', 'Peso (kg)', 'Reps']
-    
-    for i in range(len(headers)):
-        pdf.cell(col_widths[i], 10, headers[i], 1, 0, 'C', 1)
-    pdf.ln()
-    
-    # Datos Tabla
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font('Arial', '', 9)
-    fill = False
-    
-    for log in logs:
-        # Alternar color de fondo
-        pdf.set_fill_color(245, 245, 245) if fill else pdf.set_fill_color(255, 255, 255)
-        
-        pdf.cell(col_widths[0], 8, log.start_time.strftime('%d/%m/%y') if log.start_time else 'N/A', 1, 0, 'C', 1)
-        pdf.cell(col_widths[1], 8, log.name[:40], 1, 0, 'L', 1)
-        pdf.cell(col_widths[2], 8, str(log.set_number), 1, 0, 'C', 1)
-        pdf.cell(col_widths[3], 8, f'{log.weight}kg', 1, 0, 'C', 1)
-        pdf.cell(col_widths[4], 8, str(log.reps), 1, 0, 'C', 1)
-        pdf.ln()
-        fill = not fill
-        
-    return Response(
-        bytes(pdf.output()),
+@analytics_bp.route('/reports/<job_id>/download', methods=['GET'])
+@jwt_required()
+def download_report(job_id):
+    """Descarga el PDF de un trabajo terminado."""
+    import os
+    from flask import send_file
+    from ..models import ReportJob, User
+    
+    user_id = get_jwt_identity()
+    job = ReportJob.query.filter_by(id=job_id, user_id=user_id).first_or_404()
+    if job.status != 'done':
+        return jsonify({"msg": "El informe todavía no está listo", "status": job.status}), 409
+    if not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({"msg": "El informe ha caducado, solicítalo de nuevo"}), 410
+    
+    user = User.query.get(user_id)
+    return send_file(
+        job.file_path,
         mimetype="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=GymTrackPro_Report_{user.username}.pdf"}
+        as_attachment=True,
+        download_name=f"GymTrackPro_Report_{user.username}.pdf"
     )
+
+@analytics_bp.route('/export-pdf', methods=['GET'])
+@jwt_required()
+def export_pdf():
+    """
+    Descarga el PDF del historial si está en caché para el historial actual.
+    Si no, encola su generación y responde 202 con el trabajo para consultarlo.
+    """
+    from ..utils.reports import submit_pdf_report as submit, job_payload
+    
+    user_id = get_jwt_identity()
+    job = submit(user_id)
+    if job.status == 'done':
+        return download_report(job.id)
+    return jsonify(job_payload(job)), 202
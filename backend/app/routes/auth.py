@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from ..models import User, db
+from ..models import User, UserStats, db
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -30,6 +30,7 @@ def register():
         # Crear el usuario
         user = User(username=data['username'], email=data['email'])
         user.set_password(data['password'])
+        user.stats = UserStats()
         db.session.add(user)
         db.session.commit()
         
@@ -73,12 +74,6 @@ def me():
         
         if not user:
             return jsonify({"msg": "Usuario no encontrado"}), 404
-            
-        # Sincronizar nivel si hay discrepancia por XP acumulada
-        correct_level = user.calculate_level()
-        if user.level != correct_level:
-            user.level = correct_level
-            db.session.commit()
         
         return jsonify({
             "id": user.id,
@@ -5,59 +5,106 @@ from ..models import (
     RoutineLike, SavedRoutine, User, followers, RoutineReview
 )
 from sqlalchemy import func
+from ..utils.leaderboard import leaderboard, PERIODS
+from ..utils.cache import community_cache
 
 community_bp = Blueprint('community', __name__)
 
 
-def _serialize_routine(routine: Routine, current_user: User) -> dict:
-    """Serializa una rutina pública con info de autor, likes y estado del usuario."""
-    like_count = len(routine.likes)
-    user_liked = any(l.user_id == current_user.id for l in routine.likes)
-    user_saved = SavedRoutine.query.filter_by(
-        user_id=current_user.id,
-        original_routine_id=routine.id
-    ).first() is not None
+def _public_routines(routines) -> list:
+    """
+    Parte común (igual para todos los usuarios) de las rutinas públicas: ejercicios, likes,
+    valoración media y autor, con una consulta agrupada por dato en vez de varias por rutina.
+    """
+    ids = [r.id for r in routines]
+    if not ids:
+        return []
+    exercise_counts = dict(db.session.query(RoutineExercise.routine_id, func.count()).filter(
+        RoutineExercise.routine_id.in_(ids)
+    ).group_by(RoutineExercise.routine_id))
+    like_counts = dict(db.session.query(RoutineLike.routine_id, func.count()).filter(
+        RoutineLike.routine_id.in_(ids)
+    ).group_by(RoutineLike.routine_id))
+    ratings = {
+        routine_id: (avg_rating, review_count)
+        for routine_id, avg_rating, review_count in db.session.query(
+            RoutineReview.routine_id, func.avg(RoutineReview.rating), func.count(RoutineReview.id)
+        ).filter(RoutineReview.routine_id.in_(ids)).group_by(RoutineReview.routine_id)
+    }
+    authors = {u.id: u for u in User.query.filter(User.id.in_({r.user_id for r in routines}))}
+
+    result = []
+    for routine in routines:
+        avg_rating, review_count = ratings.get(routine.id, (None, 0))
+        author = authors.get(routine.user_id)
+        result.append({
+            'id': routine.id,
+            'user_id': routine.user_id,
+            'name': routine.name,
+            'description': routine.description,
+            'created_at': routine.created_at.isoformat(),
+            'exercise_count': exercise_counts.get(routine.id, 0),
+            'likes': like_counts.get(routine.id, 0),
+            'avg_rating': round(float(avg_rating), 1) if avg_rating else 0.0,
+            'review_count': review_count or 0,
+            'author': {
+                'id': author.id,
+                'username': author.username,
+                'level': author.level,
+                'avatar_icon': author.avatar_icon,
+                'avatar_url': author.avatar_url,
+                'username_color': author.username_color,
+            } if author else None,
+        })
+    return result
+
+
+def _with_user_state(items: list, current_user: User) -> list:
+    """Completa las rutinas comunes con lo que depende del usuario: like, guardado, valoración y si sigue al autor."""
+    ids = [item['id'] for item in items]
+    if not ids:
+        return []
+    liked = {rid for (rid,) in db.session.query(RoutineLike.routine_id).filter(
+        RoutineLike.user_id == current_user.id, RoutineLike.routine_id.in_(ids)
+    )}
+    saved = {rid for (rid,) in db.session.query(SavedRoutine.original_routine_id).filter(
+        SavedRoutine.user_id == current_user.id, SavedRoutine.original_routine_id.in_(ids)
+    )}
+    user_ratings = dict(db.session.query(RoutineReview.routine_id, RoutineReview.rating).filter(
+        RoutineReview.user_id == current_user.id, RoutineReview.routine_id.in_(ids)
+    ))
+    followed = {uid for (uid,) in db.session.query(followers.c.followed_id).filter(
+        followers.c.follower_id == current_user.id
+    )}
+
+    result = []
+    for item in items:
+        item = dict(item)
+        owner_id = item.pop('user_id')
+        author = item['author']
+        item.update({
+            'user_liked': item['id'] in liked,
+            'user_saved': item['id'] in saved,
+            'is_own': owner_id == current_user.id,
+            'user_rating': user_ratings.get(item['id'], 0),
+            'author': {
+                **author,
+                'is_followed': author['id'] != current_user.id and author['id'] in followed
+            } if author else None,
+        })
+        result.append(item)
+    return result
 
-    exercise_count = RoutineExercise.query.filter_by(routine_id=routine.id).count()
-    author = User.query.get(routine.user_id)
-    
-    # Datos de valoración
-    review_agg = db.session.query(
-        func.avg(RoutineReview.rating).label('avg_rating'),
-        func.count(RoutineReview.id).label('review_count')
-    ).filter(RoutineReview.routine_id == routine.id).one()
-    avg_rating = round(float(review_agg.avg_rating), 1) if review_agg.avg_rating else 0.0
-    review_count = review_agg.review_count or 0
-    
-    user_review = RoutineReview.query.filter_by(user_id=current_user.id, routine_id=routine.id).first()
-    
-    is_followed = False
-    if author and author.id != current_user.id:
-        is_followed = current_user.followed.filter(followers.c.followed_id == author.id).count() > 0
 
-    return {
-        'id': routine.id,
-        'name': routine.name,
-        'description': routine.description,
-        'created_at': routine.created_at.isoformat(),
-        'exercise_count': exercise_count,
-        'likes': like_count,
-        'user_liked': user_liked,
-        'user_saved': user_saved,
-        'is_own': routine.user_id == current_user.id,
-        'avg_rating': avg_rating,
-        'review_count': review_count,
-        'user_rating': user_review.rating if user_review else 0,
-        'author': {
-            'id': author.id,
-            'username': author.username,
-            'level': author.level,
-            'avatar_icon': author.avatar_icon,
-            'avatar_url': author.avatar_url,
-            'username_color': author.username_color,
-            'is_followed': is_followed
-        } if author else None,
-    }
+@community_cache.snapshot('feed')
+def _feed_snapshot() -> list:
+    routines = (
+        Routine.query
+        .filter_by(is_public=True)
+        .order_by(Routine.created_at.desc())
+        .all()
+    )
+    return _public_routines(routines)
 
 
 @community_bp.route('', methods=['GET'])
@@ -66,13 +113,7 @@ def get_feed():
     """Feed de rutinas públicas ordenadas por likes desc."""
     current_user_id = get_jwt_identity()
     current_user = User.query.get(current_user_id)
-    routines = (
-        Routine.query
-        .filter_by(is_public=True)
-        .order_by(Routine.created_at.desc())
-        .all()
-    )
-    return jsonify([_serialize_routine(r, current_user) for r in routines]), 200
+    return jsonify(_with_user_state(_feed_snapshot(), current_user)), 200
 
 
 @community_bp.route('/routines/<int:routine_id>/like', methods=['POST'])
@@ -94,13 +135,17 @@ def toggle_like(routine_id: int):
         db.session.add(RoutineLike(user_id=current_user_id, routine_id=routine_id))
         liked = True
 
+    from ..utils.user_stats import adjust_stats
+    delta = 1 if liked else -1
+    adjust_stats(current_user_id, likes_given_count=delta)
+    adjust_stats(routine.user_id, likes_received_count=delta)
     db.session.commit()
     
     # Comprobar logros (Likes recibidos y dados)
-    from ..utils.gamification import check_user_achievements
-    check_user_achievements(current_user_id) # El que da el like
     if liked:
-        check_user_achievements(routine.user_id) # El que recibe el like
+        from ..utils.gamification import emit_event
+        emit_event(current_user_id, 'routine_liked') # El que da el like
+        emit_event(routine.user_id, 'like_received') # El que recibe el like
         
     like_count = RoutineLike.query.filter_by(routine_id=routine_id).count()
     return jsonify({'liked': liked, 'likes': like_count}), 200
@@ -125,8 +170,10 @@ def save_routine(routine_id: int):
         original_routine_id=routine_id
     ).first()
 
+    from ..utils.user_stats import adjust_stats
     if existing:
         db.session.delete(existing)
+        adjust_stats(current_user_id, saves_count=-1)
         db.session.commit()
         return jsonify({'saved': False, 'msg': 'Rutina eliminada de tu colección'}), 200
 
@@ -154,11 +201,13 @@ def save_routine(routine_id: int):
         user_id=current_user_id,
         original_routine_id=routine_id,
     ))
+    # La copia también cuenta como rutina propia
+    adjust_stats(current_user_id, saves_count=1, routines_count=1)
     db.session.commit()
     
     # Comprobar logros (Guardados/Saves)
-    from ..utils.gamification import check_user_achievements
-    check_user_achievements(current_user_id)
+    from ..utils.gamification import emit_event
+    emit_event(current_user_id, 'routine_saved')
     
     return jsonify({'saved': True, 'msg': 'Rutina guardada en tu colección', 'new_routine_id': clone.id}), 201
 
@@ -182,32 +231,70 @@ def get_routine_exercises(routine_id: int):
         'reps_target': re.reps_target,
     } for re, ex in rows]), 200
 
-@community_bp.route('/leaderboard', methods=['GET'])
-@jwt_required()
-def get_leaderboard():
-    """Retorna el Top 50 atletas ordenados por XP (o Nivel)."""
-    current_user_id = get_jwt_identity()
-    
-    # Obtener el top 50
-    top_users = User.query.order_by(User.xp.desc()).limit(50).all()
-    
-    leaderboard = []
-    for index, u in enumerate(top_users):
-        leaderboard.append({
-            'rank': index + 1,
+def _leaderboard_entries(ranked):
+    """Filas de la clasificación [(posición, user_id, xp)] con los datos de cada usuario (una consulta)."""
+    users = {u.id: u for u in User.query.filter(User.id.in_([user_id for _, user_id, _ in ranked]))}
+    entries = []
+    for rank, user_id, xp in ranked:
+        u = users.get(user_id)
+        if u is None:
+            # Dado de baja después de construir la clasificación
+            continue
+        entries.append({
+            'rank': rank,
             'id': u.id,
             'username': u.username,
             'level': u.level,
-            'xp': u.xp,
+            'xp': xp,
             'avatar_icon': u.avatar_icon,
             'avatar_url': u.avatar_url,
             'username_color': u.username_color,
             'title': u.title,
             'role': u.role,
-            'is_current_user': u.id == current_user_id
         })
-        
-    return jsonify(leaderboard), 200
+    return entries
+
+def _mark_current_user(entries, current_user_id):
+    return [{**entry, 'is_current_user': entry['id'] == current_user_id} for entry in entries]
+
+def _leaderboard_period():
+    period = request.args.get('period', 'all')
+    return period if period in PERIODS else None
+
+@community_bp.route('/leaderboard', methods=['GET'])
+@jwt_required()
+def get_leaderboard():
+    """
+    Top de atletas por XP: total (period=all) o ganada esta semana/mes (week, month).
+    Sale de la clasificación en memoria, sin ordenar la tabla de usuarios ni otra caché
+    encima: se actualiza con cada cambio de XP, igual que /leaderboard/me.
+    """
+    current_user_id = int(get_jwt_identity())
+    period = _leaderboard_period()
+    if period is None:
+        return jsonify({'msg': 'Periodo no válido (all, week o month)'}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 100)
+
+    return jsonify(_mark_current_user(_leaderboard_entries(leaderboard.top(period, limit)), current_user_id)), 200
+
+@community_bp.route('/leaderboard/me', methods=['GET'])
+@jwt_required()
+def get_my_rank():
+    """Posición del usuario en la clasificación del periodo y los atletas que tiene alrededor."""
+    current_user_id = int(get_jwt_identity())
+    period = _leaderboard_period()
+    if period is None:
+        return jsonify({'msg': 'Periodo no válido (all, week o month)'}), 400
+    around = min(max(request.args.get('around', 3, type=int), 0), 25)
+
+    rank, xp, total, neighbours = leaderboard.position(period, current_user_id, around)
+    return jsonify({
+        'period': period,
+        'rank': rank,
+        'xp': xp,
+        'total': total,
+        'neighbours': _mark_current_user(_leaderboard_entries(neighbours), current_user_id)
+    }), 200
 
 @community_bp.route('/users/<int:user_id>/follow', methods=['POST'])
 @jwt_required()
@@ -231,32 +318,39 @@ def toggle_follow(user_id):
     else:
         current_user.followed.append(target_user)
         following_now = True
-        
+    
+    from ..utils.user_stats import adjust_stats, get_user_stats
+    delta = 1 if following_now else -1
+    adjust_stats(current_user_id, following_count=delta)
+    adjust_stats(user_id, followers_count=delta)
     db.session.commit()
+    community_cache.invalidate('profile', current_user_id)
+    community_cache.invalidate('profile', user_id)
     
     # Comprobar logros (Follows)
-    from ..utils.gamification import check_user_achievements
-    check_user_achievements(current_user_id)
+    if following_now:
+        from ..utils.gamification import emit_event
+        emit_event(current_user_id, 'user_followed')
     
     return jsonify({
         'following': following_now,
-        'followers_count': target_user.followers.count()
+        'followers_count': get_user_stats(user_id).followers_count
     }), 200
 
-@community_bp.route('/users/<int:user_id>', methods=['GET'])
-@jwt_required()
-def get_public_profile(user_id):
-    """Devuelve el perfil público de un usuario y sus rutinas públicas."""
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    target_user = User.query.get_or_404(user_id)
-    
-    is_followed = current_user.followed.filter(followers.c.followed_id == user_id).count() > 0 if current_user_id != user_id else False
-    
+@community_cache.snapshot('profile')
+def _profile_snapshot(user_id: int):
+    """Parte común del perfil público, o None si el usuario no existe."""
+    target_user = User.query.get(user_id)
+    if target_user is None:
+        return None
+
     # Obtener rutinas públicas
     routines = Routine.query.filter_by(user_id=user_id, is_public=True).order_by(Routine.created_at.desc()).all()
-    
-    return jsonify({
+
+    from ..utils.user_stats import get_user_stats
+    stats = get_user_stats(user_id)
+
+    return {
         'id': target_user.id,
         'username': target_user.username,
         'level': target_user.level,
@@ -265,11 +359,28 @@ def get_public_profile(user_id):
         'avatar_url': target_user.avatar_url,
         'username_color': target_user.username_color,
         'title': target_user.title,
-        'followers_count': target_user.followers.count(),
-        'following_count': target_user.followed.count(),
+        'followers_count': stats.followers_count,
+        'following_count': stats.following_count,
+        'routines': _public_routines(routines)
+    }
+
+@community_bp.route('/users/<int:user_id>', methods=['GET'])
+@jwt_required()
+def get_public_profile(user_id):
+    """Devuelve el perfil público de un usuario y sus rutinas públicas."""
+    current_user_id = int(get_jwt_identity())
+    current_user = User.query.get(current_user_id)
+    profile = _profile_snapshot(user_id)
+    if profile is None:
+        return jsonify({'msg': 'Usuario no encontrado'}), 404
+
+    is_followed = current_user.followed.filter(followers.c.followed_id == user_id).count() > 0 if current_user_id != user_id else False
+
+    return jsonify({
+        **profile,
         'is_followed': is_followed,
         'is_own_profile': current_user_id == user_id,
-        'routines': [_serialize_routine(r, current_user) for r in routines]
+        'routines': _with_user_state(profile['routines'], current_user)
     }), 200
 
 
@@ -322,12 +433,15 @@ def submit_review(routine_id: int):
             comment=data.get('comment', '')
         )
         db.session.add(review)
+        from ..utils.user_stats import adjust_stats
+        adjust_stats(current_user_id, reviews_count=1)
     
     db.session.commit()
     
     # Comprobar logros (Reseñas/Reviews)
-    from ..utils.gamification import check_user_achievements
-    check_user_achievements(current_user_id)
+    if not existing:
+        from ..utils.gamification import emit_event
+        emit_event(current_user_id, 'routine_reviewed')
     
     # Recalcular agregados para devolverlos al frontend
     review_agg = db.session.query(
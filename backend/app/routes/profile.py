@@ -1,24 +1,28 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models import User, ShopItem, UserAchievement, Achievement, UserItem, BodyMetric, db
+from ..utils.versioning import etag_by_data_version, bump_data_version
 from datetime import datetime
 
 profile_bp = Blueprint('profile', __name__)
 
+
+def _invalidate_community(user_id):
+    """Que el avatar, el color o el título nuevos se vean ya en el feed y en el perfil público."""
+    from ..utils.cache import community_cache
+    community_cache.invalidate('feed')
+    community_cache.invalidate('profile', user_id)
+
+
 @profile_bp.route('', methods=['GET'])
 @jwt_required()
+@etag_by_data_version
 def get_profile():
     """Obtener información completa del perfil del usuario"""
     try:
         user_id = get_jwt_identity()
         user = User.query.get(user_id)
         
-        # Sincronizar nivel si hay discrepancia por XP acumulada
-        correct_level = user.calculate_level()
-        if (user.level or 1) != correct_level:
-            user.level = correct_level
-            db.session.commit()
-        
         # Obtener logros desbloqueados
         achievements = db.session.query(Achievement).join(
             UserAchievement, UserAchievement.achievement_id == Achievement.id
@@ -71,7 +75,9 @@ def update_profile():
         if 'email' in data:
             user.email = data['email']
         
+        bump_data_version(user_id)
         db.session.commit()
+        _invalidate_community(user_id)
         return jsonify({"msg": "Perfil actualizado"}), 200
     except Exception as e:
         print(f"ERROR en update_profile: {str(e)}")
@@ -124,6 +130,7 @@ def purchase_item(item_id):
         return jsonify({"msg": f"Necesitas nivel {item.required_level}"}), 400
     
     # Si no es consumible, revisar si ya lo tiene en su colección
+    purchased = False
     if item.item_type != 'consumable':
         already_owned = UserItem.query.filter_by(user_id=user.id, item_id=item.id).first()
         if already_owned:
@@ -134,6 +141,7 @@ def purchase_item(item_id):
             user.coins -= item.price
             new_purchase = UserItem(user_id=user.id, item_id=item.id)
             db.session.add(new_purchase)
+            purchased = True
     else:
         # Si es consumible, restar monedas y aplicar directamente
         user.coins -= item.price
@@ -163,7 +171,15 @@ def purchase_item(item_id):
             except (IndexError, ValueError):
                 pass
     
+    bump_data_version(user_id)
     db.session.commit()
+    if item.item_type != 'consumable':
+        _invalidate_community(user_id)
+    
+    if purchased:
+        # Comprobar logros (objetos comprados)
+        from ..utils.gamification import emit_event
+        emit_event(user_id, 'item_purchased')
     
     # Mensaje personalizado si ya lo tenía o es gratis
     is_update = item.price == 0 or (item.item_type != 'consumable' and UserItem.query.filter_by(user_id=user.id, item_id=item.id).count() > 0)
@@ -204,7 +220,9 @@ def upload_avatar():
             
             # Guardar la URL relativa
             user.avatar_url = f"/static/uploads/{filename}"
+            bump_data_version(user_id)
             db.session.commit()
+            _invalidate_community(user_id)
             
             return jsonify({
                 "msg": "Avatar actualizado correctamente",
@@ -250,6 +268,50 @@ def get_achievements():
             traceback.print_exc(file=f)
         return jsonify({"msg": "Error al obtener logros", "error": str(e)}), 500
 
+@profile_bp.route('/notifications', methods=['GET'])
+@jwt_required()
+def get_notifications():
+    """
+    Avisos del usuario, más recientes primero (p. ej. logros desbloqueados al finalizar una sesión).
+    Query params: unread (1 = solo no leídos), limit (default 50, máx. 200)
+    """
+    from ..models import Notification
+    from ..utils.notifications import notification_payload
+    user_id = get_jwt_identity()
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    
+    query = Notification.query.filter(Notification.user_id == user_id)
+    if request.args.get('unread') == '1':
+        query = query.filter(Notification.read_at.is_(None))
+    notifications = query.order_by(Notification.id.desc()).limit(limit).all()
+    
+    unread = Notification.query.filter(
+        Notification.user_id == user_id,
+        Notification.read_at.is_(None)
+    ).count()
+    return jsonify({
+        'unread': unread,
+        'notifications': [notification_payload(n) for n in notifications]
+    }), 200
+
+@profile_bp.route('/notifications/read', methods=['POST'])
+@jwt_required()
+def mark_notifications_read():
+    """Marca como leídos los avisos indicados (body: {"ids": [...]}) o todos si no se indican."""
+    from ..models import Notification
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    
+    query = Notification.query.filter(
+        Notification.user_id == user_id,
+        Notification.read_at.is_(None)
+    )
+    if data.get('ids'):
+        query = query.filter(Notification.id.in_(data['ids']))
+    updated = query.update({Notification.read_at: datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    return jsonify({"msg": "Avisos marcados como leídos", "updated": updated}), 200
+
 @profile_bp.route('/level-rewards', methods=['GET'])
 @jwt_required()
 def get_level_rewards():
@@ -277,6 +339,7 @@ def get_level_rewards():
 
 @profile_bp.route('/body-metrics', methods=['GET'])
 @jwt_required()
+@etag_by_data_version
 def get_body_metrics():
     try:
         user_id = get_jwt_identity()
@@ -320,6 +383,12 @@ def add_body_metric():
         if 'chest_cm' in data and data['chest_cm'] != '': metric.chest_cm = float(data['chest_cm'])
         if 'leg_cm' in data and data['leg_cm'] != '': metric.leg_cm = float(data['leg_cm'])
         
+        # El peso corporal decide la cohorte de percentiles
+        if 'weight' in data and data['weight'] != '':
+            from ..utils.cohorts import refresh_user_cohort
+            refresh_user_cohort(User.query.get(user_id))
+        
+        bump_data_version(user_id)
         db.session.commit()
         return jsonify({"msg": "Métrica guardada correctamente"}), 201
     except Exception as e:
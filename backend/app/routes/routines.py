@@ -4,6 +4,13 @@ from ..models import Routine, RoutineExercise, Exercise, db
 
 routines_bp = Blueprint('routines', __name__)
 
+
+def _invalidate_community(user_id):
+    """Que la rutina publicada (o retirada) se vea ya en el feed y en el perfil del autor."""
+    from ..utils.cache import community_cache
+    community_cache.invalidate('feed')
+    community_cache.invalidate('profile', user_id)
+
 @routines_bp.route('', methods=['GET'])
 @jwt_required()
 def get_routines():
@@ -72,11 +79,15 @@ def create_routine():
         )
         db.session.add(re)
     
+    from ..utils.user_stats import adjust_stats
+    adjust_stats(user_id, routines_count=1)
     db.session.commit()
+    if routine.is_public:
+        _invalidate_community(user_id)
     
     # Comprobar logros (Creación de rutinas)
-    from ..utils.gamification import check_user_achievements
-    check_user_achievements(user_id)
+    from ..utils.gamification import emit_event
+    emit_event(user_id, 'routine_created')
     
     return jsonify({"msg": "Rutina creada", "id": routine.id}), 201
 
@@ -85,8 +96,14 @@ def create_routine():
 def delete_routine(id):
     user_id = get_jwt_identity()
     routine = Routine.query.filter_by(id=id, user_id=user_id).first_or_404()
-    db.session.delete(routine)
+    from ..utils.sync import record_deletion
+    from ..utils.user_stats import remove_routine
+    record_deletion(routine.user_id, 'routine', routine.id)
+    was_public = routine.is_public
+    remove_routine(routine)
     db.session.commit()
+    if was_public:
+        _invalidate_community(user_id)
     return jsonify({"msg": "Rutina eliminada"}), 200
 
 @routines_bp.route('/<int:id>', methods=['GET'])
@@ -150,6 +167,7 @@ def toggle_publish(id: int):
     routine = Routine.query.filter_by(id=id, user_id=user_id).first_or_404()
     routine.is_public = not routine.is_public
     db.session.commit()
+    _invalidate_community(user_id)
     state = 'publicada' if routine.is_public else 'privada'
     return jsonify({'msg': f'Rutina {state}', 'is_public': routine.is_public}), 200
 
@@ -279,11 +297,13 @@ def generate_routine():
             )
             db.session.add(re_obj)
 
+        from ..utils.user_stats import adjust_stats
+        adjust_stats(user_id, routines_count=1)
         db.session.commit()
         
         # Comprobar logros
-        from ..utils.gamification import check_user_achievements
-        check_user_achievements(user_id)
+        from ..utils.gamification import emit_event
+        emit_event(user_id, 'routine_created')
         
         return jsonify({"msg": "Éxito", "id": new_routine.id, "name": new_routine.name}), 201
     except Exception as e:
@@ -0,0 +1,44 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+sync_bp = Blueprint('sync', __name__)
+
+@sync_bp.route('/pull', methods=['GET'])
+@jwt_required()
+def pull():
+    """
+    Cambios del usuario desde el cursor de la última sincronización.
+    Query params: since (cursor devuelto por el pull anterior; sin él, todo)
+    """
+    from ..utils.sync import pull_changes, parse_time
+    user_id = get_jwt_identity()
+    try:
+        since = parse_time(request.args.get('since'))
+    except ValueError:
+        return jsonify({"msg": "Cursor inválido"}), 400
+    return jsonify(pull_changes(user_id, since)), 200
+
+@sync_bp.route('/push', methods=['POST'])
+@jwt_required()
+def push():
+    """
+    Aplica la cola de mutaciones hechas sin conexión.
+    Body: {"mutations": [{"type": "session.start" | "log.create" | "session.finish" | "body_metric.upsert", ...}]}
+    Responde con el resultado de cada una: applied, duplicate, conflict o rejected.
+    """
+    from ..utils.sync import apply_mutations, MAX_PUSH_MUTATIONS
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    mutations = data.get('mutations')
+    if not isinstance(mutations, list):
+        return jsonify({"msg": "Se requiere una lista de mutaciones"}), 400
+    if len(mutations) > MAX_PUSH_MUTATIONS:
+        return jsonify({"msg": f"Máximo {MAX_PUSH_MUTATIONS} mutaciones por petición"}), 400
+
+    results, finished = apply_mutations(int(user_id), mutations)
+
+    # Como al finalizar en línea, los logros se evalúan en diferido tras el commit
+    from ..utils.notifications import defer_achievement_event
+    for event_values in finished:
+        defer_achievement_event(user_id, 'session_finished', **event_values)
+    return jsonify({"results": results, "achievements_pending": bool(finished)}), 200
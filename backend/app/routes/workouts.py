@@ -1,30 +1,79 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..models import WorkoutSession, WorkoutLog, db
-from datetime import datetime
+from ..models import WorkoutSession, WorkoutLog, Exercise, db
+from ..utils.versioning import etag_by_data_version, bump_data_version
+from sqlalchemy import or_, and_
+from datetime import datetime, timedelta
+import base64
 
 workouts_bp = Blueprint('workouts', __name__)
 
+def _session_summary(s):
+    return {
+        "id": s.id,
+        "routine_id": s.routine_id,
+        "start_time": s.start_time.isoformat(),
+        "end_time": s.end_time.isoformat() if s.end_time else None,
+        "total_volume": s.total_volume,
+        "set_count": s.set_count,
+        "exercise_count": s.exercise_count,
+        "duration_seconds": s.duration_seconds
+    }
+
+def _encode_cursor(session):
+    raw = f"{session.start_time.isoformat()}|{session.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor):
+    start_time, session_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(start_time), int(session_id)
+
 @workouts_bp.route('/sessions', methods=['GET'])
 @jwt_required()
+@etag_by_data_version
 def get_sessions():
+    """
+    Historial de sesiones, más recientes primero, con su resumen guardado.
+    Paginación por clave (start_time, id): cada página es un rango del índice, sin OFFSET.
+    Query params: days, limit (default 20, máx. 100), cursor (next_cursor de la página anterior),
+    include_total (1 = contar las sesiones del periodo)
+    """
     user_id = get_jwt_identity()
     days = request.args.get('days', type=int)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
     
     query = WorkoutSession.query.filter_by(user_id=user_id)
     
     if days:
-        from datetime import timedelta
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         query = query.filter(WorkoutSession.start_time >= cutoff_date)
-        
-    sessions = query.order_by(WorkoutSession.start_time.desc()).all()
-    return jsonify([{
-        "id": s.id,
-        "routine_id": s.routine_id,
-        "start_time": s.start_time.isoformat(),
-        "end_time": s.end_time.isoformat() if s.end_time else None
-    } for s in sessions]), 200
+    
+    total = query.count() if request.args.get('include_total') == '1' else None
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor_time, cursor_id = _decode_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({"msg": "Cursor inválido"}), 400
+        query = query.filter(or_(
+            WorkoutSession.start_time < cursor_time,
+            and_(WorkoutSession.start_time == cursor_time, WorkoutSession.id < cursor_id)
+        ))
+    
+    sessions = query.order_by(
+        WorkoutSession.start_time.desc(), WorkoutSession.id.desc()
+    ).limit(limit + 1).all()
+    has_more = len(sessions) > limit
+    sessions = sessions[:limit]
+    
+    response = {
+        "sessions": [_session_summary(s) for s in sessions],
+        "next_cursor": _encode_cursor(sessions[-1]) if has_more else None
+    }
+    if total is not None:
+        response["total"] = total
+    return jsonify(response), 200
 
 @workouts_bp.route('/sessions', methods=['POST'])
 @jwt_required()
@@ -38,6 +87,7 @@ def start_session():
         start_time=datetime.utcnow()
     )
     db.session.add(session)
+    bump_data_version(user_id)
     db.session.commit()
     return jsonify({"msg": "Sesión iniciada", "id": session.id}), 201
 
@@ -46,36 +96,13 @@ def start_session():
 def finish_session(id):
     user_id = get_jwt_identity()
     session = WorkoutSession.query.filter_by(id=id, user_id=user_id).first_or_404()
-    session.end_time = datetime.utcnow()
-    
-    # Calcular XP ganada basada en la sesión
-    from ..models import WorkoutLog, User
-    logs = WorkoutLog.query.filter_by(session_id=id).all()
-    
-    # XP base por completar sesión
-    xp_gained = 20
-    
-    # XP adicional por volumen (1 XP por cada 100kg levantados)
-    total_volume = sum((log.weight or 0) * (log.reps or 0) for log in logs)
-    xp_gained += int(total_volume / 100)
     
-    # XP adicional por número de ejercicios únicos
-    unique_exercises = len(set(log.exercise_id for log in logs))
-    xp_gained += unique_exercises * 5
-    
-    # Dar XP al usuario y actualizar racha
+    from ..models import User
+    from ..utils.sessions import complete_session
+    xp_gained, level_up_info, streak_info, prev_longest = complete_session(session)
     user = User.query.get(user_id)
-    prev_longest = user.longest_streak or 0
-    
-    level_up_info = user.add_xp(xp_gained)
-    streak_info = user.update_streak()
-    
-    db.session.commit()
-    
-    # Comprobar logros después de actualizar racha y XP
-    from ..utils.gamification import check_user_achievements
-    new_achievements = check_user_achievements(user_id)
     
+    # La respuesta se arma antes del commit para no releer el usuario después
     response = {
         "msg": "Sesión finalizada",
         "xp_gained_base": xp_gained,
@@ -88,7 +115,9 @@ def finish_session(id):
         "longest_streak": streak_info['longest_streak'],
         "shield_used": streak_info.get('shield_used', False),
         "streak_milestone": streak_info['streak_updated'] and streak_info['longest_streak'] > prev_longest,
-        "new_achievements": new_achievements
+        # Los logros se evalúan en diferido y llegan por /api/profile/notifications
+        "new_achievements": [],
+        "achievements_pending": True
     }
     
     if level_up_info['level_up']:
@@ -96,14 +125,31 @@ def finish_session(id):
         response['new_level'] = level_up_info['new_level']
         response['coins_earned'] = level_up_info['coins_earned']
     
+    from ..utils.gamification import session_event_values
+    event_values = session_event_values(session, user)
+    db.session.commit()
+    
+    from ..utils.notifications import defer_achievement_event
+    defer_achievement_event(user_id, 'session_finished', **event_values)
+    
     return jsonify(response), 200
 
 @workouts_bp.route('/logs', methods=['POST'])
 @jwt_required()
 def log_set():
+    user_id = get_jwt_identity()
     data = request.get_json()
+    # Solo en sesiones propias: la serie actualiza el rollup y los récords del dueño
+    session = WorkoutSession.query.filter_by(id=data['session_id'], user_id=user_id).first_or_404()
+    if session.archived:
+        return jsonify({"msg": "La sesión está archivada y no admite nuevas series"}), 409
+    
+    from ..utils.rollups import record_set, training_day
+    from ..utils.records import update_personal_record
     log = WorkoutLog(
         session_id=data['session_id'],
+        user_id=session.user_id,
+        training_date=training_day(session),
         exercise_id=data['exercise_id'],
         set_number=data['set_number'],
         weight=data['weight'],
@@ -111,73 +157,155 @@ def log_set():
         rpe=data.get('rpe')
     )
     db.session.add(log)
+    
+    # Actualizar el rollup diario y los récords en la misma transacción
+    record_set(session, log)
+    new_records = update_personal_record(session.user_id, log)
+    if session.end_time is not None:
+        # Serie añadida a una sesión ya finalizada: recalcular su resumen y descartar el detalle guardado
+        from ..utils.sessions import session_edited
+        session_edited(session)
+    bump_data_version(session.user_id)
+    
     db.session.commit()
-    return jsonify({"msg": "Serie registrada", "id": log.id}), 201
+    return jsonify({
+        "msg": "¡Nuevo récord personal!" if new_records else "Serie registrada",
+        "id": log.id,
+        "is_pr": bool(new_records),
+        "new_records": new_records
+    }), 201
+
+MAX_BATCH_SETS = 200
+
+@workouts_bp.route('/logs/batch', methods=['POST'])
+@jwt_required()
+def log_sets_batch():
+    """
+    Registra varias series de una sesión en una sola transacción.
+    Body: {"session_id": int, "sets": [{"client_key", "exercise_id", "set_number", "weight", "reps", "rpe"}]}
+    client_key la genera el cliente (p. ej. un UUID): las series cuya clave ya está en la
+    sesión se descartan sin error, así que reenviar el lote tras un fallo de red es seguro.
+    """
+    from types import SimpleNamespace
+    from sqlalchemy import insert
+    from sqlalchemy.exc import IntegrityError
+    from ..utils.rollups import record_sets, training_day
+    from ..utils.records import update_personal_records
+
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    sets = data.get('sets')
+    if not isinstance(sets, list) or not sets:
+        return jsonify({"msg": "Se requiere una lista de series"}), 400
+    if len(sets) > MAX_BATCH_SETS:
+        return jsonify({"msg": f"Máximo {MAX_BATCH_SETS} series por lote"}), 400
+
+    # La propiedad de la sesión se comprueba una sola vez para todo el lote
+    session = WorkoutSession.query.filter_by(id=data.get('session_id'), user_id=user_id).first_or_404()
+    if session.archived:
+        return jsonify({"msg": "La sesión está archivada y no admite nuevas series"}), 409
+
+    day = training_day(session)
+    now = datetime.utcnow()
+    rows = {}
+    for item in sets:
+        key = item.get('client_key') if isinstance(item, dict) else None
+        if not isinstance(key, str) or not key or len(key) > 64 \
+                or not isinstance(item.get('exercise_id'), int) or item.get('set_number') is None:
+            return jsonify({"msg": "Cada serie requiere client_key (máx. 64 caracteres), exercise_id (entero) y set_number"}), 400
+        # Una clave repetida dentro del mismo lote también es un duplicado: gana la primera
+        rows.setdefault(key, {
+            'session_id': session.id,
+            'user_id': session.user_id,
+            'training_date': day,
+            'exercise_id': item['exercise_id'],
+            'set_number': item['set_number'],
+            'weight': item.get('weight'),
+            'reps': item.get('reps'),
+            'rpe': item.get('rpe'),
+            'timestamp': now,
+            'client_key': key
+        })
+
+    exercise_ids = {row['exercise_id'] for row in rows.values()}
+    known = {exercise_id for (exercise_id,) in db.session.query(Exercise.id).filter(Exercise.id.in_(exercise_ids))}
+    if known != exercise_ids:
+        missing = ', '.join(str(e) for e in sorted(exercise_ids - known))
+        return jsonify({"msg": f"Ejercicios no encontrados: {missing}"}), 400
+
+    fresh = []
+    for attempt in range(2):
+        existing = db.session.query(WorkoutLog.client_key).filter(
+            WorkoutLog.session_id == session.id,
+            WorkoutLog.client_key.in_(list(rows))
+        )
+        if attempt:
+            # Lectura con bloqueo: ve las claves que el otro reintento acaba de confirmar
+            existing = existing.with_for_update(read=True)
+        existing = {key for (key,) in existing}
+        fresh = [row for key, row in rows.items() if key not in existing]
+        if not fresh:
+            break
+        try:
+            # Un único INSERT con todas las filas, en un savepoint: si un reintento simultáneo
+            # del mismo lote ha insertado antes alguna clave, se deshace solo el INSERT
+            with db.session.begin_nested():
+                db.session.execute(insert(WorkoutLog), fresh)
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+
+    new_records = {}
+    if fresh:
+        # Rollup y récords se actualizan por ejercicio solo con las series insertadas
+        logs = [SimpleNamespace(**row) for row in fresh]
+        record_sets(session, logs)
+        new_records = update_personal_records(session.user_id, logs)
+        if session.end_time is not None:
+            from ..utils.sessions import session_edited
+            session_edited(session)
+        bump_data_version(session.user_id)
+    db.session.commit()
+
+    return jsonify({
+        "msg": "¡Nuevo récord personal!" if new_records else "Series registradas",
+        "inserted": len(fresh),
+        "duplicates": len(sets) - len(fresh),
+        "new_records": [
+            {"exercise_id": exercise_id, "records": records}
+            for exercise_id, records in new_records.items()
+        ]
+    }), 201 if fresh else 200
 
 @workouts_bp.route('/sessions/<int:id>', methods=['GET'])
 @jwt_required()
 def get_session_detail(id):
-    """Obtener detalle completo de una sesión con todos sus logs"""
+    """
+    Obtener detalle completo de una sesión con todos sus logs.
+    El de una sesión finalizada se serializa una vez y se guarda: las siguientes visitas son
+    una lectura por clave. Se sirve con ETag fuerte y no-cache: la sesión aún puede editarse,
+    así que el navegador revalida siempre (304 sin cuerpo si no ha cambiado).
+    """
+    from flask import make_response
+    from ..models import SessionDetail
+    from ..utils.sessions import build_session_detail, store_session_detail
     user_id = get_jwt_identity()
-    session = WorkoutSession.query.filter_by(id=id, user_id=user_id).first_or_404()
     
-    # Obtener logs agrupados por ejercicio
-    from sqlalchemy import func
-    from ..models import Exercise
-    
-    logs = db.session.query(
-        Exercise.id,
-        Exercise.name,
-        WorkoutLog.set_number,
-        WorkoutLog.weight,
-        WorkoutLog.reps,
-        WorkoutLog.rpe,
-        WorkoutLog.timestamp
-    ).join(
-        WorkoutLog, WorkoutLog.exercise_id == Exercise.id
-    ).filter(
-        WorkoutLog.session_id == id
-    ).order_by(
-        WorkoutLog.timestamp
-    ).all()
-    
-    # Calcular volumen total
-    total_volume = sum((log.weight or 0) * (log.reps or 0) for log in logs)
-    
-    # Agrupar por ejercicio
-    from collections import defaultdict
-    exercises_data = defaultdict(list)
-    for log in logs:
-        exercises_data[log.id].append({
-            'set_number': log.set_number,
-            'weight': log.weight,
-            'reps': log.reps,
-            'rpe': log.rpe,
-            'timestamp': log.timestamp.isoformat()
-        })
-    
-    exercise_summary = [
-        {
-            'exercise_id': ex_id,
-            'exercise_name': logs[0].name if logs else 'Unknown',
-            'sets': exercises_data[ex_id]
-        }
-        for ex_id in exercises_data.keys()
-    ]
-    
-    # Calcular duración
-    duration_minutes = None
-    if session.end_time:
-        duration_seconds = (session.end_time - session.start_time).total_seconds()
-        duration_minutes = round(duration_seconds / 60, 1)
+    stored = SessionDetail.query.filter_by(session_id=id, user_id=user_id).first()
+    if stored is None:
+        session = WorkoutSession.query.filter_by(id=id, user_id=user_id).first_or_404()
+        if session.end_time is None:
+            # Sesión en curso: aún cambia, se valida con la versión de datos del usuario
+            return etag_by_data_version(lambda: (jsonify(build_session_detail(session)), 200))()
+        stored = store_session_detail(session)
     
-    return jsonify({
-        'id': session.id,
-        'routine_id': session.routine_id,
-        'start_time': session.start_time.isoformat(),
-        'end_time': session.end_time.isoformat() if session.end_time else None,
-        'duration_minutes': duration_minutes,
-        'total_volume': round(total_volume, 2),
-        'exercises': exercise_summary
-    }), 200
+    if request.if_none_match.contains(stored.etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(stored.payload)
+        response.mimetype = 'application/json'
+    response.set_etag(stored.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
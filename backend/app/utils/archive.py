@@ -0,0 +1,227 @@
+import os
+import uuid
+import shutil
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import insert
+from ..models import db, LogArchive, WorkoutSession, WorkoutLog, SyncTombstone
+
+# Columnas de cada fichero y su tipo. Los None de reps/rpe se guardan como -1 y los de peso como NaN
+COLUMNS = {
+    'id': np.int64,
+    'session_id': np.int64,
+    'exercise_id': np.int64,
+    'set_number': np.int32,
+    'weight': np.float64,
+    'reps': np.int32,
+    'rpe': np.int32,
+    'timestamp': 'datetime64[us]',
+    'training_date': 'datetime64[D]',
+    'session_start': 'datetime64[us]',
+}
+MISSING_INT = -1
+DELETE_CHUNK = 1000
+
+
+def archive_root():
+    path = current_app.config.get('LOG_ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'archive')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _empty():
+    return {name: np.array([], dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def _to_arrays(rows):
+    """Pasa filas (id, session_id, ..., session_start) a un array por columna."""
+    columns = list(zip(*rows)) if rows else [() for _ in COLUMNS]
+    arrays = {}
+    for (name, dtype), values in zip(COLUMNS.items(), columns):
+        if name in ('set_number', 'reps', 'rpe'):
+            values = [MISSING_INT if v is None else v for v in values]
+        elif name == 'weight':
+            values = [np.nan if v is None else v for v in values]
+        arrays[name] = np.array(values, dtype=dtype)
+    return arrays
+
+
+def archive_user(user_id, cutoff):
+    """
+    Mueve a un fichero .npz las series de las sesiones finalizadas del usuario que
+    empezaron antes de cutoff. El fichero se escribe antes de borrar nada: si la
+    transacción falla se elimina y workout_logs queda intacto. Las series movidas dejan
+    una lápida y las sesiones avanzan updated_at, para que la sincronización offline las
+    retire del cliente y reciba el flag archived.
+    Devuelve (sesiones, series) archivadas.
+    """
+    from .versioning import bump_data_version
+
+    session_ids = [
+        row.id for row in db.session.query(WorkoutSession.id).filter(
+            WorkoutSession.user_id == user_id,
+            WorkoutSession.end_time.isnot(None),
+            WorkoutSession.start_time < cutoff,
+            WorkoutSession.archived.is_(False)
+        )
+    ]
+    if not session_ids:
+        return 0, 0
+
+    rows = []
+    for i in range(0, len(session_ids), DELETE_CHUNK):
+        rows += db.session.query(
+            WorkoutLog.id,
+            WorkoutLog.session_id,
+            WorkoutLog.exercise_id,
+            WorkoutLog.set_number,
+            WorkoutLog.weight,
+            WorkoutLog.reps,
+            WorkoutLog.rpe,
+            WorkoutLog.timestamp,
+            WorkoutLog.training_date,
+            WorkoutSession.start_time
+        ).join(
+            WorkoutSession, WorkoutSession.id == WorkoutLog.session_id
+        ).filter(
+            WorkoutLog.session_id.in_(session_ids[i:i + DELETE_CHUNK])
+        ).order_by(WorkoutLog.id).all()
+
+    path = None
+    if rows:
+        arrays = _to_arrays(rows)
+        # Filas anteriores a la desnormalización sin training_date: se toma el día de inicio
+        missing = np.isnat(arrays['training_date'])
+        arrays['training_date'][missing] = arrays['session_start'][missing].astype('datetime64[D]')
+
+        user_dir = os.path.join(archive_root(), str(user_id))
+        os.makedirs(user_dir, exist_ok=True)
+        path = os.path.join(user_dir, f"logs_{uuid.uuid4().hex}.npz")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+
+        days = arrays['training_date']
+        db.session.add(LogArchive(
+            user_id=user_id,
+            file_path=path,
+            first_day=days.min().item(),
+            last_day=days.max().item(),
+            session_count=len(set(arrays['session_id'].tolist())),
+            set_count=len(rows),
+            size_bytes=os.path.getsize(path)
+        ))
+
+    now = datetime.utcnow()
+    try:
+        for i in range(0, len(session_ids), DELETE_CHUNK):
+            chunk = session_ids[i:i + DELETE_CHUNK]
+            WorkoutLog.query.filter(WorkoutLog.session_id.in_(chunk)).delete(synchronize_session=False)
+            # El UPDATE masivo no dispara el onupdate del modelo: updated_at se fija a mano
+            WorkoutSession.query.filter(WorkoutSession.id.in_(chunk)).update(
+                {WorkoutSession.archived: True, WorkoutSession.updated_at: now}, synchronize_session=False
+            )
+        for i in range(0, len(rows), DELETE_CHUNK):
+            db.session.execute(insert(SyncTombstone), [
+                {'user_id': user_id, 'entity': 'log', 'entity_id': row.id, 'deleted_at': now}
+                for row in rows[i:i + DELETE_CHUNK]
+            ])
+        bump_data_version(user_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        if path and os.path.exists(path):
+            os.remove(path)
+        raise
+
+    return len(session_ids), len(rows)
+
+
+def archive_old_logs(older_than_days=None, user_id=None):
+    """Archiva a todos los usuarios (o a uno). Devuelve (usuarios, sesiones, series) archivados."""
+    if older_than_days is None:
+        older_than_days = current_app.config.get('LOG_ARCHIVE_AFTER_DAYS', 365)
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    candidates = db.session.query(WorkoutSession.user_id).filter(
+        WorkoutSession.end_time.isnot(None),
+        WorkoutSession.start_time < cutoff,
+        WorkoutSession.archived.is_(False)
+    )
+    if user_id is not None:
+        candidates = candidates.filter(WorkoutSession.user_id == user_id)
+    user_ids = [row.user_id for row in candidates.distinct()]
+
+    users = sessions = sets = 0
+    for uid in user_ids:
+        archived_sessions, archived_sets = archive_user(uid, cutoff)
+        if archived_sessions:
+            users += 1
+            sessions += archived_sessions
+            sets += archived_sets
+    return users, sessions, sets
+
+
+def load_archived_logs(user_id, start=None, end=None, exercise_ids=None, session_id=None):
+    """
+    Series archivadas del usuario como un dict de arrays (vacío si no hay archivo).
+    start / end (fechas, end exclusivo) filtran por training_date; solo se abren los
+    ficheros del manifiesto cuyo rango de días se solapa con el pedido.
+    """
+    manifest = LogArchive.query.filter(LogArchive.user_id == user_id)
+    if start:
+        manifest = manifest.filter(LogArchive.last_day >= start)
+    if end:
+        manifest = manifest.filter(LogArchive.first_day < end)
+    paths = [archive.file_path for archive in manifest.order_by(LogArchive.first_day)]
+    if not paths:
+        return _empty()
+
+    parts = []
+    for path in paths:
+        try:
+            with np.load(path) as data:
+                parts.append({name: data[name] for name in COLUMNS})
+        except OSError as e:
+            current_app.logger.error(f"Archivo de series ilegible {path}: {str(e)}")
+    if not parts:
+        return _empty()
+    arrays = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+
+    mask = np.ones(len(arrays['id']), dtype=bool)
+    if start:
+        mask &= arrays['training_date'] >= np.datetime64(start, 'D')
+    if end:
+        mask &= arrays['training_date'] < np.datetime64(end, 'D')
+    if exercise_ids:
+        mask &= np.isin(arrays['exercise_id'], list(exercise_ids))
+    if session_id is not None:
+        mask &= arrays['session_id'] == session_id
+    return {name: values[mask] for name, values in arrays.items()}
+
+
+def archived_rows(arrays):
+    """Itera las series archivadas como dicts con los mismos valores que devolvería la BD."""
+    for i in range(len(arrays['id'])):
+        weight = arrays['weight'][i]
+        timestamp = arrays['timestamp'][i]
+        start = arrays['session_start'][i]
+        yield {
+            'id': int(arrays['id'][i]),
+            'session_id': int(arrays['session_id'][i]),
+            'exercise_id': int(arrays['exercise_id'][i]),
+            'set_number': int(arrays['set_number'][i]),
+            'weight': None if np.isnan(weight) else float(weight),
+            'reps': None if arrays['reps'][i] == MISSING_INT else int(arrays['reps'][i]),
+            'rpe': None if arrays['rpe'][i] == MISSING_INT else int(arrays['rpe'][i]),
+            'timestamp': None if np.isnat(timestamp) else timestamp.item(),
+            'training_date': arrays['training_date'][i].item(),
+            'session_start': None if np.isnat(start) else start.item(),
+        }
+
+
+def remove_user_archives(user_id):
+    """Borra los ficheros del usuario (el manifiesto se borra en cascada con el usuario)."""
+    shutil.rmtree(os.path.join(archive_root(), str(user_id)), ignore_errors=True)
@@ -0,0 +1,442 @@
+import time
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from collections import OrderedDict
+from flask import current_app, request, g, make_response, Response
+from flask_jwt_extended import get_jwt_identity
+
+
+class LRUBackend:
+    """Caché en memoria del proceso, acotada en número de entradas y con TTL."""
+
+    def __init__(self, max_entries=2048, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._generations = {}  # Sin TTL ni expulsión: un contador que vuelve a 0 daría por buena una instantánea vieja
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def generation(self, key):
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def bump_generation(self, key):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def size(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """Backend compartido entre workers (Redis o compatible). Redis aplica TTL y expulsión."""
+
+    def __init__(self, url, ttl=300):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.evictions = 0  # Las expulsiones las gestiona Redis (maxmemory-policy)
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self.client.set(key, pickle.dumps(value), ex=self.ttl)
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=f"{prefix}*", count=500))
+        if keys:
+            self.client.delete(*keys)
+
+    def generation(self, key):
+        raw = self.client.get(key)
+        return int(raw) if raw is not None else 0
+
+    def bump_generation(self, key):
+        # Sin expiración, por lo mismo que en LRUBackend
+        self.client.incr(key)
+
+    def size(self):
+        return self.client.dbsize()
+
+
+class ResultCache:
+    """
+    Caché de resultados por usuario, endpoint y parámetros. Cada entrada guarda la
+    versión de datos del usuario con la que se calculó: si ha cambiado, es un fallo.
+    """
+
+    def __init__(self, namespace='analytics'):
+        self.namespace = namespace
+        self._backend = None
+        self._counters_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _count(self, counter):
+        # Los hilos del worker comparten la instancia: `+=` sobre un atributo no es atómico
+        with self._counters_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            config = current_app.config
+            ttl = config.get('ANALYTICS_CACHE_TTL', 300)
+            redis_url = config.get('ANALYTICS_CACHE_REDIS_URL')
+            if redis_url:
+                try:
+                    self._backend = RedisBackend(redis_url, ttl=ttl)
+                except ImportError:
+                    current_app.logger.warning("redis no está instalado; se usa la caché en memoria")
+            if self._backend is None:
+                self._backend = LRUBackend(config.get('ANALYTICS_CACHE_MAX_ENTRIES', 2048), ttl=ttl)
+        return self._backend
+
+    def is_enabled(self, endpoint):
+        config = current_app.config
+        return config.get('ANALYTICS_CACHE_ENABLED', True) and endpoint not in config.get('ANALYTICS_CACHE_DISABLED', ())
+
+    def _user_prefix(self, user_id):
+        return f"{self.namespace}:{user_id}:"
+
+    def _key(self, user_id, endpoint):
+        params = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        return f"{self._user_prefix(user_id)}{endpoint}:{request.view_args or ''}:{params}"
+
+    def invalidate_user(self, user_id):
+        """Borra todas las entradas del usuario (llamado desde las rutas de escritura)."""
+        try:
+            self.backend.delete_prefix(self._user_prefix(user_id))
+        except Exception as e:
+            current_app.logger.warning(f"No se pudo invalidar la caché del usuario {user_id}: {str(e)}")
+
+    def stats(self):
+        backend = self.backend
+        with self._counters_lock:
+            hits, misses, stale = self.hits, self.misses, self.stale
+        return {
+            'backend': type(backend).__name__,
+            'entries': backend.size(),
+            'hits': hits,
+            'misses': misses,
+            'stale': stale,
+            'evictions': backend.evictions,
+            'disabled_endpoints': sorted(current_app.config.get('ANALYTICS_CACHE_DISABLED', ()))
+        }
+
+    def cached(self, endpoint):
+        """
+        Decorador para vistas JSON por usuario. Va debajo de @etag_by_data_version
+        (reutiliza la versión que este ya ha leído en g.data_version).
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.is_enabled(endpoint):
+                    return view(*args, **kwargs)
+
+                from .versioning import current_data_version
+                user_id = get_jwt_identity()
+                version = g.get('data_version')
+                if version is None:
+                    version = current_data_version(user_id)
+                key = self._key(user_id, endpoint)
+
+                try:
+                    entry = self.backend.get(key)
+                except Exception as e:
+                    current_app.logger.warning(f"Caché no disponible: {str(e)}")
+                    return view(*args, **kwargs)
+
+                if entry is not None:
+                    cached_version, body = entry
+                    if cached_version == version:
+                        self._count('hits')
+                        return Response(body, status=200, mimetype='application/json')
+                    self._count('stale')
+                self._count('misses')
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and response.is_json:
+                    try:
+                        self.backend.set(key, (version, response.get_data()))
+                    except Exception as e:
+                        current_app.logger.warning(f"No se pudo guardar en caché: {str(e)}")
+                return response
+            return wrapper
+        return decorator
+
+
+class _Flight:
+    """Cálculo en curso de una clave: las peticiones que llegan mientras tanto esperan su resultado."""
+    __slots__ = ('done', 'ok', 'value')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+        self.value = None
+
+
+class SnapshotCache:
+    """
+    Instantáneas compartidas por todos los usuarios (feed y perfiles públicos)
+    con TTL. Pasado el TTL se siguen sirviendo COMMUNITY_CACHE_STALE_SECONDS más mientras un
+    hilo las recalcula. Cada clave se calcula una sola vez a la vez: en el proceso, las demás
+    peticiones esperan al cálculo en curso; con Redis, además, un cerrojo SET NX hace que los
+    otros workers esperen a que el primero publique el resultado.
+    Cada nombre de instantánea tiene una generación que invalidate() incrementa: un cálculo
+    que empezó antes de invalidar no guarda su resultado.
+    """
+
+    def __init__(self, namespace='community'):
+        self.namespace = namespace
+        self._backend = None
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._counters_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.coalesced = 0
+
+    def _count(self, counter):
+        with self._counters_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            config = current_app.config
+            # El backend guarda la entrada mientras aún se pueda servir caducada
+            ttl = config.get('COMMUNITY_CACHE_TTL', 30) + config.get('COMMUNITY_CACHE_STALE_SECONDS', 120)
+            redis_url = config.get('COMMUNITY_CACHE_REDIS_URL')
+            if redis_url:
+                try:
+                    self._backend = RedisBackend(redis_url, ttl=ttl)
+                except ImportError:
+                    current_app.logger.warning("redis no está instalado; se usa la caché en memoria")
+            if self._backend is None:
+                self._backend = LRUBackend(config.get('COMMUNITY_CACHE_MAX_ENTRIES', 1024), ttl=ttl)
+        return self._backend
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='snapshots')
+        return self._executor
+
+    def _read(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            current_app.logger.warning(f"Caché no disponible: {str(e)}")
+            return None
+
+    def _generation_key(self, key):
+        """Clave de la generación del nombre de la instantánea ('community:profile:3:' -> 'community:generation:profile')."""
+        return f"{self.namespace}:generation:{key[len(self.namespace) + 1:].split(':', 1)[0]}"
+
+    def _generation(self, key):
+        try:
+            return self.backend.generation(self._generation_key(key))
+        except Exception as e:
+            current_app.logger.warning(f"Caché no disponible: {str(e)}")
+            return None
+
+    def _store(self, key, value, generation):
+        """Guarda la instantánea si nadie ha invalidado desde que empezó su cálculo."""
+        if generation is None or self._generation(key) != generation:
+            return
+        try:
+            self.backend.set(key, (time.time(), value))
+            # Una invalidación entre la comprobación y el set: borrar lo que se acaba de guardar
+            if self._generation(key) != generation:
+                self.backend.delete_prefix(key)
+        except Exception as e:
+            current_app.logger.warning(f"No se pudo guardar en caché: {str(e)}")
+
+    def _compute(self, key, compute, wait):
+        """
+        Calcula y guarda la instantánea. Con Redis, si otro worker tiene el cerrojo: sin wait
+        se abandona (devuelve None); con wait se espera a que publique el resultado.
+        """
+        client = getattr(self.backend, 'client', None)
+        lock_seconds = current_app.config.get('COMMUNITY_CACHE_LOCK_SECONDS', 10)
+        lock_key = f"{key}:lock"
+        locked = False
+        if client is not None:
+            try:
+                locked = bool(client.set(lock_key, b'1', nx=True, ex=lock_seconds))
+                if not locked:
+                    if not wait:
+                        return None
+                    deadline = time.time() + lock_seconds
+                    while time.time() < deadline:
+                        time.sleep(0.05)
+                        entry = self._read(key)
+                        if entry is not None:
+                            return entry[1]
+                    # El otro worker no ha terminado a tiempo: calcular aquí
+            except Exception as e:
+                current_app.logger.warning(f"Cerrojo de caché no disponible: {str(e)}")
+        try:
+            generation = self._generation(key)
+            value = compute()
+            self._store(key, value, generation)
+            return value
+        finally:
+            if locked:
+                try:
+                    client.delete(lock_key)
+                except Exception:
+                    pass
+
+    def _join_or_lead(self, key):
+        """(vuelo en curso de la clave, True si esta petición es la que debe calcular)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def _land(self, key, flight):
+        flight.done.set()
+        with self._lock:
+            # Tras invalidar puede haber ya otro vuelo con la misma clave
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _single_flight(self, key, compute):
+        flight, leader = self._join_or_lead(key)
+        if not leader:
+            self._count('coalesced')
+            flight.done.wait(current_app.config.get('COMMUNITY_CACHE_LOCK_SECONDS', 10))
+            if flight.ok:
+                return flight.value
+            # El cálculo compartido falló o tarda demasiado
+            return compute()
+        try:
+            flight.value = self._compute(key, compute, wait=True)
+            flight.ok = True
+            return flight.value
+        finally:
+            self._land(key, flight)
+
+    def _revalidate(self, app, key, compute, flight):
+        with app.app_context():
+            try:
+                value = self._compute(key, compute, wait=False)
+                if value is not None:
+                    flight.value, flight.ok = value, True
+            except Exception as e:
+                app.logger.warning(f"Error recalculando la instantánea {key}: {str(e)}")
+            finally:
+                self._land(key, flight)
+
+    def get_or_compute(self, key, compute):
+        config = current_app.config
+        if not config.get('COMMUNITY_CACHE_ENABLED', True):
+            return compute()
+        key = f"{self.namespace}:{key}"
+        entry = self._read(key)
+        if entry is not None:
+            created_at, value = entry
+            age = time.time() - created_at
+            if age < config.get('COMMUNITY_CACHE_TTL', 30):
+                self._count('hits')
+                return value
+            if age < config.get('COMMUNITY_CACHE_TTL', 30) + config.get('COMMUNITY_CACHE_STALE_SECONDS', 120):
+                # Servir la caducada y recalcular en segundo plano (una vez por clave)
+                self._count('stale')
+                flight, leader = self._join_or_lead(key)
+                if leader:
+                    self._get_executor().submit(
+                        self._revalidate, current_app._get_current_object(), key, compute, flight
+                    )
+                return value
+        self._count('misses')
+        return self._single_flight(key, compute)
+
+    @staticmethod
+    def _snapshot_key(name, args):
+        return f"{name}:" + ''.join(f"{arg}:" for arg in args)
+
+    def invalidate(self, name, *args):
+        """
+        Borra las instantáneas de una función, o solo las que empiezan por esos argumentos
+        (p.ej. invalidate('profile', user_id)), para que la próxima petición las recalcule.
+        """
+        prefix = f"{self.namespace}:{self._snapshot_key(name, args)}"
+        # Las peticiones que lleguen a partir de ahora no se suman a los cálculos ya empezados
+        with self._lock:
+            for key in [key for key in self._flights if key.startswith(prefix)]:
+                del self._flights[key]
+        try:
+            self.backend.bump_generation(self._generation_key(prefix))
+            self.backend.delete_prefix(prefix)
+        except Exception as e:
+            current_app.logger.warning(f"No se pudo invalidar la caché {name}: {str(e)}")
+
+    def stats(self):
+        backend = self.backend
+        with self._counters_lock:
+            hits, misses, stale, coalesced = self.hits, self.misses, self.stale, self.coalesced
+        return {
+            'backend': type(backend).__name__,
+            'entries': backend.size(),
+            'hits': hits,
+            'misses': misses,
+            'stale': stale,
+            'coalesced': coalesced,
+            'evictions': backend.evictions
+        }
+
+    def snapshot(self, name):
+        """
+        Decorador para funciones que construyen una instantánea compartida a partir de sus
+        argumentos (la clave es el nombre más los argumentos). El resultado debe poder
+        serializarse con pickle y no depender del usuario de la petición.
+        """
+        def decorator(build):
+            @wraps(build)
+            def wrapper(*args):
+                return self.get_or_compute(self._snapshot_key(name, args), lambda: build(*args))
+            return wrapper
+        return decorator
+
+
+analytics_cache = ResultCache('analytics')
+community_cache = SnapshotCache('community')
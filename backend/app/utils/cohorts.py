@@ -0,0 +1,259 @@
+import time
+import numpy as np
+from sqlalchemy import func
+from ..models import db, User, BodyMetric, PersonalRecord, CohortBin, CohortSample
+from .upsert import upsert, greatest
+
+# Histograma fijo de 1RM estimado: 200 cubetas de 2,5 kg (0-500 kg; lo que pase va a la última)
+BIN_WIDTH = 2.5
+BIN_COUNT = 200
+
+# Franjas de nivel (1-2, 3-5, 6-9, 10-14, 15+) y de peso corporal (<60, 60-69, ..., 110+ kg)
+LEVEL_EDGES = [3, 6, 10, 15]
+WEIGHT_EDGES = [60, 70, 80, 90, 100, 110]
+NO_WEIGHT_CLASS = -1
+
+# Caché en proceso de histogramas acumulados: {(ejercicio, franja, clase): (caduca, acumulado)}
+CACHE_TTL = 60
+_cumulative_cache = {}
+
+
+def level_band(level):
+    return int(np.searchsorted(LEVEL_EDGES, level or 1, side='right'))
+
+
+def weight_class(bodyweight):
+    if not bodyweight:
+        return NO_WEIGHT_CLASS
+    return int(np.searchsorted(WEIGHT_EDGES, bodyweight, side='right'))
+
+
+def describe_level_band(band):
+    edges = [1] + LEVEL_EDGES
+    if band >= len(LEVEL_EDGES):
+        return f"{edges[band]}+"
+    return f"{edges[band]}-{edges[band + 1] - 1}"
+
+
+def describe_weight_class(weight_class_index):
+    if weight_class_index == NO_WEIGHT_CLASS:
+        return 'sin registrar'
+    if weight_class_index == 0:
+        return f"<{WEIGHT_EDGES[0]} kg"
+    if weight_class_index >= len(WEIGHT_EDGES):
+        return f"{WEIGHT_EDGES[-1]}+ kg"
+    return f"{WEIGHT_EDGES[weight_class_index - 1]}-{WEIGHT_EDGES[weight_class_index] - 1} kg"
+
+
+def _bin(e1rm):
+    return min(max(int(e1rm / BIN_WIDTH), 0), BIN_COUNT - 1)
+
+
+def latest_bodyweight(user_id):
+    return db.session.query(BodyMetric.weight).filter(
+        BodyMetric.user_id == user_id,
+        BodyMetric.weight.isnot(None)
+    ).order_by(BodyMetric.date.desc()).limit(1).scalar()
+
+
+def user_cohort(user):
+    """(franja de nivel, clase de peso) actuales del usuario."""
+    return level_band(user.level), weight_class(latest_bodyweight(user.id))
+
+
+def _apply_deltas(deltas):
+    """
+    Aplica {(ejercicio, franja, clase, cubeta): delta} con un incremento atómico por cubeta
+    (sin leer ni bloquear el histograma). Las filas se tocan en orden de clave para que dos
+    transacciones que muevan muestras entre las mismas cubetas no se bloqueen en cruz.
+    """
+    for (exercise_id, band, weight_class_index, b), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        upsert(CohortBin, {
+            'exercise_id': exercise_id, 'level_band': band, 'weight_class': weight_class_index,
+            'bin': b, 'count': max(delta, 0)
+        }, ['exercise_id', 'level_band', 'weight_class', 'bin'], {
+            'count': greatest(CohortBin.__table__.c.count + delta, 0)
+        })
+
+
+def _move_sample(deltas, sample, band, weight_class_index, e1rm):
+    """Acumula en deltas retirar el valor que aportaba la muestra y sumar el nuevo, y la actualiza."""
+    old = (sample.exercise_id, sample.level_band, sample.weight_class, _bin(sample.e1rm))
+    new = (sample.exercise_id, band, weight_class_index, _bin(e1rm))
+    for key, delta in ((old, -1), (new, 1)):
+        deltas[key] = deltas.get(key, 0) + delta
+    sample.level_band = band
+    sample.weight_class = weight_class_index
+    sample.e1rm = e1rm
+
+
+def update_cohort_sample(user_id, exercise_id, e1rm):
+    """
+    Registra el nuevo mejor 1RM del usuario en el histograma de su cohorte actual,
+    retirando antes el valor que aportaba (quizá en otra cohorte). No hace commit.
+    """
+    if not e1rm:
+        return
+    user = User.query.get(user_id)
+    band, weight_class_index = user_cohort(user)
+
+    deltas = {}
+    sample = CohortSample.query.get((user_id, exercise_id))
+    if sample is None:
+        db.session.add(CohortSample(
+            user_id=user_id, exercise_id=exercise_id,
+            level_band=band, weight_class=weight_class_index, e1rm=e1rm
+        ))
+        deltas[(exercise_id, band, weight_class_index, _bin(e1rm))] = 1
+    else:
+        _move_sample(deltas, sample, band, weight_class_index, e1rm)
+    _apply_deltas(deltas)
+
+
+def refresh_user_cohort(user):
+    """
+    Mueve las muestras del usuario a su cohorte actual si ha cambiado (subida de franja de
+    nivel o nuevo peso corporal). Se llama tras subir de nivel y al registrar el peso. No hace commit.
+    """
+    band, weight_class_index = user_cohort(user)
+    stale = CohortSample.query.filter(
+        CohortSample.user_id == user.id,
+        db.or_(CohortSample.level_band != band, CohortSample.weight_class != weight_class_index)
+    ).all()
+    if not stale:
+        return
+    deltas = {}
+    for sample in stale:
+        _move_sample(deltas, sample, band, weight_class_index, sample.e1rm)
+    _apply_deltas(deltas)
+
+
+def _cumulative(exercise_ids, band, weight_class_index):
+    """Histogramas acumulados de la cohorte para varios ejercicios, con caché de CACHE_TTL segundos."""
+    now = time.monotonic()
+    result = {}
+    missing = []
+    for exercise_id in exercise_ids:
+        cached = _cumulative_cache.get((exercise_id, band, weight_class_index))
+        if cached and cached[0] > now:
+            result[exercise_id] = cached[1]
+        else:
+            missing.append(exercise_id)
+
+    if missing:
+        rows = db.session.query(CohortBin.exercise_id, CohortBin.bin, CohortBin.count).filter(
+            CohortBin.level_band == band,
+            CohortBin.weight_class == weight_class_index,
+            CohortBin.exercise_id.in_(missing),
+            CohortBin.count > 0
+        ).all()
+        counts = {}
+        for exercise_id, b, count in rows:
+            counts.setdefault(exercise_id, np.zeros(BIN_COUNT, dtype=np.int64))[b] = count
+        for exercise_id, histogram in counts.items():
+            # Lista de Python: la consulta posterior son dos accesos por índice, sin coste de NumPy
+            cumulative = np.cumsum(histogram).tolist()
+            _cumulative_cache[(exercise_id, band, weight_class_index)] = (now + CACHE_TTL, cumulative)
+            result[exercise_id] = cumulative
+    return result
+
+
+def percentile(cumulative, e1rm):
+    """Rango percentil del valor: los de cubetas inferiores más la mitad de los de su cubeta."""
+    total = cumulative[-1]
+    if total <= 0:
+        return None
+    b = _bin(e1rm)
+    below = cumulative[b - 1] if b > 0 else 0
+    within = cumulative[b] - below
+    return round(100.0 * (below + 0.5 * within) / total, 1)
+
+
+def cohort_percentiles(user):
+    """Percentil de cada récord del usuario en su cohorte, sin leer series de nadie."""
+    band, weight_class_index = user_cohort(user)
+    records = PersonalRecord.query.filter(PersonalRecord.user_id == user.id, PersonalRecord.best_e1rm > 0).all()
+    histograms = _cumulative([r.exercise_id for r in records], band, weight_class_index)
+
+    lifts = []
+    for record in records:
+        cumulative = histograms.get(record.exercise_id)
+        lifts.append({
+            'exercise_id': record.exercise_id,
+            'exercise_name': record.exercise.name if record.exercise else None,
+            'estimated_1rm': round(record.best_e1rm, 2),
+            'percentile': percentile(cumulative, record.best_e1rm) if cumulative else None,
+            'cohort_size': cumulative[-1] if cumulative else 0
+        })
+    return {
+        'level_band': describe_level_band(band),
+        'weight_class': describe_weight_class(weight_class_index),
+        'lifts': sorted(lifts, key=lambda lift: lift['exercise_name'] or '')
+    }
+
+
+def rebuild_cohort_histograms():
+    """
+    Recalcula todos los histogramas desde el índice de récords (mejor 1RM de cada usuario y
+    ejercicio), el nivel y el último peso corporal registrado. Devuelve los histogramas creados.
+    """
+    CohortSample.query.delete(synchronize_session=False)
+    CohortBin.query.delete(synchronize_session=False)
+    _cumulative_cache.clear()
+
+    last_metric = db.session.query(
+        BodyMetric.user_id,
+        func.max(BodyMetric.date).label('date')
+    ).filter(
+        BodyMetric.weight.isnot(None)
+    ).group_by(BodyMetric.user_id).subquery()
+    bodyweights = dict(db.session.query(BodyMetric.user_id, BodyMetric.weight).join(
+        last_metric, (last_metric.c.user_id == BodyMetric.user_id) & (last_metric.c.date == BodyMetric.date)
+    ).filter(BodyMetric.weight.isnot(None)).all())
+
+    rows = db.session.query(
+        PersonalRecord.user_id,
+        PersonalRecord.exercise_id,
+        PersonalRecord.best_e1rm,
+        User.level
+    ).join(
+        User, User.id == PersonalRecord.user_id
+    ).filter(
+        PersonalRecord.best_e1rm > 0
+    ).all()
+    if not rows:
+        db.session.commit()
+        return 0
+
+    user_ids, exercise_ids, e1rms, levels = zip(*rows)
+    exercise_ids = np.array(exercise_ids, dtype=np.int64)
+    e1rms = np.array(e1rms, dtype=np.float64)
+    bands = np.searchsorted(LEVEL_EDGES, [level or 1 for level in levels], side='right')
+    weights = np.array([bodyweights.get(int(u)) or 0 for u in user_ids], dtype=np.float64)
+    classes = np.where(weights > 0, np.searchsorted(WEIGHT_EDGES, weights, side='right'), NO_WEIGHT_CLASS)
+    bins = np.clip((e1rms / BIN_WIDTH).astype(np.int64), 0, BIN_COUNT - 1)
+
+    db.session.bulk_insert_mappings(CohortSample, [
+        {'user_id': int(u), 'exercise_id': int(e), 'level_band': int(b), 'weight_class': int(c), 'e1rm': float(v)}
+        for u, e, b, c, v in zip(user_ids, exercise_ids, bands, classes, e1rms)
+    ])
+
+    # Un histograma por (ejercicio, franja, clase): contar con add.at sobre el índice de cohorte
+    keys = np.stack([exercise_ids, bands, classes], axis=1)
+    cohorts, cohort_index = np.unique(keys, axis=0, return_inverse=True)
+    counts = np.zeros((len(cohorts), BIN_COUNT), dtype=np.int64)
+    np.add.at(counts, (cohort_index.ravel(), bins), 1)
+
+    # Solo las cubetas con muestras; las vacías se crean al primer incremento
+    cohort_rows, bin_rows = np.nonzero(counts)
+    db.session.bulk_insert_mappings(CohortBin, [
+        {
+            'exercise_id': int(cohorts[i][0]), 'level_band': int(cohorts[i][1]), 'weight_class': int(cohorts[i][2]),
+            'bin': int(b), 'count': int(counts[i, b])
+        }
+        for i, b in zip(cohort_rows, bin_rows)
+    ])
+    db.session.commit()
+    return len(cohorts)
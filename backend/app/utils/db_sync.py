@@ -8,6 +8,13 @@ def sync_database_schema(app):
     """
     with app.app_context():
         print("🔍 Verificando integridad del esquema de la base de datos...")
+
+        # Crear tablas nuevas (solo las que no existen; no toca las existentes)
+        try:
+            db.create_all()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ No se pudieron crear las tablas nuevas: {str(e)}")
         
         # Lista de columnas que podrían faltar según el log de errores
         potential_missing_columns = [
@@ -16,6 +23,22 @@ def sync_database_schema(app):
             ("users", "trainer_note_date", "DATETIME DEFAULT NULL"),
             ("routines", "music_url", "VARCHAR(500) DEFAULT NULL"),
             ("workout_sessions", "routine_id", "INT DEFAULT NULL"),
+            ("users", "data_version", "BIGINT NOT NULL DEFAULT 0"),
+            ("workout_logs", "user_id", "INT DEFAULT NULL"),
+            ("workout_logs", "training_date", "DATE DEFAULT NULL"),
+            ("workout_sessions", "archived", "BOOLEAN NOT NULL DEFAULT 0"),
+            ("workout_logs", "client_key", "VARCHAR(64) DEFAULT NULL"),
+            ("workout_logs", "updated_at", "DATETIME DEFAULT NULL"),
+            ("workout_sessions", "updated_at", "DATETIME DEFAULT NULL"),
+            ("workout_sessions", "client_key", "VARCHAR(64) DEFAULT NULL"),
+            ("routines", "updated_at", "DATETIME DEFAULT NULL"),
+            ("body_metrics", "updated_at", "DATETIME DEFAULT NULL"),
+            ("workout_sessions", "total_volume", "FLOAT DEFAULT NULL"),
+            ("workout_sessions", "set_count", "INT DEFAULT NULL"),
+            ("workout_sessions", "exercise_count", "INT DEFAULT NULL"),
+            ("workout_sessions", "duration_seconds", "INT DEFAULT NULL"),
+            ("workout_sessions", "xp_multiplier", "FLOAT DEFAULT NULL"),
+            ("saved_routines", "assigned_by", "INT DEFAULT NULL"),
         ]
         
         for table, column, col_type in potential_missing_columns:
@@ -32,3 +55,103 @@ def sync_database_schema(app):
                 print(f"⚠️ No se pudo verificar/añadir {table}.{column}: {str(e)}")
         
         print("✨ Verificación de esquema completada.")
+
+
+def backfill_log_owners(batch_size=50000):
+    """
+    Copia user_id y el día de entrenamiento de la sesión a las series que aún no los tienen
+    (filas anteriores a la desnormalización). Recorre por rangos de id para no bloquear
+    la tabla entera en una sola transacción. Devuelve el número de filas actualizadas.
+    No se ejecuta al arrancar: lo hace la migración 8f4e2b6c1a37 o, en despliegues sin
+    Alembic, `flask analytics backfill-log-owners`.
+    """
+    pending = db.session.execute(text(
+        "SELECT MIN(id), MAX(id) FROM workout_logs WHERE user_id IS NULL"
+    )).fetchone()
+    if not pending or pending[0] is None:
+        return 0
+
+    first_id, last_id = pending
+    updated = 0
+    for low in range(first_id, last_id + 1, batch_size):
+        result = db.session.execute(text(
+            "UPDATE workout_logs l JOIN workout_sessions s ON s.id = l.session_id "
+            "SET l.user_id = s.user_id, l.training_date = DATE(s.start_time) "
+            "WHERE l.user_id IS NULL AND l.id BETWEEN :low AND :high"
+        ), {'low': low, 'high': low + batch_size - 1})
+        db.session.commit()
+        updated += result.rowcount
+    return updated
+
+
+def backfill_session_summaries(batch_size=5000):
+    """
+    Calcula el resumen de las sesiones finalizadas que aún no lo tienen (anteriores a las
+    columnas de resumen), por rangos de id. Las archivadas se resumen desde sus ficheros .npz.
+    No se ejecuta al arrancar: las vivas las rellena la migración f1a6c8e2d397 y todas
+    `flask analytics backfill-session-summaries`. Devuelve (vivas, archivadas) actualizadas.
+    """
+    pending = db.session.execute(text(
+        "SELECT MIN(id), MAX(id) FROM workout_sessions "
+        "WHERE set_count IS NULL AND end_time IS NOT NULL AND archived = 0"
+    )).fetchone()
+    updated = 0
+    if pending and pending[0] is not None:
+        first_id, last_id = pending
+        for low in range(first_id, last_id + 1, batch_size):
+            result = db.session.execute(text(
+                "UPDATE workout_sessions s LEFT JOIN ("
+                "  SELECT session_id, SUM(COALESCE(weight, 0) * COALESCE(reps, 0)) AS volume,"
+                "         COUNT(*) AS sets, COUNT(DISTINCT exercise_id) AS exercises"
+                "  FROM workout_logs WHERE session_id BETWEEN :low AND :high GROUP BY session_id"
+                ") a ON a.session_id = s.id "
+                "SET s.total_volume = COALESCE(a.volume, 0), s.set_count = COALESCE(a.sets, 0), "
+                "    s.exercise_count = COALESCE(a.exercises, 0), "
+                "    s.duration_seconds = GREATEST(TIMESTAMPDIFF(SECOND, s.start_time, s.end_time), 0) "
+                "WHERE s.set_count IS NULL AND s.end_time IS NOT NULL AND s.archived = 0 "
+                "AND s.id BETWEEN :low AND :high"
+            ), {'low': low, 'high': low + batch_size - 1})
+            db.session.commit()
+            updated += result.rowcount
+    return updated, backfill_archived_summaries()
+
+
+def backfill_archived_summaries():
+    """
+    Resumen de las sesiones archivadas sin él, calculado con las series de sus ficheros .npz.
+    Un fichero por usuario y un commit por usuario. Devuelve el número de sesiones actualizadas.
+    """
+    import numpy as np
+    from sqlalchemy import update
+    from ..models import WorkoutSession
+    from .archive import load_archived_logs, MISSING_INT
+
+    pending = WorkoutSession.query.with_entities(
+        WorkoutSession.id, WorkoutSession.user_id, WorkoutSession.start_time, WorkoutSession.end_time
+    ).filter(
+        WorkoutSession.set_count.is_(None),
+        WorkoutSession.end_time.isnot(None),
+        WorkoutSession.archived.is_(True)
+    ).order_by(WorkoutSession.user_id, WorkoutSession.id).all()
+    by_user = {}
+    for row in pending:
+        by_user.setdefault(row.user_id, []).append(row)
+
+    updated = 0
+    for user_id, sessions in by_user.items():
+        arrays = load_archived_logs(user_id)
+        volume = np.nan_to_num(arrays['weight']) * np.where(arrays['reps'] == MISSING_INT, 0, arrays['reps'])
+        rows = []
+        for session in sessions:
+            mask = arrays['session_id'] == session.id
+            rows.append({
+                'id': session.id,
+                'total_volume': float(volume[mask].sum()),
+                'set_count': int(mask.sum()),
+                'exercise_count': int(len(np.unique(arrays['exercise_id'][mask]))),
+                'duration_seconds': max(int((session.end_time - session.start_time).total_seconds()), 0)
+            })
+        db.session.execute(update(WorkoutSession), rows)
+        db.session.commit()
+        updated += len(rows)
+    return updated
@@ -1,44 +1,160 @@
-from ..models import db, User, Achievement, UserAchievement, WorkoutSession, Routine, RoutineLike, RoutineReview, SavedRoutine, followers
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from sqlalchemy import insert, update
+from ..models import (
+    db, User, Achievement, UserAchievement, WorkoutSession, Exercise, DailyTrainingRollup,
+    SavedRoutine, UserItem, TrainingCalendar, XpEvent
+)
+from .leaderboard import record_xp
+from .upsert import insert_ignore
+from .versioning import bump_data_version
 
-def check_user_achievements(user_id):
-    """
-    Comprueba si el usuario ha cumplido los requisitos para nuevos logros.
-    Devuelve una lista de los logros recién desbloqueados.
-    """
-    user = User.query.get(user_id)
-    if not user:
-        return []
+# Categorías cuyo valor puede cambiar con cada evento: solo se comprueban sus umbrales
+EVENT_CATEGORIES = {
+    'session_finished': ('sessions', 'streak', 'level', 'volume', 'volume_total', 'cardio', 'time_early', 'time_late'),
+    'routine_created': ('social_creates',),
+    'user_followed': ('social_follows',),
+    'routine_reviewed': ('social_reviews',),
+    'routine_saved': ('social_saves',),
+    'routine_liked': ('social_likes_given',),
+    'like_received': ('social_likes',),
+    'routine_assigned': ('coach',),
+    'item_purchased': ('shop',),
+}
 
-    # Obtener logros que el usuario aún no tiene
-    unlocked_ids = [ua.achievement_id for ua in user.achievements]
-    pending_achievements = Achievement.query.filter(~Achievement.id.in_(unlocked_ids)).all()
-    
-    newly_unlocked = []
+# Logros sembrados con una categoría genérica ('time', 'social', 'reviews'): su categoría real por nombre
+RULE_CATEGORIES = {
+    'Madrugador': 'time_early',
+    'Noctámbulo': 'time_late',
+    'Influencer': 'social_likes',
+    'Filántropo': 'social_likes_given',
+    'Crítico': 'social_reviews',
+    # 'volume' es el mejor volumen de una sesión (Bestia del Hierro); estos cuentan el acumulado
+    '1 Tonelada': 'volume_total',
+    '10 Toneladas': 'volume_total',
+    '50 Toneladas': 'volume_total',
+    '100 Toneladas': 'volume_total',
+    'Hulk Smash': 'volume_total',
+    'Atlas': 'volume_total',
+}
 
-    # Valores actuales para comparar
-    stats = {
-        'sessions': user.sessions.count(),
-        'streak': user.longest_streak or 0,
-        'level': user.level or 1,
-        'social_creates': user.routines.count(),
-        'social_follows': user.followed.count(),
-        'social_reviews': RoutineReview.query.filter_by(user_id=user_id).count(),
-        'social_saves': SavedRoutine.query.filter_by(user_id=user_id).count(),
-        'social_likes': db.session.query(db.func.count(RoutineLike.id)).join(Routine).filter(Routine.user_id == user_id).scalar() or 0
-    }
+# Horas de inicio (UTC, como se guardan) que cuentan para los logros de horario
+EARLY_HOURS = range(0, 9)
+LATE_HOURS = range(22, 24)
+
+# Índice de reglas en proceso: {categoría: ([umbrales ordenados], [logros en el mismo orden])}
+RULES_TTL = 300
+_rules_cache = {'expires': 0, 'rules': {}}
+
+
+def _stat(field):
+    """Categoría que se lee de los contadores de user_stats (una lectura por clave)."""
+    def value(user):
+        from .user_stats import get_user_stats
+        return getattr(get_user_stats(user.id), field)
+    return value
+
+
+def _grouped(query, owner, user_ids):
+    return dict(query.filter(owner.in_(user_ids)).group_by(owner))
+
+
+def _best_session_volume(user_ids):
+    return _grouped(db.session.query(WorkoutSession.user_id, db.func.max(WorkoutSession.total_volume)),
+                    WorkoutSession.user_id, user_ids)
+
+
+def _total_volume(user_ids):
+    # El resumen de la sesión cubre también las archivadas, cuyas series ya no están en workout_logs
+    return _grouped(db.session.query(WorkoutSession.user_id, db.func.sum(WorkoutSession.total_volume)).filter(
+        WorkoutSession.end_time.isnot(None)
+    ), WorkoutSession.user_id, user_ids)
+
+
+def _sessions_in_hours(hours):
+    def count(user_ids):
+        return _grouped(db.session.query(WorkoutSession.user_id, db.func.count()).filter(
+            WorkoutSession.end_time.isnot(None),
+            db.extract('hour', WorkoutSession.start_time).between(hours.start, hours.stop - 1)
+        ), WorkoutSession.user_id, user_ids)
+    return count
 
-    for ach in pending_achievements:
-        val = stats.get(ach.category)
-        if val is not None and val >= ach.requirement_value:
-            # ¡Logro desbloqueado!
-            ua = UserAchievement(user_id=user_id, achievement_id=ach.id)
-            db.session.add(ua)
-            
-            # Dar recompensas
-            user.xp += (ach.xp_reward or 0)
-            user.coins += (ach.coins_reward or 0)
-            
-            newly_unlocked.append({
+
+def _cardio_sessions(user_ids):
+    # Desde el rollup diario, que no se archiva: por día, las sesiones finalizadas del ejercicio
+    # de cardio más repetido (una sesión con dos ejercicios de cardio no cuenta dos veces)
+    per_day = db.session.query(
+        DailyTrainingRollup.user_id.label('user_id'),
+        db.func.max(DailyTrainingRollup.session_count).label('sessions')
+    ).join(Exercise, Exercise.id == DailyTrainingRollup.exercise_id).filter(
+        Exercise.muscle_group == 'Cardio',
+        DailyTrainingRollup.user_id.in_(user_ids)
+    ).group_by(DailyTrainingRollup.user_id, DailyTrainingRollup.day).subquery()
+    return _grouped(db.session.query(per_day.c.user_id, db.func.sum(per_day.c.sessions)),
+                    per_day.c.user_id, user_ids)
+
+
+def _assigned_routines(user_ids):
+    return _grouped(db.session.query(SavedRoutine.assigned_by, db.func.count(SavedRoutine.id)).filter(
+        SavedRoutine.is_assigned.is_(True)
+    ), SavedRoutine.assigned_by, user_ids)
+
+
+def _items_owned(user_ids):
+    return _grouped(db.session.query(UserItem.user_id, db.func.count()), UserItem.user_id, user_ids)
+
+
+# Categorías que salen del historial, en bloque para un lote de usuarios: {user_id: valor}
+HISTORY_VALUES = {
+    'volume': _best_session_volume,
+    'volume_total': _total_volume,
+    'cardio': _cardio_sessions,
+    'time_early': _sessions_in_hours(EARLY_HOURS),
+    'time_late': _sessions_in_hours(LATE_HOURS),
+    'coach': _assigned_routines,
+    'shop': _items_owned,
+}
+
+# Categorías que son un contador de user_stats
+STAT_CATEGORIES = {
+    'sessions': 'sessions_count',
+    'social_creates': 'routines_count',
+    'social_follows': 'following_count',
+    'social_reviews': 'reviews_count',
+    'social_saves': 'saves_count',
+    'social_likes': 'likes_received_count',
+    'social_likes_given': 'likes_given_count',
+}
+
+
+def _history(category):
+    def value(user):
+        return HISTORY_VALUES[category]([user.id]).get(user.id) or 0
+    return value
+
+
+# Valor actual de cada categoría cuando quien emite el evento no lo trae: una consulta como mucho
+CATEGORY_VALUES = {
+    'streak': lambda user: user.longest_streak or 0,
+    'level': lambda user: user.level or 1,
+    **{category: _stat(field) for category, field in STAT_CATEGORIES.items()},
+    **{category: _history(category) for category in HISTORY_VALUES},
+}
+
+
+def _rules():
+    """Logros agrupados por categoría y ordenados por umbral (se recargan cada RULES_TTL segundos)."""
+    now = time.monotonic()
+    if _rules_cache['expires'] <= now:
+        rules = {}
+        for ach in Achievement.query.order_by(Achievement.requirement_value).all():
+            category = RULE_CATEGORIES.get(ach.name, ach.category)
+            if category not in CATEGORY_VALUES or ach.requirement_value is None:
+                continue
+            thresholds, achievements = rules.setdefault(category, ([], []))
+            thresholds.append(ach.requirement_value)
+            achievements.append({
                 'id': ach.id,
                 'name': ach.name,
                 'description': ach.description,
@@ -46,8 +162,268 @@ def check_user_achievements(user_id):
                 'xp_reward': ach.xp_reward,
                 'coins_reward': ach.coins_reward
             })
+        _rules_cache['rules'] = rules
+        _rules_cache['expires'] = now + RULES_TTL
+    return _rules_cache['rules']
+
+
+def reset_rules_cache():
+    _rules_cache['expires'] = 0
+
+
+def _evaluate(user_id, categories, values=None):
+    """
+    Desbloquea los logros de las categorías cuyo umbral alcanza el valor actual.
+    values trae los valores que ya conoce quien emite el evento; el resto se calcula
+    con la consulta de su categoría. Hace commit si desbloquea alguno.
+    """
+    rules = _rules()
+    values = values or {}
+    user = None
+    reached = []
+    for category in categories:
+        if category not in rules:
+            continue
+        value = values.get(category)
+        if value is None:
+            user = user or User.query.get(user_id)
+            if user is None:
+                return []
+            value = CATEGORY_VALUES[category](user)
+        thresholds, achievements = rules[category]
+        reached += achievements[:bisect_right(thresholds, value)]
+    if not reached:
+        return []
+
+    unlocked_ids = {
+        row.achievement_id for row in db.session.query(UserAchievement.achievement_id).filter(
+            UserAchievement.user_id == user_id,
+            UserAchievement.achievement_id.in_([ach['id'] for ach in reached])
+        )
+    }
+    newly_unlocked = [ach for ach in reached if ach['id'] not in unlocked_ids]
+    if not newly_unlocked:
+        return []
+
+    from .notifications import notify
+    user = user or User.query.get(user_id)
+    awarded = []
+    level_up = False
+    for ach in newly_unlocked:
+        # ¡Logro desbloqueado! Si otro hilo o worker lo ha insertado antes, la clave única lo
+        # salta y la recompensa ya la pagó quien lo insertó
+        if not insert_ignore(UserAchievement, [{'user_id': user_id, 'achievement_id': ach['id']}],
+                             ['user_id', 'achievement_id']):
+            continue
+        awarded.append(ach)
+
+        # Dar recompensas: la XP del logro no pasa por el potenciador, pero sí puede subir de nivel
+        level_up = user.add_reward_xp(ach['xp_reward'] or 0)['level_up'] or level_up
+        user.coins += (ach['coins_reward'] or 0)
+        record_xp(user_id, ach['xp_reward'], 'achievement')
+
+        # Cada logro queda como aviso: así llega al usuario aunque se haya evaluado en diferido
+        notify(user_id, 'achievement', ach)
+
+    if not awarded:
+        return []
+    if level_up:
+        from .cohorts import refresh_user_cohort
+        refresh_user_cohort(user)
+    bump_data_version(user_id)
+    db.session.commit()
+    return awarded
+
+
+def session_event_values(session, user):
+    """Valores de session_finished que ya están en memoria al finalizar la sesión."""
+    hour = session.start_time.hour
+    return {
+        'streak': user.longest_streak or 0,
+        'level': user.level or 1,
+        # Basta con la sesión recién finalizada: las anteriores ya se evaluaron en su evento
+        'volume': session.total_volume or 0,
+        'time_early': int(hour in EARLY_HOURS),
+        'time_late': int(hour in LATE_HOURS),
+    }
+
+
+def emit_event(user_id, event, **values):
+    """
+    Evento de gamificación de una ruta de escritura (tras su commit). Solo comprueba los
+    logros de las categorías que el evento puede cambiar. Los valores con nombre de
+    categoría (p. ej. streak=7) evitan consultarlos. Devuelve los logros desbloqueados.
+    """
+    return _evaluate(user_id, EVENT_CATEGORIES.get(event, ()), values)
+
+
+def check_user_achievements(user_id):
+    """
+    Comprueba todas las categorías del usuario (recálculos completos).
+    Devuelve una lista de los logros recién desbloqueados.
+    """
+    return _evaluate(user_id, CATEGORY_VALUES.keys())
+
+
+def recompute_users(user_ids, dry_run=False):
+    """
+    Recalcula desde el historial la XP, el nivel, las rachas, los contadores y los logros de un
+    lote de usuarios con consultas por conjuntos, y escribe los cambios en bloque.
+    - XP: la de cada sesión finalizada (session_base_xp por su potenciador) más las
+      recompensas de los logros desbloqueados; el nivel sale de la XP. Si alguna sesión no
+      guardó su potenciador (anteriores a xp_multiplier) o su resumen, la XP calculada se
+      queda corta: entonces ni la XP ni el nivel bajan del valor guardado.
+    - Rachas: del calendario de días entrenados (sin calendario se conservan), completado
+      antes con los días de las sesiones que falten. La más larga nunca baja: el calendario
+      no sabe de los escudos usados antes de que existiera.
+    - Logros: se desbloquean los que ya se cumplen (nunca se retiran), con aviso y monedas.
+      Las monedas son un saldo: solo suman las recompensas de los logros nuevos y las
+      10 por nivel subido, como User.add_xp.
+    Los usuarios que cambian de nivel pasan a su nueva cohorte de percentiles.
+    Bloquea las filas de los usuarios hasta el commit para no pisar sesiones que se finalicen
+    a la vez. En dry_run no escribe nada. Devuelve (usuarios cambiados, logros desbloqueados).
+    """
+    from .sessions import session_base_xp
+    from .training_calendar import streaks_from_calendar, missing_days, mark_days
+    from .rollups import training_day
+    from .user_stats import lock_stats, reconcile_chunk
+    from .notifications import notify
+
+    # Transacción nueva: los bloqueos de usuarios y contadores son sus primeras lecturas y los
+    # recuentos de reconcile_chunk ya ven lo confirmado por quien tuviera las filas
+    db.session.commit()
+    users = db.session.query(
+        User.id, User.xp, User.level, User.coins, User.current_streak, User.longest_streak
+    ).filter(User.id.in_(user_ids)).with_for_update().all()
+    user_ids = [user.id for user in users]
+    if not user_ids:
+        return 0, 0
+    stats_rows = lock_stats(user_ids)
+
+    session_xp = defaultdict(int)
+    incomplete = set()
+    trained_days = defaultdict(set)
+    finished = db.session.query(WorkoutSession).filter(
+        WorkoutSession.user_id.in_(user_ids), WorkoutSession.end_time.isnot(None)
+    ).with_entities(
+        WorkoutSession.user_id, WorkoutSession.start_time, WorkoutSession.total_volume,
+        WorkoutSession.exercise_count, WorkoutSession.set_count, WorkoutSession.xp_multiplier
+    )
+    for session in finished.yield_per(5000):
+        session_xp[session.user_id] += int(
+            session_base_xp(session.total_volume, session.exercise_count) * (session.xp_multiplier or 1.0)
+        )
+        if session.xp_multiplier is None or session.set_count is None:
+            incomplete.add(session.user_id)
+        trained_days[session.user_id].add(training_day(session))
+
+    calendars = defaultdict(list)
+    for row in TrainingCalendar.query.filter(TrainingCalendar.user_id.in_(user_ids)).order_by(TrainingCalendar.year):
+        calendars[row.user_id].append(row)
+    for user_id, days in trained_days.items():
+        missing = missing_days(calendars[user_id], days)
+        if missing:
+            mark_days(user_id, missing)
+            db.session.flush()
+            calendars[user_id] = TrainingCalendar.query.filter_by(user_id=user_id).order_by(TrainingCalendar.year).all()
+
+    owned = defaultdict(set)
+    for user_id, achievement_id in db.session.query(UserAchievement.user_id, UserAchievement.achievement_id).filter(
+        UserAchievement.user_id.in_(user_ids)
+    ):
+        owned[user_id].add(achievement_id)
+
+    xp_rewards = dict(db.session.query(Achievement.id, Achievement.xp_reward))
+    _, _, counts = reconcile_chunk(user_ids, stats_rows)
+    history = {category: resolve(user_ids) for category, resolve in HISTORY_VALUES.items()}
+    rules = _rules()
+
+    plans = []
+    for user in users:
+        if calendars[user.id]:
+            current, longest = streaks_from_calendar(user.id, rows=calendars[user.id])
+            longest = max(longest, user.longest_streak or 0)
+        else:
+            current, longest = user.current_streak or 0, user.longest_streak or 0
+        values = {category: counts[user.id][field] for category, field in STAT_CATEGORIES.items()}
+        values.update({category: history[category].get(user.id) or 0 for category in HISTORY_VALUES})
+        values['streak'] = longest
+
+        # Los logros de nivel dan XP y la XP sube el nivel: repetir hasta que no haya nuevos
+        unlocked, new = set(owned[user.id]), []
+        while True:
+            xp = session_xp[user.id] + sum(xp_rewards.get(achievement_id) or 0 for achievement_id in unlocked)
+            if user.id in incomplete:
+                # Faltan potenciadores o resúmenes: la XP guardada más la de los logros nuevos es un mínimo
+                xp = max(xp, (user.xp or 0) + sum(ach['xp_reward'] or 0 for ach in new))
+            values['level'] = User.level_for_xp(xp)
+            if user.id in incomplete:
+                values['level'] = max(values['level'], user.level or 1)
+            fresh = [
+                ach
+                for category, (thresholds, achievements) in rules.items()
+                for ach in achievements[:bisect_right(thresholds, values.get(category, 0))]
+                if ach['id'] not in unlocked
+            ]
+            if not fresh:
+                break
+            unlocked.update(ach['id'] for ach in fresh)
+            new += fresh
+        plans.append((user, unlocked, new, current, longest))
+
+    # Primero los logros: un evento en diferido puede haber desbloqueado alguno mientras tanto y
+    # entonces ya lo ha pagado él. Solo se pagan (y se avisan) las filas que se insertan aquí
+    unlocks = []
+    for user, _, new, _, _ in plans:
+        for ach in new:
+            if dry_run or insert_ignore(UserAchievement, [{'user_id': user.id, 'achievement_id': ach['id']}],
+                                        ['user_id', 'achievement_id']):
+                unlocks.append((user.id, ach))
+    paid = defaultdict(list)
+    for user_id, ach in unlocks:
+        paid[user_id].append(ach)
+
+    updates, xp_deltas = [], []
+    for user, unlocked, _, current, longest in plans:
+        xp = session_xp[user.id] + sum(xp_rewards.get(achievement_id) or 0 for achievement_id in unlocked)
+        level = User.level_for_xp(xp)
+        if user.id in incomplete:
+            xp = max(xp, (user.xp or 0) + sum(ach['xp_reward'] or 0 for ach in paid[user.id]))
+            level = max(User.level_for_xp(xp), user.level or 1)
+        state = {
+            'xp': xp,
+            'level': level,
+            'coins': (user.coins or 0) + sum(ach['coins_reward'] or 0 for ach in paid[user.id])
+                     + max(level - (user.level or 1), 0) * 10,
+            'current_streak': current,
+            'longest_streak': longest
+        }
+        if all(getattr(user, field) == value for field, value in state.items()):
+            continue
+        updates.append({'id': user.id, **state})
+        if xp != (user.xp or 0):
+            xp_deltas.append({'user_id': user.id, 'amount': xp - (user.xp or 0), 'source': 'recompute'})
 
-    if newly_unlocked:
-        db.session.commit()
+    if dry_run:
+        db.session.rollback()
+        return len(updates), len(unlocks)
 
-    return newly_unlocked
+    if updates:
+        db.session.execute(update(User), updates)
+        User.query.filter(User.id.in_([row['id'] for row in updates])).update(
+            {User.data_version: db.func.coalesce(User.data_version, 0) + 1},
+            synchronize_session=False
+        )
+        levels = {user.id: user.level for user in users}
+        moved = [row['id'] for row in updates if row['level'] != levels[row['id']]]
+        if moved:
+            from .cohorts import refresh_user_cohort
+            for user in User.query.filter(User.id.in_(moved)).populate_existing():
+                refresh_user_cohort(user)
+    if xp_deltas:
+        # La corrección solo entra en la clasificación total, que así cuadra con users.xp
+        db.session.execute(insert(XpEvent), xp_deltas)
+    for user_id, ach in unlocks:
+        notify(user_id, 'achievement', ach)
+    db.session.commit()
+    return len(updates), len(unlocks)
@@ -0,0 +1,107 @@
+import heapq
+import numpy as np
+from ..models import db, WorkoutSession, WorkoutLog, Exercise
+
+
+def history_query(user_id, start=None, end=None, exercise_ids=None):
+    """
+    Consulta del historial de series del usuario (más reciente primero) usada por las exportaciones.
+    Filtra y ordena sobre workout_logs (índice user_id + training_date); la sesión solo se
+    lee por clave primaria para mostrar su hora de inicio.
+    """
+    query = db.session.query(
+        WorkoutSession.start_time,
+        Exercise.name,
+        WorkoutLog.set_number,
+        WorkoutLog.weight,
+        WorkoutLog.reps,
+        WorkoutLog.rpe,
+        WorkoutLog.training_date,
+        WorkoutLog.session_id
+    ).select_from(
+        WorkoutLog
+    ).join(
+        WorkoutSession, WorkoutSession.id == WorkoutLog.session_id
+    ).join(
+        Exercise, Exercise.id == WorkoutLog.exercise_id
+    ).filter(
+        WorkoutLog.user_id == user_id
+    )
+    if start:
+        query = query.filter(WorkoutLog.training_date >= start.date())
+    if end:
+        query = query.filter(WorkoutLog.training_date < end.date())
+    if exercise_ids:
+        query = query.filter(WorkoutLog.exercise_id.in_(exercise_ids))
+    return query.order_by(
+        WorkoutLog.training_date.desc(), WorkoutLog.session_id.desc(), WorkoutLog.set_number
+    )
+
+
+class HistoryRow:
+    """Fila del historial con los mismos atributos que devuelve history_query."""
+    __slots__ = ('start_time', 'name', 'set_number', 'weight', 'reps', 'rpe', 'training_date', 'session_id')
+
+    def __init__(self, start_time, name, set_number, weight, reps, rpe, training_date, session_id):
+        self.start_time = start_time
+        self.name = name
+        self.set_number = set_number
+        self.weight = weight
+        self.reps = reps
+        self.rpe = rpe
+        self.training_date = training_date
+        self.session_id = session_id
+
+
+def _history_order(row):
+    """Clave ascendente equivalente al orden de history_query (día y sesión desc., serie asc.)."""
+    day = row.training_date or row.start_time.date()
+    return (-day.toordinal(), -row.session_id, row.set_number or 0)
+
+
+def history_rows(user_id, start=None, end=None, exercise_ids=None, batch_size=1000):
+    """
+    Historial completo para exportar: las series vivas (en streaming) y las del almacenamiento
+    frío mezcladas en el orden de history_query. Concatenarlas no basta: una sesión antigua
+    sin finalizar no se archiva y queda viva con un día anterior a otras ya archivadas.
+    Lo archivado (manifiesto y nombres de ejercicio) se lee antes de abrir el streaming: en
+    MySQL una consulta en la misma conexión con el cursor sin búfer abierto descarta el resto
+    de sus filas sin avisar.
+    """
+    archived = _archived_history(user_id, start, end, exercise_ids)
+    live = history_query(user_id, start, end, exercise_ids).execution_options(
+        stream_results=True
+    ).yield_per(batch_size)
+    return heapq.merge(live, archived, key=_history_order)
+
+
+def _archived_history(user_id, start, end, exercise_ids):
+    """Series archivadas en el orden de history_query; lee todo lo necesario al llamarla."""
+    from .archive import load_archived_logs, archived_rows
+
+    archived = load_archived_logs(
+        user_id,
+        start.date() if start else None,
+        end.date() if end else None,
+        exercise_ids
+    )
+    if not len(archived['id']):
+        return iter(())
+
+    names = dict(db.session.query(Exercise.id, Exercise.name))
+    # Mismo orden que history_query: día y sesión descendentes, serie ascendente
+    order = np.lexsort((archived['set_number'], -archived['session_id'], -archived['training_date'].astype(np.int64)))
+    archived = {column: values[order] for column, values in archived.items()}
+    return (
+        HistoryRow(
+            row['session_start'],
+            names.get(row['exercise_id'], 'Desconocido'),
+            row['set_number'],
+            row['weight'],
+            row['reps'],
+            row['rpe'],
+            row['training_date'],
+            row['session_id']
+        )
+        for row in archived_rows(archived)
+    )
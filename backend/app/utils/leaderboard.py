@@ -0,0 +1,352 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from ..models import db, User, XpEvent
+
+PERIODS = ('all', 'week', 'month')
+
+
+class _Node:
+    __slots__ = ('key', 'forward', 'span')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.forward = [None] * level
+        self.span = [0] * level  # Posiciones que salta cada enlace
+
+
+class SortedSet:
+    """
+    Sorted set en memoria con los comandos de Redis que usa la clasificación (ZADD, ZINCRBY,
+    ZREM, ZSCORE, ZREVRANK, ZREVRANGE, ZCARD). Es una skip list que guarda cuántas posiciones
+    salta cada enlace, como la de Redis: posición de un miembro y acceso por posición en
+    O(log n). Orden: puntuación descendente y, a igualdad, id ascendente.
+    """
+    MAX_LEVEL = 32
+    P = 0.25
+
+    def __init__(self):
+        self._head = _Node(None, self.MAX_LEVEL)
+        self._level = 1
+        self._scores = {}
+
+    @classmethod
+    def from_items(cls, items):
+        """
+        Construye el conjunto de una vez a partir de [(miembro, puntuación)] sin repetidos:
+        se ordena y se enlaza de izquierda a derecha, sin buscar la posición de cada miembro.
+        """
+        result = cls()
+        ordered = sorted(items, key=lambda item: cls._key(*item))
+        total = len(ordered)
+        head = result._head
+        last = [head] * cls.MAX_LEVEL
+        last_position = [0] * cls.MAX_LEVEL
+        for position, (member, score) in enumerate(ordered, start=1):
+            level = result._random_level()
+            node = _Node(cls._key(member, score), level)
+            for i in range(level):
+                last[i].forward[i] = node
+                last[i].span[i] = position - last_position[i]
+                last[i] = node
+                last_position[i] = position
+            result._level = max(result._level, level)
+            result._scores[member] = score
+        # Los enlaces finales (a None) saltan hasta el final, como tras insertar uno a uno
+        for i in range(result._level):
+            last[i].span[i] = total - last_position[i]
+        return result
+
+    @staticmethod
+    def _key(member, score):
+        return (-score, member)
+
+    def _random_level(self):
+        level = 1
+        while level < self.MAX_LEVEL and random.random() < self.P:
+            level += 1
+        return level
+
+    def _insert(self, key):
+        update = [self._head] * self.MAX_LEVEL
+        rank = [0] * self.MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            rank[i] = 0 if i == self._level - 1 else rank[i + 1]
+            while node.forward[i] is not None and node.forward[i].key < key:
+                rank[i] += node.span[i]
+                node = node.forward[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                self._head.span[i] = len(self._scores)
+            self._level = level
+
+        new = _Node(key, level)
+        for i in range(level):
+            new.forward[i] = update[i].forward[i]
+            update[i].forward[i] = new
+            new.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+
+    def _delete(self, key):
+        update = [self._head] * self.MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+        target = node.forward[0]
+        for i in range(self._level):
+            if update[i].forward[i] is target:
+                update[i].span[i] += target.span[i] - 1
+                update[i].forward[i] = target.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+
+    def zadd(self, member, score):
+        old = self._scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            self._delete(self._key(member, old))
+            del self._scores[member]
+        self._insert(self._key(member, score))
+        self._scores[member] = score
+
+    def zincrby(self, member, amount):
+        score = self._scores.get(member, 0) + amount
+        self.zadd(member, score)
+        return score
+
+    def zrem(self, member):
+        score = self._scores.pop(member, None)
+        if score is not None:
+            self._delete(self._key(member, score))
+
+    def zscore(self, member):
+        return self._scores.get(member)
+
+    def zcard(self):
+        return len(self._scores)
+
+    def zrevrank(self, member):
+        """Posición (desde 0) del miembro, o None si no está."""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        key = self._key(member, score)
+        rank = 0
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key <= key:
+                rank += node.span[i]
+                node = node.forward[i]
+        return rank - 1
+
+    def zrevrange(self, start, stop):
+        """[(miembro, puntuación)] de las posiciones start..stop (ambas incluidas, desde 0)."""
+        stop = min(stop, len(self._scores) - 1)
+        if start < 0 or start > stop:
+            return []
+        target = start + 1
+        traversed = 0
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and traversed + node.span[i] <= target:
+                traversed += node.span[i]
+                node = node.forward[i]
+        result = []
+        while node is not None and len(result) < stop - start + 1:
+            result.append((node.key[1], -node.key[0]))
+            node = node.forward[0]
+        return result
+
+
+def period_start(period, now):
+    """Inicio (UTC) de la ventana del periodo: lunes de esta semana o día 1 del mes. None en 'all'."""
+    if period == 'week':
+        day = now.date() - timedelta(days=now.weekday())
+    elif period == 'month':
+        day = now.date().replace(day=1)
+    else:
+        return None
+    return datetime.combine(day, datetime.min.time())
+
+
+def prune_xp_events(now=None, batch_size=10000):
+    """
+    Borra los xp_events anteriores a la semana y al mes en curso: ninguna clasificación los
+    vuelve a leer (la total parte de users.xp). Por lotes de id. Devuelve las filas borradas.
+    """
+    now = now or datetime.utcnow()
+    cutoff = min(period_start(period, now) for period in ('week', 'month'))
+    deleted = 0
+    while True:
+        ids = [event_id for (event_id,) in db.session.query(XpEvent.id).filter(
+            XpEvent.created_at < cutoff
+        ).order_by(XpEvent.id).limit(batch_size)]
+        if not ids:
+            return deleted
+        XpEvent.query.filter(XpEvent.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+
+
+def record_xp(user_id, amount, source):
+    """Anota XP ganada (o corregida) por el usuario para la clasificación. No hace commit."""
+    if amount:
+        db.session.add(XpEvent(user_id=user_id, amount=amount, source=source))
+
+
+class Leaderboard:
+    """
+    Clasificaciones por XP (total, semanal y mensual) en memoria del proceso. La total parte
+    de users.xp y las de ventana de la suma de xp_events desde su inicio, sin las correcciones
+    del recálculo (no es XP ganada en la semana o el mes, solo cuadra la total); después cada
+    proceso aplica los xp_events nuevos (LEADERBOARD_REFRESH_SECONDS como mucho entre
+    lecturas a la BD) y reconstruye todo cada LEADERBOARD_REBUILD_SECONDS o al cambiar de
+    semana/mes. Los eventos se releen con un margen de LEADERBOARD_SYNC_LAG_SECONDS para no
+    perder los de transacciones que confirmaron tarde (los ya aplicados se saltan por id).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards = {}
+        self._starts = {}
+        self._applied = {}  # id de XpEvent -> created_at, solo los que caen dentro del margen
+        self._synced_at = None
+        self._built_at = None
+        self._checked_at = None
+        self._rebuilding = False
+
+    def _lag(self):
+        return timedelta(seconds=current_app.config.get('LEADERBOARD_SYNC_LAG_SECONDS', 30))
+
+    def _build(self, now):
+        """Clasificaciones nuevas leídas de la BD, sin tocar las que se están sirviendo."""
+        boards = {'all': SortedSet.from_items(
+            (user_id, xp or 0) for user_id, xp in db.session.query(User.id, User.xp)
+        )}
+        starts = {}
+        for period in ('week', 'month'):
+            start = period_start(period, now)
+            totals = db.session.query(XpEvent.user_id, func.sum(XpEvent.amount)).filter(
+                XpEvent.created_at >= start,
+                XpEvent.source != 'recompute'
+            ).group_by(XpEvent.user_id)
+            boards[period] = SortedSet.from_items((user_id, int(total)) for user_id, total in totals)
+            starts[period] = start
+        applied = dict(db.session.query(XpEvent.id, XpEvent.created_at).filter(
+            XpEvent.created_at >= now - self._lag()
+        ))
+        return boards, starts, applied
+
+    def _install(self, now, built):
+        """Sustituye las clasificaciones; los eventos posteriores a now llegan con el siguiente _sync."""
+        self._boards, self._starts, self._applied = built
+        self._synced_at = now
+        self._built_at = time.monotonic()
+
+    def _rebuild(self, now):
+        self._install(now, self._build(now))
+
+    def _rebuild_in_background(self, app):
+        """Reconstruye en otro hilo; mientras, las peticiones siguen con las clasificaciones actuales."""
+        def run():
+            with app.app_context():
+                try:
+                    now = datetime.utcnow()
+                    built = self._build(now)
+                    with self._lock:
+                        self._install(now, built)
+                except Exception as e:
+                    app.logger.error(f"Error reconstruyendo la clasificación: {str(e)}")
+                finally:
+                    self._rebuilding = False
+                    db.session.remove()
+
+        self._rebuilding = True
+        threading.Thread(target=run, name='leaderboard-rebuild', daemon=True).start()
+
+    def _sync(self, now):
+        events = db.session.query(
+            XpEvent.id, XpEvent.user_id, XpEvent.amount, XpEvent.source, XpEvent.created_at
+        ).filter(
+            XpEvent.created_at >= self._synced_at - self._lag()
+        )
+        for event_id, user_id, amount, source, created_at in events:
+            if event_id in self._applied:
+                continue
+            self._applied[event_id] = created_at
+            self._boards['all'].zincrby(user_id, amount)
+            if source == 'recompute':
+                continue
+            for period in ('week', 'month'):
+                if created_at >= self._starts[period]:
+                    self._boards[period].zincrby(user_id, amount)
+        horizon = now - self._lag()
+        self._applied = {event_id: created for event_id, created in self._applied.items() if created >= horizon}
+        self._synced_at = now
+
+    def _refresh(self):
+        """
+        Se llama con el bloqueo tomado. Solo la primera construcción bloquea la petición; las
+        periódicas y las de cambio de semana/mes van en segundo plano (hasta que terminan, la
+        semana o el mes recién empezados se sirven con la ventana anterior).
+        """
+        config = current_app.config
+        now = datetime.utcnow()
+        elapsed = time.monotonic() - (self._checked_at or 0)
+        if self._built_at is None:
+            self._rebuild(now)
+        elif (not self._rebuilding
+                and (time.monotonic() - self._built_at >= config.get('LEADERBOARD_REBUILD_SECONDS', 600)
+                     or any(period_start(period, now) != self._starts[period] for period in ('week', 'month')))):
+            self._rebuild_in_background(current_app._get_current_object())
+        if elapsed >= config.get('LEADERBOARD_REFRESH_SECONDS', 2):
+            self._sync(now)
+        else:
+            return
+        self._checked_at = time.monotonic()
+
+    def top(self, period, limit):
+        """[(posición desde 1, user_id, xp)] de los primeros `limit` del periodo."""
+        with self._lock:
+            self._refresh()
+            entries = self._boards[period].zrevrange(0, limit - 1)
+        return [(rank, user_id, xp) for rank, (user_id, xp) in enumerate(entries, start=1)]
+
+    def position(self, period, user_id, radius=0):
+        """
+        (posición desde 1, xp, total del periodo, vecinos [(posición, user_id, xp)] a `radius`
+        puestos por encima y por debajo). Posición None si el usuario no tiene XP en el periodo.
+        """
+        with self._lock:
+            self._refresh()
+            board = self._boards[period]
+            if period == 'all' and board.zscore(user_id) is None:
+                # Usuario registrado después de construir la clasificación
+                row = db.session.query(User.xp).filter(User.id == user_id).first()
+                if row is not None:
+                    board.zadd(user_id, row.xp or 0)
+            rank = board.zrevrank(user_id)
+            if rank is None:
+                return None, 0, board.zcard(), []
+            first = max(rank - radius, 0)
+            neighbours = board.zrevrange(first, rank + radius)
+            return rank + 1, board.zscore(user_id), board.zcard(), [
+                (first + offset + 1, member, xp) for offset, (member, xp) in enumerate(neighbours)
+            ]
+
+
+leaderboard = Leaderboard()
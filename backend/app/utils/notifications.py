@@ -0,0 +1,110 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from ..models import db, Notification, PendingAchievementEvent
+
+# Hilos por proceso. La evaluación es idempotente (logro único por usuario), así que varios
+# hilos o workers pueden evaluar a la vez, incluso el mismo evento
+ACHIEVEMENT_THREADS = 2
+# Antigüedad a partir de la cual un evento pendiente se da por abandonado y se reencola. Cada
+# proceso revisa los abandonados como mucho una vez por este intervalo, al encolar un evento
+# nuevo; en despliegues sin tráfico, `flask gamification drain-events` hace lo mismo a mano o
+# desde cron
+STALE_EVENT_SECONDS = 300
+
+_executor = None
+_sweep_lock = threading.Lock()
+_last_sweep = None  # time.monotonic() de la última revisión en este proceso
+
+
+def _get_executor(app):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=ACHIEVEMENT_THREADS, thread_name_prefix='achievements')
+    return _executor
+
+
+def _sweep_due():
+    """True si toca revisar los eventos abandonados en este proceso; marca la revisión."""
+    global _last_sweep
+    now = time.monotonic()
+    with _sweep_lock:
+        if _last_sweep is not None and now - _last_sweep < STALE_EVENT_SECONDS:
+            return False
+        _last_sweep = now
+        return True
+
+
+def notify(user_id, kind, data):
+    """Crea un aviso para el usuario. No hace commit."""
+    db.session.add(Notification(user_id=user_id, kind=kind, data=data))
+
+
+def notification_payload(notification):
+    return {
+        'id': notification.id,
+        'kind': notification.kind,
+        'data': notification.data,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+        'read': notification.read_at is not None
+    }
+
+
+def run_pending_event(pending_id):
+    """Evalúa un evento pendiente y lo borra. Si otro hilo ya lo ha hecho, no hace nada."""
+    from .gamification import emit_event
+    pending = PendingAchievementEvent.query.filter_by(id=pending_id).first()
+    if pending is None:
+        return
+    emit_event(pending.user_id, pending.event, **(pending.values or {}))
+    PendingAchievementEvent.query.filter_by(id=pending_id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _run_achievement_event(app, pending_id):
+    """Evalúa los logros del evento fuera de la petición; los desbloqueados llegan como avisos."""
+    with app.app_context():
+        try:
+            run_pending_event(pending_id)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Error evaluando el evento de logros {pending_id}: {str(e)}")
+        finally:
+            db.session.remove()
+
+
+def stale_event_ids(older_than_seconds=STALE_EVENT_SECONDS):
+    cutoff = datetime.utcnow() - timedelta(seconds=older_than_seconds)
+    return [row.id for row in db.session.query(PendingAchievementEvent.id).filter(
+        PendingAchievementEvent.created_at < cutoff
+    ).order_by(PendingAchievementEvent.id)]
+
+
+def _resubmit_stale_events(app):
+    with app.app_context():
+        try:
+            for pending_id in stale_event_ids():
+                _executor.submit(_run_achievement_event, app, pending_id)
+        except Exception as e:
+            app.logger.error(f"No se pudieron recuperar los eventos de logros pendientes: {str(e)}")
+        finally:
+            db.session.remove()
+
+
+def defer_achievement_event(user_id, event, **values):
+    """
+    Encola el evento de gamificación del usuario. Llamar después del commit de la petición
+    para que el hilo vea los datos ya confirmados. El evento se guarda antes de encolarlo:
+    si el proceso se reinicia sin evaluarlo, otro lo recupera.
+    """
+    pending = PendingAchievementEvent(user_id=user_id, event=event, values=values)
+    db.session.add(pending)
+    db.session.commit()
+    app = current_app._get_current_object()
+    executor = _get_executor(app)
+    executor.submit(_run_achievement_event, app, pending.id)
+    # Los que un proceso dejó a medias (reinicio, despliegue, error) se recuperan aquí
+    if _sweep_due():
+        executor.submit(_resubmit_stale_events, app)
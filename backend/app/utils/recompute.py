@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from flask import current_app
+from ..models import db, User, RecomputeRun
+
+# App heredada por los procesos del pool (se crean con fork: no hace falta serializarla)
+_app = None
+
+
+def _init_worker():
+    """Cada proceso descarta las conexiones heredadas del padre y trabaja en su propio contexto."""
+    context = _app.app_context()
+    context.push()
+    db.engine.dispose(close=False)
+
+
+def _recompute_chunk(user_ids, dry_run):
+    from .gamification import recompute_users
+    try:
+        return recompute_users(user_ids, dry_run)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.remove()
+
+
+def _user_chunks(after_id, chunk_size):
+    """Ids de usuario por lotes con clave (id > último), sin cargar la tabla entera."""
+    while True:
+        chunk = [uid for (uid,) in db.session.query(User.id).filter(
+            User.id > after_id
+        ).order_by(User.id).limit(chunk_size)]
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1]
+
+
+def run_recompute(workers=None, chunk_size=1000, restart=False, dry_run=False, progress=None):
+    """
+    Recalcula XP, nivel, rachas, contadores y logros de todos los usuarios por lotes,
+    repartidos en un pool de procesos. El avance se guarda en recompute_runs tras cada lote
+    (solo hasta donde todos los anteriores han terminado), así que un recálculo interrumpido
+    continúa desde ahí salvo con restart. progress(procesados, total, cambiados) se llama tras
+    cada lote. Devuelve (ejecución, logros desbloqueados en esta llamada).
+    """
+    global _app
+    from .gamification import reset_rules_cache, recompute_users
+
+    run = None
+    if not restart:
+        run = RecomputeRun.query.filter_by(status='running', dry_run=dry_run).order_by(RecomputeRun.id.desc()).first()
+    if run is None:
+        run = RecomputeRun(dry_run=dry_run)
+        db.session.add(run)
+        db.session.commit()
+    total = run.processed + User.query.filter(User.id > run.last_user_id).count()
+    unlocked = 0
+
+    def checkpoint(last_id, count, result):
+        nonlocal unlocked
+        changed, chunk_unlocked = result
+        run.last_user_id = last_id
+        run.processed += count
+        run.changed += changed
+        unlocked += chunk_unlocked
+        db.session.commit()
+        if progress:
+            progress(run.processed, total, run.changed)
+
+    # Primero las entradas: las sesiones sin resumen (también las archivadas) darían 20 XP
+    if not dry_run:
+        from .db_sync import backfill_session_summaries
+        backfill_session_summaries()
+
+    # Los logros recién sembrados deben entrar en este recálculo
+    reset_rules_cache()
+    workers = workers or min(4, os.cpu_count() or 1)
+    chunks = _user_chunks(run.last_user_id, chunk_size)
+
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        for chunk in chunks:
+            checkpoint(chunk[-1], len(chunk), recompute_users(chunk, dry_run))
+    else:
+        _app = current_app._get_current_object()
+        db.session.commit()
+        db.engine.dispose()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker
+        ) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append((chunk[-1], len(chunk), pool.submit(_recompute_chunk, chunk, dry_run)))
+                # Como mucho dos lotes en cola por proceso; el punto de reanudación avanza en orden
+                while pending and (len(pending) >= workers * 2 or pending[0][2].done()):
+                    last_id, count, future = pending.popleft()
+                    checkpoint(last_id, count, future.result())
+            while pending:
+                last_id, count, future = pending.popleft()
+                checkpoint(last_id, count, future.result())
+
+    run.status = 'done'
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+    return run, unlocked
@@ -0,0 +1,205 @@
+from datetime import datetime
+from sqlalchemy import and_, case, func, literal, null, or_
+from ..models import db, PersonalRecord, WorkoutLog, LogArchive
+from .strength import calculate_1rm
+
+
+def _fold(record, weight, reps, when):
+    """
+    Aplica una serie a un récord en memoria y devuelve qué marcas ha batido:
+    'e1rm', 'weight' y/o 'reps'.
+    """
+    weight = weight or 0
+    reps = reps or 0
+    beaten = []
+
+    estimated = calculate_1rm(weight, reps)
+    if estimated > (record.best_e1rm or 0):
+        record.best_e1rm = estimated
+        record.best_e1rm_weight = weight
+        record.best_e1rm_reps = reps
+        record.best_e1rm_date = when
+        beaten.append('e1rm')
+
+    if weight > (record.max_weight or 0) or (weight == record.max_weight and reps > (record.max_weight_reps or 0)):
+        record.max_weight = weight
+        record.max_weight_reps = reps
+        record.max_weight_date = when
+        beaten.append('weight')
+
+    if reps > (record.max_reps or 0) or (reps == record.max_reps and weight > (record.max_reps_weight or 0)):
+        record.max_reps = reps
+        record.max_reps_weight = weight
+        record.max_reps_date = when
+        beaten.append('reps')
+
+    return beaten
+
+
+RECORD_COLUMNS = (
+    'best_e1rm', 'best_e1rm_weight', 'best_e1rm_reps', 'best_e1rm_date',
+    'max_weight', 'max_weight_reps', 'max_weight_date',
+    'max_reps', 'max_reps_weight', 'max_reps_date'
+)
+
+
+def _empty_record(user_id, exercise_id):
+    return PersonalRecord(user_id=user_id, exercise_id=exercise_id, best_e1rm=0, max_weight=0, max_reps=0)
+
+
+def _current_record(user_id, exercise_id):
+    """
+    Copia suelta (fuera de la sesión) del récord guardado, o None. Solo sirve para saber qué
+    marcas bate la serie: la escritura la hace _merge_record en SQL.
+    """
+    row = db.session.query(*(getattr(PersonalRecord, c) for c in RECORD_COLUMNS)).filter(
+        PersonalRecord.user_id == user_id, PersonalRecord.exercise_id == exercise_id
+    ).first()
+    if row is None:
+        return None
+    return PersonalRecord(user_id=user_id, exercise_id=exercise_id, **dict(zip(RECORD_COLUMNS, row)))
+
+
+def _merge_record(best):
+    """
+    Funde en la fila del récord las mejores marcas de `best` con un único upsert. Cada grupo
+    (1RM, peso, repeticiones) se sustituye solo si lo mejora, comparando en SQL contra la
+    fila guardada: dos series concurrentes no chocan al crear la fila ni pierden marcas.
+    Las columnas que deciden cada grupo van al final (MySQL asigna en orden). No hace commit.
+    """
+    from .upsert import upsert, greatest
+    c = PersonalRecord.__table__.c
+
+    def pick(better, value, column):
+        return case((better, null() if value is None else literal(value)), else_=column)
+
+    e1rm_better = c.best_e1rm < best.best_e1rm
+    weight_better = or_(
+        c.max_weight < best.max_weight,
+        and_(c.max_weight == best.max_weight, func.coalesce(c.max_weight_reps, 0) < (best.max_weight_reps or 0))
+    )
+    reps_better = or_(
+        c.max_reps < best.max_reps,
+        and_(c.max_reps == best.max_reps, func.coalesce(c.max_reps_weight, 0) < (best.max_reps_weight or 0))
+    )
+    upsert(PersonalRecord, {
+        'user_id': best.user_id,
+        'exercise_id': best.exercise_id,
+        'updated_at': datetime.utcnow(),
+        **{column: getattr(best, column) for column in RECORD_COLUMNS}
+    }, ['user_id', 'exercise_id'], [
+        ('best_e1rm_weight', pick(e1rm_better, best.best_e1rm_weight, c.best_e1rm_weight)),
+        ('best_e1rm_reps', pick(e1rm_better, best.best_e1rm_reps, c.best_e1rm_reps)),
+        ('best_e1rm_date', pick(e1rm_better, best.best_e1rm_date, c.best_e1rm_date)),
+        ('best_e1rm', greatest(c.best_e1rm, best.best_e1rm)),
+        ('max_weight_date', pick(weight_better, best.max_weight_date, c.max_weight_date)),
+        ('max_weight_reps', pick(weight_better, best.max_weight_reps, c.max_weight_reps)),
+        ('max_weight', greatest(c.max_weight, best.max_weight)),
+        ('max_reps_date', pick(reps_better, best.max_reps_date, c.max_reps_date)),
+        ('max_reps_weight', pick(reps_better, best.max_reps_weight, c.max_reps_weight)),
+        ('max_reps', greatest(c.max_reps, best.max_reps)),
+        ('updated_at', datetime.utcnow()),
+    ])
+
+
+def update_personal_record(user_id, log):
+    """
+    Actualiza el récord del ejercicio con la serie recién registrada.
+    Devuelve la lista de marcas batidas; la primera serie de un ejercicio no cuenta como PR.
+    No hace commit.
+    """
+    return update_personal_records(user_id, [log]).get(log.exercise_id, [])
+
+
+def update_personal_records(user_id, logs):
+    """
+    Actualiza los récords con un lote de series: una lectura y un upsert por ejercicio y,
+    como mucho, una actualización del histograma de cohorte. Devuelve {exercise_id: marcas
+    batidas} con los ejercicios que han batido alguna. No hace commit.
+    """
+    by_exercise = {}
+    for log in logs:
+        by_exercise.setdefault(log.exercise_id, []).append(log)
+
+    new_records = {}
+    for exercise_id, exercise_logs in by_exercise.items():
+        record = _current_record(user_id, exercise_id)
+        is_new = record is None
+        if is_new:
+            record = _empty_record(user_id, exercise_id)
+        best = _empty_record(user_id, exercise_id)
+
+        previous_e1rm = record.best_e1rm
+        beaten = []
+        for i, log in enumerate(exercise_logs):
+            when = log.timestamp or datetime.utcnow()
+            _fold(best, log.weight, log.reps, when)
+            marks = _fold(record, log.weight, log.reps, when)
+            # La primera serie de un ejercicio no cuenta como PR
+            if is_new and i == 0:
+                continue
+            beaten += [mark for mark in marks if mark not in beaten]
+        _merge_record(best)
+
+        if is_new or record.best_e1rm > previous_e1rm:
+            # Mantener el histograma de la cohorte al día con el nuevo mejor 1RM
+            from .cohorts import update_cohort_sample
+            update_cohort_sample(user_id, exercise_id, record.best_e1rm)
+        if beaten:
+            new_records[exercise_id] = beaten
+    return new_records
+
+
+def rebuild_personal_records(user_id=None, batch_size=5000):
+    """
+    Recalcula los récords recorriendo el historial una sola vez en streaming. El borrado y
+    la reconstrucción van en la misma transacción: hasta el commit, las lecturas siguen
+    viendo los récords anteriores. Si se indica user_id solo se reconstruye ese usuario.
+    Devuelve el número de récords.
+    """
+    stale = PersonalRecord.query
+    if user_id is not None:
+        stale = stale.filter(PersonalRecord.user_id == user_id)
+    stale.delete(synchronize_session=False)
+
+    logs = db.session.query(
+        WorkoutLog.user_id,
+        WorkoutLog.exercise_id,
+        WorkoutLog.weight,
+        WorkoutLog.reps,
+        WorkoutLog.timestamp
+    )
+    if user_id is not None:
+        logs = logs.filter(WorkoutLog.user_id == user_id)
+    logs = logs.order_by(WorkoutLog.id).execution_options(stream_results=True).yield_per(batch_size)
+
+    records = {}
+    for log in logs:
+        key = (log.user_id, log.exercise_id)
+        record = records.get(key)
+        if record is None:
+            record = records[key] = PersonalRecord(
+                user_id=log.user_id, exercise_id=log.exercise_id,
+                best_e1rm=0, max_weight=0, max_reps=0
+            )
+        _fold(record, log.weight, log.reps, log.timestamp)
+
+    # Series del almacenamiento frío
+    from .archive import load_archived_logs, archived_rows
+    archived_users = db.session.query(LogArchive.user_id).distinct()
+    if user_id is not None:
+        archived_users = archived_users.filter(LogArchive.user_id == user_id)
+    for (archived_user,) in archived_users.all():
+        for row in archived_rows(load_archived_logs(archived_user)):
+            key = (archived_user, row['exercise_id'])
+            record = records.get(key)
+            if record is None:
+                record = records[key] = PersonalRecord(
+                    user_id=archived_user, exercise_id=row['exercise_id'],
+                    best_e1rm=0, max_weight=0, max_reps=0
+                )
+            _fold(record, row['weight'], row['reps'], row['timestamp'])
+
+    db.session.add_all(records.values())
+    db.session.commit()
+    return len(records)
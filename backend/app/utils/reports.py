@@ -0,0 +1,242 @@
+import os
+import glob
+import uuid
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import func
+from ..models import db, User, ReportJob, WorkoutLog, LogArchive
+from .history import history_rows
+
+# Un trabajo "running" más viejo que esto se da por perdido (p.ej. worker reiniciado)
+STALE_JOB_AFTER = timedelta(minutes=10)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=current_app.config.get('REPORT_WORKERS', 2),
+            thread_name_prefix='reports'
+        )
+    return _executor
+
+
+def reports_dir():
+    path = current_app.config.get('REPORTS_CACHE_DIR') or os.path.join(current_app.instance_path, 'reports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def history_cache_key(user_id):
+    """Huella del historial: cambia en cuanto el usuario registra una serie nueva."""
+    latest = db.session.query(func.max(WorkoutLog.timestamp)).filter(
+        WorkoutLog.user_id == user_id
+    ).scalar()
+    if latest:
+        return latest.strftime('%Y%m%d%H%M%S%f')
+    # Todo el historial está archivado: la huella es el último fichero del manifiesto
+    archived = db.session.query(func.max(LogArchive.id)).filter(LogArchive.user_id == user_id).scalar()
+    return f"archive{archived}" if archived else 'empty'
+
+
+def cached_report_path(user_id, cache_key):
+    return os.path.join(reports_dir(), f"report_{user_id}_{cache_key}.pdf")
+
+
+def build_history_pdf(username, logs):
+    """Renderiza el informe PDF del historial y devuelve los bytes."""
+    from fpdf import FPDF
+
+    class PDF(FPDF):
+        def header(self):
+            # Logo/Título
+            self.set_font('Arial', 'B', 20)
+            self.set_text_color(43, 238, 108) # Color primario #2bee6c
+            self.cell(0, 10, 'GymTrack Pro', 0, 1, 'C')
+            self.set_font('Arial', 'I', 10)
+            self.set_text_color(100, 100, 100)
+            self.cell(0, 10, 'Tu Progresión de Fuerza Documentada', 0, 1, 'C')
+            self.ln(10)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Arial', 'I', 8)
+            self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+
+    pdf = PDF()
+    pdf.add_page()
+
+    # Info de Usuario
+    pdf.set_font('Arial', 'B', 12)
+    pdf.set_text_color(0, 0, 0)
+    pdf.cell(0, 10, f'Informe de Entrenamiento: {username}', 0, 1, 'L')
+    pdf.set_font('Arial', '', 10)
+    pdf.cell(0, 10, f'Fecha de generación: {datetime.now().strftime("%d/%m/%Y %H:%M")}', 0, 1, 'L')
+    pdf.ln(5)
+
+    # Tabla Header
+    pdf.set_fill_color(43, 238, 108)
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font('Arial', 'B', 10)
+
+    col_widths = [35, 75, 20, 25, 25]
+    headers = ['Fecha', 'Ejercicio', 'Serie', 'Peso (kg)', 'Reps']
+
+    for i in range(len(headers)):
+        pdf.cell(col_widths[i], 10, headers[i], 1, 0, 'C', 1)
+    pdf.ln()
+
+    # Datos Tabla
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font('Arial', '', 9)
+    fill = False
+
+    for log in logs:
+        # Alternar color de fondo
+        pdf.set_fill_color(245, 245, 245) if fill else pdf.set_fill_color(255, 255, 255)
+
+        pdf.cell(col_widths[0], 8, log.start_time.strftime('%d/%m/%y') if log.start_time else 'N/A', 1, 0, 'C', 1)
+        pdf.cell(col_widths[1], 8, log.name[:40], 1, 0, 'L', 1)
+        pdf.cell(col_widths[2], 8, str(log.set_number), 1, 0, 'C', 1)
+        pdf.cell(col_widths[3], 8, f'{log.weight}kg', 1, 0, 'C', 1)
+        pdf.cell(col_widths[4], 8, str(log.reps), 1, 0, 'C', 1)
+        pdf.ln()
+        fill = not fill
+
+    return bytes(pdf.output())
+
+
+def _run_pdf_job(app, job_id):
+    """Ejecuta un trabajo PDF fuera de la petición y deja el fichero en la caché de disco."""
+    with app.app_context():
+        job = ReportJob.query.get(job_id)
+        if not job:
+            return
+        try:
+            job.status = 'running'
+            db.session.commit()
+
+            user = User.query.get(job.user_id)
+            logs = history_rows(job.user_id)
+            content = build_history_pdf(user.username, logs)
+
+            # Escritura atómica: otro worker nunca ve un PDF a medias
+            path = cached_report_path(job.user_id, job.cache_key)
+            tmp_path = f"{path}.{job.id}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+            job.file_path = path
+            job.status = 'done'
+        except Exception as e:
+            db.session.rollback()
+            job = ReportJob.query.get(job_id)
+            job.status = 'failed'
+            job.error = str(e)[:255]
+            app.logger.error(f"Error generando informe {job_id}: {str(e)}")
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        try:
+            prune_reports(job.user_id)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f"No se pudieron limpiar los informes del usuario {job.user_id}: {str(e)}")
+        db.session.remove()
+
+
+def submit_pdf_report(user_id):
+    """
+    Encola la generación del PDF del usuario. Si ya hay un PDF en caché para el historial
+    actual, devuelve el trabajo terminado que lo generó (o crea uno 'done' si ya no existe).
+    Devuelve el ReportJob.
+    """
+    cache_key = history_cache_key(user_id)
+    path = cached_report_path(user_id, cache_key)
+
+    if os.path.exists(path):
+        done = ReportJob.query.filter_by(
+            user_id=user_id, cache_key=cache_key, status='done', file_path=path
+        ).order_by(ReportJob.finished_at.desc()).first()
+        if done:
+            return done
+        job = ReportJob(
+            id=uuid.uuid4().hex, user_id=user_id, kind='pdf', cache_key=cache_key,
+            status='done', file_path=path, finished_at=datetime.utcnow()
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    # Reutilizar un trabajo en curso para el mismo historial
+    in_flight = ReportJob.query.filter(
+        ReportJob.user_id == user_id,
+        ReportJob.cache_key == cache_key,
+        ReportJob.status.in_(['pending', 'running']),
+        ReportJob.created_at >= datetime.utcnow() - STALE_JOB_AFTER
+    ).first()
+    if in_flight:
+        return in_flight
+
+    job = ReportJob(id=uuid.uuid4().hex, user_id=user_id, kind='pdf', cache_key=cache_key)
+    db.session.add(job)
+    db.session.commit()
+    _get_executor().submit(_run_pdf_job, current_app._get_current_object(), job.id)
+    return job
+
+
+def prune_reports(user_id=None):
+    """
+    Borra los trabajos de más de REPORT_JOB_TTL_HOURS y los PDF a los que ya no apunta
+    ningún trabajo vivo (ni terminado ni en curso). Un PDF se conserva mientras algún
+    trabajo 'done' lo referencie, así que su descarga no da 410 antes de caducar.
+    Devuelve (trabajos borrados, ficheros borrados).
+    """
+    expired = ReportJob.query.filter(
+        ReportJob.created_at < datetime.utcnow() - timedelta(hours=current_app.config.get('REPORT_JOB_TTL_HOURS', 24))
+    )
+    if user_id is not None:
+        expired = expired.filter(ReportJob.user_id == user_id)
+    jobs_deleted = expired.delete(synchronize_session=False)
+    db.session.commit()
+
+    live = ReportJob.query.filter(ReportJob.status.in_(['pending', 'running', 'done']))
+    if user_id is not None:
+        live = live.filter(ReportJob.user_id == user_id)
+    keep = set()
+    for job in live:
+        # Los trabajos en curso aún no tienen file_path: su fichero se está escribiendo
+        keep.add(job.file_path or cached_report_path(job.user_id, job.cache_key))
+
+    pattern = f"report_{user_id}_*.pdf" if user_id is not None else "report_*.pdf"
+    files_deleted = 0
+    for path in glob.glob(os.path.join(reports_dir(), pattern)):
+        if path in keep:
+            continue
+        try:
+            os.remove(path)
+            files_deleted += 1
+        except OSError:
+            pass
+    return jobs_deleted, files_deleted
+
+
+def job_payload(job):
+    """
+    Estado público de un trabajo (lo que devuelve el endpoint de consulta). Un trabajo en
+    curso demasiado antiguo se informa como fallido sin escribir en la BD: esto se llama
+    desde un GET, y submit_pdf_report ya ignora esos trabajos al encolar.
+    """
+    status, error = job.status, job.error
+    if status in ('pending', 'running') and job.created_at < datetime.utcnow() - STALE_JOB_AFTER:
+        status, error = 'failed', 'Tiempo de generación agotado'
+    return {
+        'job_id': job.id,
+        'status': status,
+        'error': error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
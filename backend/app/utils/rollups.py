@@ -0,0 +1,194 @@
+from datetime import datetime
+from sqlalchemy import func, case, insert, literal
+from ..models import db, DailyTrainingRollup, WorkoutSession, WorkoutLog, LogArchive
+from .strength import calculate_1rm
+
+DAY_TOTAL = DailyTrainingRollup.DAY_TOTAL
+
+
+def training_day(session):
+    """Día al que se imputa el entrenamiento: la fecha de inicio de la sesión."""
+    return (session.start_time or datetime.utcnow()).date()
+
+
+def _apply(user_id, day, exercise_id, sets=0, reps=0, volume=0.0, e1rm=0.0, sessions=0):
+    """
+    Suma los deltas a la fila del rollup con un único INSERT ... ON DUPLICATE KEY UPDATE:
+    la crea si no existe y, si dos peticiones la crean a la vez, la segunda suma sobre la
+    primera. No hace commit.
+    """
+    from .upsert import upsert, greatest
+    table = DailyTrainingRollup.__table__
+    upsert(DailyTrainingRollup, {
+        'user_id': user_id,
+        'day': day,
+        'exercise_id': exercise_id,
+        'set_count': sets,
+        'total_reps': reps,
+        'total_volume': volume,
+        'best_e1rm': e1rm,
+        'session_count': sessions
+    }, ['user_id', 'day', 'exercise_id'], {
+        'set_count': table.c.set_count + sets,
+        'total_reps': table.c.total_reps + reps,
+        'total_volume': table.c.total_volume + volume,
+        'best_e1rm': greatest(table.c.best_e1rm, e1rm),
+        'session_count': table.c.session_count + sessions
+    })
+
+
+def record_set(session, log):
+    """Imputa una serie recién registrada al rollup del ejercicio y al total del día."""
+    day = training_day(session)
+    weight = log.weight or 0
+    reps = log.reps or 0
+    deltas = {
+        'sets': 1,
+        'reps': reps,
+        'volume': weight * reps,
+        'e1rm': calculate_1rm(weight, reps)
+    }
+    _apply(session.user_id, day, log.exercise_id, **deltas)
+    _apply(session.user_id, day, DAY_TOTAL, **deltas)
+
+
+def record_sets(session, logs):
+    """Imputa un lote de series: una actualización por ejercicio y otra para el total del día."""
+    day = training_day(session)
+    totals = {}
+    for log in logs:
+        weight = log.weight or 0
+        reps = log.reps or 0
+        deltas = totals.setdefault(log.exercise_id, {'sets': 0, 'reps': 0, 'volume': 0.0, 'e1rm': 0.0})
+        deltas['sets'] += 1
+        deltas['reps'] += reps
+        deltas['volume'] += weight * reps
+        deltas['e1rm'] = max(deltas['e1rm'], calculate_1rm(weight, reps))
+    if not totals:
+        return
+
+    day_total = {
+        'sets': sum(d['sets'] for d in totals.values()),
+        'reps': sum(d['reps'] for d in totals.values()),
+        'volume': sum(d['volume'] for d in totals.values()),
+        'e1rm': max(d['e1rm'] for d in totals.values())
+    }
+    for exercise_id, deltas in totals.items():
+        _apply(session.user_id, day, exercise_id, **deltas)
+    _apply(session.user_id, day, DAY_TOTAL, **day_total)
+
+
+def record_finished_session(session):
+    """Cuenta una sesión completada en cada ejercicio trabajado y en el total del día."""
+    day = training_day(session)
+    exercise_ids = [
+        row.exercise_id for row in
+        db.session.query(WorkoutLog.exercise_id).filter(WorkoutLog.session_id == session.id).distinct()
+    ]
+    for exercise_id in exercise_ids + [DAY_TOTAL]:
+        _apply(session.user_id, day, exercise_id, sessions=1)
+
+
+def rebuild_rollups(user_id=None):
+    """
+    Reconstruye el rollup desde workout_logs / workout_sessions con dos INSERT ... SELECT.
+    Si se indica user_id solo se reconstruye ese usuario. Devuelve el número de filas creadas.
+    """
+    stale = DailyTrainingRollup.query
+    if user_id is not None:
+        stale = stale.filter(DailyTrainingRollup.user_id == user_id)
+    stale.delete(synchronize_session=False)
+
+    day = func.date(WorkoutSession.start_time)
+    e1rm = case(
+        (WorkoutLog.reps == 1, WorkoutLog.weight),
+        else_=WorkoutLog.weight * (1 + WorkoutLog.reps / 30.0)
+    )
+    finished_session = case((WorkoutSession.end_time.isnot(None), WorkoutSession.id))
+    aggregates = [
+        func.count(WorkoutLog.id),
+        func.coalesce(func.sum(WorkoutLog.reps), 0),
+        func.coalesce(func.sum(WorkoutLog.weight * WorkoutLog.reps), 0),
+        func.coalesce(func.max(e1rm), 0),
+        func.count(func.distinct(finished_session))
+    ]
+    table = DailyTrainingRollup.__table__
+    aggregate_columns = ['set_count', 'total_reps', 'total_volume', 'best_e1rm', 'session_count']
+
+    per_exercise = db.session.query(
+        WorkoutSession.user_id, day, WorkoutLog.exercise_id, *aggregates
+    ).join(
+        WorkoutLog, WorkoutLog.session_id == WorkoutSession.id
+    )
+    per_day = db.session.query(
+        WorkoutSession.user_id, day, literal(DAY_TOTAL), *aggregates
+    ).outerjoin(
+        WorkoutLog, WorkoutLog.session_id == WorkoutSession.id
+    )
+    if user_id is not None:
+        per_exercise = per_exercise.filter(WorkoutSession.user_id == user_id)
+        per_day = per_day.filter(WorkoutSession.user_id == user_id)
+    per_exercise = per_exercise.group_by(WorkoutSession.user_id, day, WorkoutLog.exercise_id)
+    per_day = per_day.group_by(WorkoutSession.user_id, day)
+
+    created = 0
+    for query in (per_exercise, per_day):
+        result = db.session.execute(insert(table).from_select(
+            ['user_id', 'day', 'exercise_id'] + aggregate_columns,
+            query.statement
+        ))
+        created += result.rowcount or 0
+
+    created += _add_archived(user_id)
+    db.session.commit()
+    return created
+
+
+def _add_archived(user_id=None):
+    """
+    Suma al rollup recién reconstruido las series del almacenamiento frío. Las sesiones
+    archivadas siguen en workout_sessions, así que la fila total del día ya las cuenta;
+    aquí solo se añaden sus series y las sesiones por ejercicio. Devuelve las filas creadas.
+    """
+    from .archive import load_archived_logs, archived_rows
+
+    archived_users = db.session.query(LogArchive.user_id).distinct()
+    if user_id is not None:
+        archived_users = archived_users.filter(LogArchive.user_id == user_id)
+
+    created = 0
+    for (archived_user,) in archived_users.all():
+        totals = {}
+        sessions = {}
+        for row in archived_rows(load_archived_logs(archived_user)):
+            weight = row['weight'] or 0
+            reps = row['reps'] or 0
+            for key in ((row['training_date'], row['exercise_id']), (row['training_date'], DAY_TOTAL)):
+                sets, total_reps, volume, e1rm = totals.get(key, (0, 0, 0.0, 0.0))
+                totals[key] = (sets + 1, total_reps + reps, volume + weight * reps, max(e1rm, calculate_1rm(weight, reps)))
+            sessions.setdefault((row['training_date'], row['exercise_id']), set()).add(row['session_id'])
+        if not totals:
+            continue
+
+        existing = {
+            (row.day, row.exercise_id): row for row in DailyTrainingRollup.query.filter(
+                DailyTrainingRollup.user_id == archived_user,
+                DailyTrainingRollup.day.in_({day for day, _ in totals})
+            )
+        }
+        for (day, exercise_id), (sets, reps, volume, e1rm) in totals.items():
+            session_count = len(sessions[(day, exercise_id)]) if exercise_id != DAY_TOTAL else 0
+            row = existing.get((day, exercise_id))
+            if row is None:
+                db.session.add(DailyTrainingRollup(
+                    user_id=archived_user, day=day, exercise_id=exercise_id, set_count=sets,
+                    total_reps=reps, total_volume=volume, best_e1rm=e1rm, session_count=session_count
+                ))
+                created += 1
+            else:
+                row.set_count += sets
+                row.total_reps += reps
+                row.total_volume += volume
+                row.best_e1rm = max(row.best_e1rm, e1rm)
+                row.session_count += session_count
+    return created
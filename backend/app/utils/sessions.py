@@ -0,0 +1,205 @@
+import hashlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from ..models import db, WorkoutSession, WorkoutLog, User, Exercise, SessionDetail
+from .leaderboard import record_xp
+from .versioning import bump_data_version
+
+
+def summarize_session(session):
+    """
+    Guarda en la sesión su resumen (volumen, series, ejercicios distintos y duración) con
+    una sola consulta agregada cubierta por ix_logs_session_exercise. No hace commit.
+    """
+    total_volume, set_count, exercise_count = db.session.query(
+        func.coalesce(func.sum(func.coalesce(WorkoutLog.weight, 0) * func.coalesce(WorkoutLog.reps, 0)), 0),
+        func.count(WorkoutLog.id),
+        func.count(func.distinct(WorkoutLog.exercise_id))
+    ).filter(
+        WorkoutLog.session_id == session.id
+    ).one()
+    session.total_volume = float(total_volume or 0)
+    session.set_count = set_count
+    session.exercise_count = exercise_count
+    if session.start_time and session.end_time:
+        session.duration_seconds = max(int((session.end_time - session.start_time).total_seconds()), 0)
+
+
+def session_base_xp(total_volume, exercise_count):
+    """
+    XP de una sesión finalizada antes de potenciadores: 20 por completarla, 1 por cada 100 kg
+    levantados y 5 por ejercicio distinto. La usa también el recálculo desde el historial.
+    """
+    return 20 + int((total_volume or 0) / 100) + (exercise_count or 0) * 5
+
+
+def complete_session(session, end_time=None):
+    """
+    Finaliza una sesión: resumen, XP, racha y, solo la primera vez, rollup diario, carga y
+    calendario. Compartido por la ruta de finalizar y la sincronización offline. No hace commit.
+    Devuelve (xp base, info de subida de nivel, info de racha, racha más larga previa).
+    """
+    already_finished = session.end_time is not None
+    session.end_time = end_time or datetime.utcnow()
+    if already_finished:
+        invalidate_session_detail(session.id)
+
+    # El resumen guardado es también la entrada de la XP
+    summarize_session(session)
+    xp_gained = session_base_xp(session.total_volume, session.exercise_count)
+
+    # Dar XP al usuario y actualizar racha
+    user = User.query.get(session.user_id)
+    prev_longest = user.longest_streak or 0
+
+    level_up_info = user.add_xp(xp_gained)
+    session.xp_multiplier = level_up_info['multiplier']
+    record_xp(user.id, level_up_info['applied_xp'], 'session')
+    if level_up_info['level_up']:
+        from .cohorts import refresh_user_cohort
+        refresh_user_cohort(user)
+    streak_info = user.update_streak()
+
+    # Contar la sesión en el rollup diario y en la carga de entrenamiento (solo la primera vez que se finaliza)
+    if not already_finished:
+        from .rollups import record_finished_session
+        from .training_load import record_session_load
+        from .training_calendar import mark_training_day
+        from .user_stats import adjust_stats
+        record_finished_session(session)
+        record_session_load(session)
+        mark_training_day(session)
+        adjust_stats(session.user_id, sessions_count=1)
+    bump_data_version(session.user_id)
+
+    return xp_gained, level_up_info, streak_info, prev_longest
+
+
+def build_session_detail(session):
+    """Detalle de la sesión con sus series agrupadas por ejercicio (vivas o del archivo)."""
+    if session.archived:
+        # Series en el almacenamiento frío: solo se abre el fichero que cubre el día de la sesión
+        from collections import namedtuple
+        from .archive import load_archived_logs, archived_rows
+        from .rollups import training_day
+        ArchivedLog = namedtuple('ArchivedLog', 'id name set_number weight reps rpe timestamp')
+        day = training_day(session)
+        names = dict(db.session.query(Exercise.id, Exercise.name))
+        archived = load_archived_logs(session.user_id, day, day + timedelta(days=1), session_id=session.id)
+        logs = sorted((
+            ArchivedLog(row['exercise_id'], names.get(row['exercise_id'], 'Unknown'), row['set_number'],
+                        row['weight'], row['reps'], row['rpe'], row['timestamp'] or session.start_time)
+            for row in archived_rows(archived)
+        ), key=lambda log: log.timestamp)
+    else:
+        logs = db.session.query(
+            Exercise.id,
+            Exercise.name,
+            WorkoutLog.set_number,
+            WorkoutLog.weight,
+            WorkoutLog.reps,
+            WorkoutLog.rpe,
+            WorkoutLog.timestamp
+        ).join(
+            WorkoutLog, WorkoutLog.exercise_id == Exercise.id
+        ).filter(
+            WorkoutLog.session_id == session.id
+        ).order_by(
+            WorkoutLog.timestamp
+        ).all()
+
+    # Calcular volumen total
+    total_volume = sum((log.weight or 0) * (log.reps or 0) for log in logs)
+
+    # Agrupar por ejercicio
+    exercises_data = defaultdict(list)
+    names = {}
+    for log in logs:
+        names[log.id] = log.name
+        exercises_data[log.id].append({
+            'set_number': log.set_number,
+            'weight': log.weight,
+            'reps': log.reps,
+            'rpe': log.rpe,
+            'timestamp': log.timestamp.isoformat()
+        })
+
+    exercise_summary = [
+        {
+            'exercise_id': ex_id,
+            'exercise_name': names.get(ex_id, 'Unknown'),
+            'sets': exercises_data[ex_id]
+        }
+        for ex_id in exercises_data.keys()
+    ]
+
+    # Calcular duración
+    duration_minutes = None
+    if session.end_time:
+        duration_seconds = (session.end_time - session.start_time).total_seconds()
+        duration_minutes = round(duration_seconds / 60, 1)
+
+    return {
+        'id': session.id,
+        'routine_id': session.routine_id,
+        'start_time': session.start_time.isoformat(),
+        'end_time': session.end_time.isoformat() if session.end_time else None,
+        'duration_minutes': duration_minutes,
+        'total_volume': round(total_volume, 2),
+        'exercises': exercise_summary
+    }
+
+
+def _lock_session(session_id):
+    """Bloquea la fila de la sesión hasta el commit (SELECT ... FOR UPDATE)."""
+    db.session.query(WorkoutSession.id).filter(WorkoutSession.id == session_id).with_for_update().first()
+
+
+def store_session_detail(session):
+    """
+    Serializa una vez el detalle de una sesión finalizada y lo guarda con su ETag (hash del
+    contenido). Se construye con la fila de la sesión bloqueada, igual que la edita
+    invalidate_session_detail: una serie añadida a la vez no puede quedar fuera de un detalle
+    guardado después de descartarlo. Si otra petición lo guardó a la vez, se usa el suyo.
+    Hace commit.
+    """
+    # Se cierra la transacción de las lecturas previas para que el bloqueo sea la primera
+    # lectura de la nueva: en REPEATABLE READ la foto de los datos se toma después de esperarlo
+    session_id = session.id
+    db.session.commit()
+    _lock_session(session_id)
+    stored = SessionDetail.query.get(session_id)
+    if stored is not None:
+        db.session.commit()
+        return stored
+
+    session = WorkoutSession.query.get(session_id)
+    payload = current_app.json.dumps(build_session_detail(session)).encode('utf-8')
+    stored = SessionDetail(
+        session_id=session.id,
+        user_id=session.user_id,
+        payload=payload,
+        etag=hashlib.sha1(payload).hexdigest()
+    )
+    db.session.add(stored)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        stored = SessionDetail.query.get(session_id) or stored
+    return stored
+
+
+def invalidate_session_detail(session_id):
+    """Descarta el detalle guardado de la sesión bloqueando antes su fila. No hace commit."""
+    _lock_session(session_id)
+    SessionDetail.query.filter_by(session_id=session_id).delete(synchronize_session=False)
+
+
+def session_edited(session):
+    """Una sesión ya finalizada ha cambiado: recalcular su resumen y descartar el detalle guardado."""
+    invalidate_session_detail(session.id)
+    summarize_session(session)
@@ -0,0 +1,69 @@
+import numpy as np
+
+FORMULAS = ('epley', 'brzycki', 'lombardi', 'rpe')
+
+# Tabla RPE (Tuchscherer): % del 1RM según las repeticiones "hasta el fallo"
+# (reps + repeticiones en reserva, RIR = 10 - RPE), en pasos de media repetición.
+_RPE_REPS_TO_FAILURE = np.arange(1, 16.5, 0.5)
+_RPE_PERCENT = np.array([
+    100.0, 97.8, 95.5, 93.9, 92.2, 90.7, 89.2, 87.8, 86.3, 85.0,
+    83.7, 82.4, 81.1, 79.9, 78.6, 77.4, 76.2, 75.1, 73.9, 72.3,
+    70.7, 69.4, 68.0, 66.7, 65.3, 64.0, 62.6, 61.3, 59.9, 58.6, 57.4
+]) / 100.0
+
+
+def calculate_1rm(weight: float, reps: int) -> float:
+    """Calcula el 1RM usando la fórmula de Epley"""
+    weight = weight or 0
+    reps = reps or 0
+    if reps == 1:
+        return weight
+    return weight * (1 + reps / 30.0)
+
+
+def _as_array(values):
+    """Convierte una secuencia (con posibles None) en un array float64 con NaN para los huecos."""
+    if isinstance(values, np.ndarray):
+        return values.astype(np.float64, copy=False)
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def estimate_1rm(weights, reps, rpe=None, formula='epley'):
+    """
+    Estima el 1RM de muchas series a la vez y devuelve un array de NumPy.
+    formula: 'epley', 'brzycki', 'lombardi' o 'rpe' (tabla RPE; las series sin RPE usan Epley).
+    """
+    if formula not in FORMULAS:
+        raise ValueError(f"Fórmula no soportada: {formula}")
+
+    w = np.nan_to_num(_as_array(weights))
+    r = np.nan_to_num(_as_array(reps))
+
+    if formula == 'brzycki':
+        # Brzycki no está definida a partir de 37 repeticiones
+        return w * 36.0 / (37.0 - np.minimum(r, 36.0))
+    if formula == 'lombardi':
+        return w * np.power(r, 0.10)
+
+    epley = np.where(r == 1, w, w * (1 + r / 30.0))
+    if formula == 'epley' or rpe is None:
+        return epley
+
+    effort = _as_array(rpe)
+    has_rpe = ~np.isnan(effort) & (r > 0)
+    reps_to_failure = np.clip(r + 10.0 - np.clip(np.nan_to_num(effort, nan=10.0), 6.0, 10.0), 1.0, 16.0)
+    percent = np.interp(reps_to_failure, _RPE_REPS_TO_FAILURE, _RPE_PERCENT)
+    return np.where(has_rpe, w / percent, epley)
+
+
+def group_max(keys, values):
+    """
+    Máximo de values por clave, con keys ya ordenadas (p.ej. días de un ORDER BY fecha).
+    Devuelve (claves_unicas, maximos).
+    """
+    keys = np.asarray(keys)
+    values = np.asarray(values, dtype=np.float64)
+    if keys.size == 0:
+        return keys, values
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.maximum.reduceat(values, starts)
@@ -0,0 +1,316 @@
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from ..models import (
+    db, User, WorkoutSession, WorkoutLog, Routine, RoutineExercise, BodyMetric, SyncTombstone
+)
+from .versioning import bump_data_version
+
+METRIC_FIELDS = ('weight', 'body_fat', 'arm_cm', 'waist_cm', 'chest_cm', 'leg_cm')
+MAX_PUSH_MUTATIONS = 500
+
+
+class MutationError(Exception):
+    """Mutación rechazada: status es 'rejected' (datos inválidos) o 'conflict'."""
+    def __init__(self, status, msg, server=None):
+        super().__init__(msg)
+        self.status = status
+        self.msg = msg
+        self.server = server
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def parse_time(value):
+    """ISO 8601 del cliente a datetime UTC sin zona (como se guarda en la BD). None si falta."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def record_deletion(user_id, entity, entity_id):
+    """Deja una lápida para que el borrado llegue a los clientes en el próximo pull. No hace commit."""
+    db.session.add(SyncTombstone(user_id=user_id, entity=entity, entity_id=entity_id))
+
+
+# --- Pull ---------------------------------------------------------------------
+
+def session_to_dict(session):
+    return {
+        'id': session.id,
+        'client_key': session.client_key,
+        'routine_id': session.routine_id,
+        'start_time': _iso(session.start_time),
+        'end_time': _iso(session.end_time),
+        'archived': session.archived,
+        'total_volume': session.total_volume,
+        'set_count': session.set_count,
+        'exercise_count': session.exercise_count,
+        'duration_seconds': session.duration_seconds,
+        'updated_at': _iso(session.updated_at)
+    }
+
+
+def log_to_dict(log):
+    return {
+        'id': log.id,
+        'client_key': log.client_key,
+        'session_id': log.session_id,
+        'exercise_id': log.exercise_id,
+        'set_number': log.set_number,
+        'weight': log.weight,
+        'reps': log.reps,
+        'rpe': log.rpe,
+        'timestamp': _iso(log.timestamp),
+        'updated_at': _iso(log.updated_at)
+    }
+
+
+def metric_to_dict(metric):
+    data = {'id': metric.id, 'date': metric.date.isoformat(), 'updated_at': _iso(metric.updated_at)}
+    data.update({field: getattr(metric, field) for field in METRIC_FIELDS})
+    return data
+
+
+def _routines_to_dicts(routines):
+    exercises = {}
+    if routines:
+        rows = RoutineExercise.query.filter(
+            RoutineExercise.routine_id.in_([r.id for r in routines])
+        ).order_by(RoutineExercise.routine_id, RoutineExercise.order)
+        for row in rows:
+            exercises.setdefault(row.routine_id, []).append({
+                'exercise_id': row.exercise_id,
+                'order': row.order,
+                'sets': row.sets,
+                'reps_target': row.reps_target
+            })
+    return [{
+        'id': r.id,
+        'name': r.name,
+        'description': r.description,
+        'is_public': r.is_public,
+        'music_url': r.music_url,
+        'created_at': _iso(r.created_at),
+        'updated_at': _iso(r.updated_at),
+        'exercises': exercises.get(r.id, [])
+    } for r in routines]
+
+
+def pull_changes(user_id, since=None):
+    """
+    Sesiones, series, rutinas propias y medidas cambiadas después de since (todo si es None),
+    más los borrados. El cursor devuelto va SYNC_CURSOR_LAG_SECONDS por detrás del reloj para
+    no perder filas de transacciones que aún no habían confirmado: el cliente puede recibir
+    dos veces una fila reciente y debe aplicarla como upsert por id.
+    """
+    lag = current_app.config.get('SYNC_CURSOR_LAG_SECONDS', 30)
+    cursor = datetime.utcnow() - timedelta(seconds=lag)
+
+    sessions = WorkoutSession.query.filter(WorkoutSession.user_id == user_id)
+    logs = WorkoutLog.query.filter(WorkoutLog.user_id == user_id)
+    routines = Routine.query.filter(Routine.user_id == user_id)
+    metrics = BodyMetric.query.filter(BodyMetric.user_id == user_id)
+    tombstones = []
+    if since is not None:
+        sessions = sessions.filter(WorkoutSession.updated_at > since)
+        logs = logs.filter(WorkoutLog.updated_at > since)
+        routines = routines.filter(Routine.updated_at > since)
+        metrics = metrics.filter(BodyMetric.updated_at > since)
+        tombstones = SyncTombstone.query.filter(
+            SyncTombstone.user_id == user_id,
+            SyncTombstone.deleted_at > since
+        ).all()
+
+    deleted = {}
+    for tombstone in tombstones:
+        deleted.setdefault(tombstone.entity, []).append(tombstone.entity_id)
+
+    return {
+        'cursor': cursor.isoformat(),
+        'full': since is None,
+        'sessions': [session_to_dict(s) for s in sessions.order_by(WorkoutSession.id)],
+        'logs': [log_to_dict(log) for log in logs.order_by(WorkoutLog.id)],
+        'routines': _routines_to_dicts(routines.order_by(Routine.id).all()),
+        'body_metrics': [metric_to_dict(m) for m in metrics.order_by(BodyMetric.date)],
+        'deleted': deleted
+    }
+
+
+# --- Push ---------------------------------------------------------------------
+
+def _client_key(mutation):
+    key = mutation.get('client_key')
+    if not isinstance(key, str) or not key or len(key) > 64:
+        raise MutationError('rejected', 'client_key requerido (máx. 64 caracteres)')
+    return key
+
+
+def _resolve_session(user_id, mutation):
+    """Sesión de la mutación por session_id o por la client_key con la que se creó offline."""
+    query = WorkoutSession.query.filter(WorkoutSession.user_id == user_id)
+    if mutation.get('session_id') is not None:
+        session = query.filter(WorkoutSession.id == mutation['session_id']).first()
+    elif mutation.get('session_key'):
+        session = query.filter(WorkoutSession.client_key == mutation['session_key']).first()
+    else:
+        raise MutationError('rejected', 'Se requiere session_id o session_key')
+    if session is None:
+        raise MutationError('rejected', 'Sesión no encontrada')
+    return session
+
+
+def _start_session(user_id, mutation):
+    key = _client_key(mutation)
+    existing = WorkoutSession.query.filter_by(user_id=user_id, client_key=key).first()
+    if existing:
+        return 'duplicate', {'id': existing.id}
+    session = WorkoutSession(
+        user_id=user_id,
+        routine_id=mutation.get('routine_id'),
+        start_time=parse_time(mutation.get('start_time')) or datetime.utcnow(),
+        client_key=key
+    )
+    db.session.add(session)
+    db.session.flush()
+    return 'applied', {'id': session.id}
+
+
+def _create_log(user_id, mutation):
+    from .rollups import record_sets, training_day
+    from .records import update_personal_records
+
+    key = _client_key(mutation)
+    session = _resolve_session(user_id, mutation)
+    existing = WorkoutLog.query.filter_by(session_id=session.id, client_key=key).first()
+    if existing:
+        return 'duplicate', {'id': existing.id}
+    if session.archived:
+        raise MutationError('conflict', 'La sesión está archivada y no admite nuevas series')
+    if mutation.get('exercise_id') is None or mutation.get('set_number') is None:
+        raise MutationError('rejected', 'Se requieren exercise_id y set_number')
+
+    log = WorkoutLog(
+        session_id=session.id,
+        user_id=session.user_id,
+        training_date=training_day(session),
+        exercise_id=mutation['exercise_id'],
+        set_number=mutation['set_number'],
+        weight=mutation.get('weight'),
+        reps=mutation.get('reps'),
+        rpe=mutation.get('rpe'),
+        timestamp=parse_time(mutation.get('timestamp')) or datetime.utcnow(),
+        client_key=key
+    )
+    db.session.add(log)
+    db.session.flush()
+    record_sets(session, [log])
+    new_records = update_personal_records(session.user_id, [log])
+    if session.end_time is not None:
+        from .sessions import session_edited
+        session_edited(session)
+    return 'applied', {'id': log.id, 'new_records': new_records.get(log.exercise_id, [])}
+
+
+def _finish_session(user_id, mutation):
+    from .sessions import complete_session
+
+    session = _resolve_session(user_id, mutation)
+    if session.end_time is not None:
+        # Finalizar otra vez daría XP de nuevo: la primera finalización gana
+        return 'duplicate', {'id': session.id}
+    complete_session(session, parse_time(mutation.get('end_time')))
+    return 'applied', {'id': session.id}
+
+
+def _upsert_metric(user_id, mutation):
+    """
+    Medidas de un día. Si el servidor las cambió después de la versión que vio el cliente
+    (base_updated_at), gana el servidor y se devuelve su copia para que el cliente la aplique.
+    """
+    try:
+        day = datetime.strptime(mutation.get('date') or '', '%Y-%m-%d').date()
+    except ValueError:
+        raise MutationError('rejected', 'date debe tener formato YYYY-MM-DD')
+
+    metric = BodyMetric.query.filter_by(user_id=user_id, date=day).first()
+    if metric is not None and metric.updated_at is not None:
+        base = parse_time(mutation.get('base_updated_at'))
+        if base is None or metric.updated_at > base:
+            raise MutationError('conflict', 'Las medidas cambiaron en el servidor', metric_to_dict(metric))
+    if metric is None:
+        metric = BodyMetric(user_id=user_id, date=day)
+        db.session.add(metric)
+    for field in METRIC_FIELDS:
+        if mutation.get(field) not in (None, ''):
+            setattr(metric, field, float(mutation[field]))
+    # Aunque los valores no cambien, la fecha de modificación debe avanzar
+    metric.updated_at = datetime.utcnow()
+    db.session.flush()
+    if mutation.get('weight') not in (None, ''):
+        # El peso corporal decide la cohorte de percentiles
+        from .cohorts import refresh_user_cohort
+        refresh_user_cohort(User.query.get(user_id))
+    return 'applied', {'id': metric.id, 'updated_at': _iso(metric.updated_at)}
+
+
+MUTATIONS = {
+    'session.start': _start_session,
+    'log.create': _create_log,
+    'session.finish': _finish_session,
+    'body_metric.upsert': _upsert_metric,
+}
+
+
+def apply_mutations(user_id, mutations):
+    """
+    Aplica en orden las mutaciones del cliente, cada una en su propio savepoint (una
+    rechazada no deshace las demás), y confirma todo en un único commit.
+    Reglas de conflicto:
+    - Las creaciones son idempotentes por client_key: reenviar devuelve 'duplicate'.
+    - Finalizar una sesión ya finalizada es 'duplicate' (no se repite la XP).
+    - No se añaden series a sesiones archivadas ('conflict').
+    - Medidas: gana el servidor si cambiaron después de base_updated_at ('conflict').
+    Devuelve (resultados, valores del evento session_finished de cada sesión finalizada).
+    """
+    from .gamification import session_event_values
+    results = []
+    changed = False
+    finished = []
+    for index, mutation in enumerate(mutations):
+        kind = mutation.get('type') if isinstance(mutation, dict) else None
+        handler = MUTATIONS.get(kind)
+        if handler is None:
+            results.append({'index': index, 'status': 'rejected', 'msg': f"Tipo de mutación desconocido: {kind}"})
+            continue
+        savepoint = db.session.begin_nested()
+        try:
+            status, data = handler(user_id, mutation)
+            savepoint.commit()
+        except MutationError as e:
+            savepoint.rollback()
+            result = {'index': index, 'status': e.status, 'msg': e.msg}
+            if e.server is not None:
+                result['server'] = e.server
+            results.append(result)
+            continue
+        except (IntegrityError, ValueError, TypeError) as e:
+            savepoint.rollback()
+            results.append({'index': index, 'status': 'rejected', 'msg': str(e.__cause__ or e)[:200]})
+            continue
+        results.append({'index': index, 'status': status, **data})
+        if status == 'applied':
+            changed = True
+            if kind == 'session.finish':
+                session = WorkoutSession.query.get(data['id'])
+                finished.append(session_event_values(session, session.user))
+
+    if changed:
+        bump_data_version(user_id)
+    db.session.commit()
+    return results, finished
@@ -0,0 +1,210 @@
+import base64
+from datetime import date, datetime, timedelta
+import numpy as np
+from ..models import db, TrainingCalendar, WorkoutSession, User
+from .rollups import training_day
+
+YEAR_BITS = 366
+YEAR_BYTES = 46  # 366 bits redondeados a bytes
+
+
+def _bit_index(day):
+    return day.timetuple().tm_yday - 1
+
+
+def _days_in_year(year):
+    return date(year, 12, 31).timetuple().tm_yday
+
+
+def _unpack(blob, year):
+    """Bits del año como array booleano (solo los días que tiene el año)."""
+    bits = np.unpackbits(np.frombuffer(blob, dtype=np.uint8), bitorder='little')
+    return bits[:_days_in_year(year)].astype(bool)
+
+
+def _pack(bits):
+    padded = np.zeros(YEAR_BYTES * 8, dtype=np.uint8)
+    padded[:len(bits)] = bits
+    return np.packbits(padded, bitorder='little').tobytes()
+
+
+def _calendar_row(user_id, year):
+    """Fila del año bloqueada para escritura (la crea vacía si no existe)."""
+    row = TrainingCalendar.query.filter_by(user_id=user_id, year=year).with_for_update().first()
+    if row is None:
+        row = TrainingCalendar(user_id=user_id, year=year, days=bytes(YEAR_BYTES), shielded=bytes(YEAR_BYTES), day_count=0)
+        db.session.add(row)
+    return row
+
+
+def mark_days(user_id, days, shielded=False):
+    """Activa los bits de los días como entrenados (o cubiertos por escudo). No hace commit."""
+    by_year = {}
+    for day in days:
+        by_year.setdefault(day.year, []).append(_bit_index(day))
+
+    for year, indexes in by_year.items():
+        row = _calendar_row(user_id, year)
+        bits = bytearray(row.shielded if shielded else row.days)
+        for i in indexes:
+            bits[i // 8] |= 1 << (i % 8)
+        if shielded:
+            row.shielded = bytes(bits)
+        else:
+            row.days = bytes(bits)
+            row.day_count = sum(bin(b).count('1') for b in bits)
+
+
+def missing_days(rows, days):
+    """Días de days que las filas del calendario del usuario no tienen marcados como entrenados."""
+    by_year = {row.year: row for row in rows}
+    missing = []
+    for day in days:
+        row = by_year.get(day.year)
+        i = _bit_index(day)
+        if row is None or not row.days[i // 8] & (1 << (i % 8)):
+            missing.append(day)
+    return missing
+
+
+def mark_training_day(session):
+    """Marca el día de entrenamiento de una sesión finalizada. No hace commit."""
+    mark_days(session.user_id, [training_day(session)])
+
+
+def _streak_bits(rows, last_year):
+    """
+    Días desde el 1 de enero del primer año como dos arrays: entrenados y cubiertos
+    (entrenados o con escudo).
+    """
+    by_year = {row.year: row for row in rows}
+    first_year = rows[0].year
+    trained, covered = [], []
+    for year in range(first_year, last_year + 1):
+        row = by_year.get(year)
+        if row is None:
+            empty = np.zeros(_days_in_year(year), dtype=bool)
+            trained.append(empty)
+            covered.append(empty)
+        else:
+            days = _unpack(row.days, year)
+            trained.append(days)
+            covered.append(days | _unpack(row.shielded, year))
+    return date(first_year, 1, 1), np.concatenate(trained), np.concatenate(covered)
+
+
+def streaks_from_calendar(user_id, today=None, rows=None):
+    """
+    (racha actual, racha más larga) a partir de los bits. Una racha es un tramo de días
+    cubiertos consecutivos y cuenta sus días entrenados (el escudo mantiene la racha pero
+    no la alarga, como en User.update_streak). La actual sigue viva si se entrenó hoy o ayer.
+    """
+    today = today or datetime.utcnow().date()
+    if rows is None:
+        rows = TrainingCalendar.query.filter_by(user_id=user_id).order_by(TrainingCalendar.year).all()
+    if not rows:
+        return 0, 0
+
+    origin, trained, covered = _streak_bits(rows, max(rows[-1].year, today.year))
+    edges = np.diff(np.r_[0, covered.astype(np.int8), 0])
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if not len(starts):
+        return 0, 0
+    # Días entrenados acumulados: los de un tramo [a, b) son cumulative[b] - cumulative[a]
+    cumulative = np.r_[0, np.cumsum(trained)]
+    longest = int((cumulative[ends] - cumulative[starts]).max())
+
+    current = 0
+    position = (today - origin).days
+    for anchor in (position, position - 1):
+        if 0 <= anchor < len(trained) and trained[anchor]:
+            run = np.searchsorted(starts, anchor, side='right') - 1
+            current = int(cumulative[anchor + 1] - cumulative[starts[run]])
+            break
+    return current, longest
+
+
+def calendar_bitmap(user_id, start, end):
+    """
+    Heatmap compacto: el bitset en base64 de cada año de la ventana, los días entrenados
+    en ella y las rachas calculadas desde los mismos bits.
+    """
+    rows = TrainingCalendar.query.filter_by(user_id=user_id).order_by(TrainingCalendar.year).all()
+    trained = 0
+    years = []
+    for row in rows:
+        if not start.year <= row.year <= end.year:
+            continue
+        bits = _unpack(row.days, row.year)
+        first = _bit_index(start) if row.year == start.year else 0
+        last = _bit_index(end) if row.year == end.year else len(bits) - 1
+        trained += int(bits[first:last + 1].sum())
+        years.append({
+            'year': row.year,
+            'bitmap': base64.b64encode(row.days).decode('ascii'),
+            'shielded': base64.b64encode(row.shielded).decode('ascii'),
+            'day_count': row.day_count
+        })
+
+    current, longest = streaks_from_calendar(user_id, end, rows)
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bit_order': 'lsb',
+        'years': years,
+        'trained_days': trained,
+        'current_streak': current,
+        'longest_streak': longest
+    }
+
+
+def rebuild_training_calendars(user_id=None):
+    """
+    Reconstruye los bits de días entrenados desde las sesiones finalizadas (conserva los
+    de escudo) y recalcula desde ellos current_streak, longest_streak y last_workout_date.
+    Devuelve el número de usuarios procesados.
+    """
+    sessions = db.session.query(WorkoutSession.user_id, WorkoutSession.start_time).filter(
+        WorkoutSession.end_time.isnot(None)
+    )
+    calendars = TrainingCalendar.query
+    if user_id is not None:
+        sessions = sessions.filter(WorkoutSession.user_id == user_id)
+        calendars = calendars.filter(TrainingCalendar.user_id == user_id)
+
+    trained = {}
+    for owner, start_time in sessions.yield_per(5000):
+        day = start_time.date()
+        trained.setdefault((owner, day.year), set()).add(_bit_index(day))
+
+    existing = {(row.user_id, row.year): row for row in calendars}
+    for key, row in existing.items():
+        if key not in trained:
+            row.days = bytes(YEAR_BYTES)
+            row.day_count = 0
+    for (owner, year), indexes in trained.items():
+        row = existing.get((owner, year))
+        if row is None:
+            row = TrainingCalendar(user_id=owner, year=year, shielded=bytes(YEAR_BYTES))
+            db.session.add(row)
+        bits = np.zeros(YEAR_BITS, dtype=np.uint8)
+        bits[list(indexes)] = 1
+        row.days = _pack(bits)
+        row.day_count = len(indexes)
+    db.session.flush()
+
+    owners = {owner for owner, _ in trained} | {owner for owner, _ in existing}
+    for owner in owners:
+        user = User.query.get(owner)
+        if user is None:
+            continue
+        rows = TrainingCalendar.query.filter_by(user_id=owner).order_by(TrainingCalendar.year).all()
+        user.current_streak, user.longest_streak = streaks_from_calendar(owner, rows=rows)
+        last_days = [
+            date(year, 1, 1) + timedelta(days=max(indexes))
+            for (u, year), indexes in trained.items() if u == owner
+        ]
+        user.last_workout_date = max(last_days) if last_days else None
+    db.session.commit()
+    return len(owners)
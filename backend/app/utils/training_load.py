@@ -0,0 +1,181 @@
+from datetime import datetime
+import numpy as np
+from sqlalchemy import func
+from ..models import db, TrainingLoadState, WorkoutSession, WorkoutLog, Exercise
+from .rollups import training_day
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+# Constantes de decaimiento EWMA (Williams et al.): lambda = 2 / (N + 1)
+ACUTE_LAMBDA = 2.0 / (ACUTE_DAYS + 1)
+CHRONIC_LAMBDA = 2.0 / (CHRONIC_DAYS + 1)
+TOTAL_GROUP = 'Total'
+NO_GROUP = 'Sin categoría'
+
+
+def _advance(state, day, load):
+    """
+    Aplica la carga de un día al estado EWMA en O(1). Los días sin entrenar cuentan como
+    carga 0, así que basta con decaer por el hueco; una carga de un día ya pasado se suma
+    con el peso que le corresponde por su antigüedad.
+    """
+    if state.last_day is None:
+        state.acute = ACUTE_LAMBDA * load
+        state.chronic = CHRONIC_LAMBDA * load
+        state.last_load = load
+        state.last_day = day
+    elif day > state.last_day:
+        gap = (day - state.last_day).days
+        state.acute = state.acute * (1 - ACUTE_LAMBDA) ** gap + ACUTE_LAMBDA * load
+        state.chronic = state.chronic * (1 - CHRONIC_LAMBDA) ** gap + CHRONIC_LAMBDA * load
+        state.last_load = load
+        state.last_day = day
+    else:
+        age = (state.last_day - day).days
+        state.acute += ACUTE_LAMBDA * load * (1 - ACUTE_LAMBDA) ** age
+        state.chronic += CHRONIC_LAMBDA * load * (1 - CHRONIC_LAMBDA) ** age
+        if age == 0:
+            state.last_load += load
+
+
+def record_session_load(session):
+    """Avanza el estado de carga del usuario con el volumen de una sesión finalizada. No hace commit."""
+    day = training_day(session)
+    loads = db.session.query(
+        Exercise.muscle_group,
+        func.sum(WorkoutLog.weight * WorkoutLog.reps)
+    ).join(
+        Exercise, Exercise.id == WorkoutLog.exercise_id
+    ).filter(
+        WorkoutLog.session_id == session.id
+    ).group_by(
+        Exercise.muscle_group
+    ).all()
+    if not loads:
+        return
+
+    by_group = {}
+    for muscle, volume in loads:
+        by_group[muscle or NO_GROUP] = by_group.get(muscle or NO_GROUP, 0.0) + float(volume or 0)
+    by_group[TOTAL_GROUP] = sum(by_group.values())
+
+    states = {
+        s.muscle_group: s for s in
+        TrainingLoadState.query.filter(
+            TrainingLoadState.user_id == session.user_id,
+            TrainingLoadState.muscle_group.in_(list(by_group))
+        )
+    }
+    for muscle, load in by_group.items():
+        state = states.get(muscle)
+        if state is None:
+            state = TrainingLoadState(user_id=session.user_id, muscle_group=muscle, acute=0, chronic=0, last_load=0)
+            db.session.add(state)
+        _advance(state, day, load)
+
+
+def acwr_risk(ratio):
+    """Clasificación habitual del ratio agudo:crónico."""
+    if ratio is None:
+        return 'sin_datos'
+    if ratio < 0.8:
+        return 'bajo'
+    if ratio <= 1.3:
+        return 'optimo'
+    if ratio <= 1.5:
+        return 'elevado'
+    return 'alto'
+
+
+def load_snapshot(state, today=None):
+    """Estado decaído hasta hoy (sin entrenamiento desde last_day) y su ACWR."""
+    # Mismo reloj que training_day (UTC): con date.today() el hueco se desfasa un día según la zona del servidor
+    today = today or datetime.utcnow().date()
+    gap = max((today - state.last_day).days, 0) if state.last_day else 0
+    acute = state.acute * (1 - ACUTE_LAMBDA) ** gap
+    chronic = state.chronic * (1 - CHRONIC_LAMBDA) ** gap
+    ratio = round(acute / chronic, 2) if chronic > 0 else None
+    return {
+        'muscle_group': state.muscle_group,
+        'daily_load': round(state.last_load, 2) if gap == 0 else 0.0,
+        'acute_load': round(acute, 2),
+        'chronic_load': round(chronic, 2),
+        'acwr': ratio,
+        'risk': acwr_risk(ratio),
+        'last_training_day': state.last_day.isoformat() if state.last_day else None
+    }
+
+
+def rebuild_training_load(user_id=None):
+    """
+    Recalcula todos los estados de forma vectorizada: como los días sin entrenar tienen
+    carga 0, el EWMA final es sum(lambda * (1 - lambda)^antigüedad * carga). Lee lo mismo que
+    record_session_load, las series de sesiones finalizadas, para que el estado reconstruido
+    coincida con el incremental; el rollup diario incluye también sesiones a medias. Las
+    series archivadas (más de LOG_ARCHIVE_AFTER_DAYS) pesan (1 - lambda)^365 ~ 0 y se omiten.
+    Devuelve el número de estados creados.
+    """
+    stale = TrainingLoadState.query
+    if user_id is not None:
+        stale = stale.filter(TrainingLoadState.user_id == user_id)
+    stale.delete(synchronize_session=False)
+
+    day = func.date(WorkoutSession.start_time)
+    muscle = func.coalesce(Exercise.muscle_group, NO_GROUP)
+    per_group = db.session.query(
+        WorkoutSession.user_id,
+        muscle,
+        day,
+        func.sum(WorkoutLog.weight * WorkoutLog.reps)
+    ).join(
+        WorkoutLog, WorkoutLog.session_id == WorkoutSession.id
+    ).join(
+        Exercise, Exercise.id == WorkoutLog.exercise_id
+    ).filter(
+        WorkoutSession.end_time.isnot(None)
+    )
+    if user_id is not None:
+        per_group = per_group.filter(WorkoutSession.user_id == user_id)
+    rows = [(u, g, d, float(v or 0)) for u, g, d, v in per_group.group_by(WorkoutSession.user_id, muscle, day)]
+    if not rows:
+        db.session.commit()
+        return 0
+
+    # El total del día es la suma de sus grupos, como en record_session_load
+    totals = {}
+    for u, _, d, v in rows:
+        totals[(u, d)] = totals.get((u, d), 0.0) + v
+    rows += [(u, TOTAL_GROUP, d, v) for (u, d), v in totals.items()]
+
+    users, groups, days, loads = zip(*rows)
+    users = np.array(users)
+    groups = np.array(groups)
+    day_num = np.array(days, dtype='datetime64[D]').astype(np.int64)
+    loads = np.array(loads, dtype=np.float64)
+
+    # Ordenar por (usuario, grupo, día) y numerar cada serie temporal
+    order = np.lexsort((day_num, groups, users))
+    users, groups, day_num, loads = users[order], groups[order], day_num[order], loads[order]
+    is_start = np.r_[True, (users[1:] != users[:-1]) | (groups[1:] != groups[:-1])]
+    starts = np.flatnonzero(is_start)
+    series = np.cumsum(is_start) - 1
+
+    last_day = np.maximum.reduceat(day_num, starts)
+    age = last_day[series] - day_num
+    acute = np.bincount(series, weights=ACUTE_LAMBDA * (1 - ACUTE_LAMBDA) ** age * loads)
+    chronic = np.bincount(series, weights=CHRONIC_LAMBDA * (1 - CHRONIC_LAMBDA) ** age * loads)
+    last_load = np.bincount(series, weights=np.where(age == 0, loads, 0.0))
+
+    db.session.bulk_insert_mappings(TrainingLoadState, [
+        {
+            'user_id': int(users[start]),
+            'muscle_group': str(groups[start]),
+            'acute': float(acute[i]),
+            'chronic': float(chronic[i]),
+            'last_load': float(last_load[i]),
+            'last_day': last_day[i].astype('datetime64[D]').item()
+        }
+        for i, start in enumerate(starts)
+    ])
+    db.session.commit()
+    return len(starts)
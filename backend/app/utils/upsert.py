@@ -0,0 +1,45 @@
+from sqlalchemy import func
+from sqlalchemy.dialects import mysql, sqlite
+from ..models import db
+
+
+def _is_sqlite():
+    return db.session.get_bind().dialect.name == 'sqlite'
+
+
+def greatest(*values):
+    """GREATEST(a, b, ...) de MySQL; en SQLite (tests) la función escalar max()."""
+    return func.max(*values) if _is_sqlite() else func.greatest(*values)
+
+
+def upsert(model, values, conflict, update):
+    """
+    INSERT de una fila que, si choca con la clave única `conflict` (lista de columnas),
+    aplica `update` a la fila ya guardada: ON DUPLICATE KEY UPDATE en MySQL y ON CONFLICT
+    en SQLite. Las expresiones de `update` se refieren a la fila existente. Es atómico,
+    así que dos primeras escrituras concurrentes no chocan. No hace commit.
+
+    `update` puede ser una lista de pares (columna, expresión) cuando importa el orden: MySQL
+    asigna de izquierda a derecha y cada expresión ya ve las columnas asignadas antes.
+    """
+    if _is_sqlite():
+        stmt = sqlite.insert(model).values(values).on_conflict_do_update(index_elements=conflict, set_=dict(update))
+    else:
+        stmt = mysql.insert(model).values(values).on_duplicate_key_update(update)
+    return db.session.execute(stmt)
+
+
+def insert_ignore(model, rows, conflict):
+    """
+    INSERT de varias filas que salta las que chocan con la clave única `conflict`.
+    Devuelve cuántas se han insertado de verdad. No hace commit.
+    """
+    if not rows:
+        return 0
+    # Sobre la tabla y no el modelo: el INSERT masivo del ORM no devuelve rowcount
+    table = model.__table__
+    if _is_sqlite():
+        stmt = sqlite.insert(table).on_conflict_do_nothing(index_elements=conflict)
+    else:
+        stmt = mysql.insert(table).prefix_with('IGNORE')
+    return db.session.execute(stmt, rows).rowcount
@@ -0,0 +1,211 @@
+from collections import Counter, defaultdict
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from ..models import (
+    db, User, UserStats, WorkoutSession, Routine, RoutineReview, RoutineLike, SavedRoutine, followers
+)
+
+STAT_FIELDS = (
+    'sessions_count', 'routines_count', 'following_count', 'followers_count',
+    'reviews_count', 'saves_count', 'likes_received_count', 'likes_given_count'
+)
+
+
+def _count_queries():
+    """Consulta (usuario, recuento) de cada contador y la columna del usuario por la que agrupa."""
+    return {
+        'sessions_count': (
+            db.session.query(WorkoutSession.user_id, func.count()).filter(WorkoutSession.end_time.isnot(None)),
+            WorkoutSession.user_id
+        ),
+        'routines_count': (db.session.query(Routine.user_id, func.count()), Routine.user_id),
+        'following_count': (db.session.query(followers.c.follower_id, func.count()), followers.c.follower_id),
+        'followers_count': (db.session.query(followers.c.followed_id, func.count()), followers.c.followed_id),
+        'reviews_count': (db.session.query(RoutineReview.user_id, func.count()), RoutineReview.user_id),
+        'saves_count': (db.session.query(SavedRoutine.user_id, func.count()), SavedRoutine.user_id),
+        'likes_received_count': (
+            db.session.query(Routine.user_id, func.count()).select_from(RoutineLike).join(
+                Routine, Routine.id == RoutineLike.routine_id
+            ),
+            Routine.user_id
+        ),
+        'likes_given_count': (db.session.query(RoutineLike.user_id, func.count()), RoutineLike.user_id),
+    }
+
+
+def live_counts(user_ids):
+    """Contadores calculados con COUNT(*) desde las tablas: {user_id: {campo: valor}}."""
+    counts = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+    for field, (query, owner) in _count_queries().items():
+        for user_id, count in query.filter(owner.in_(user_ids)).group_by(owner):
+            counts[user_id][field] = count
+    return counts
+
+
+def get_user_stats(user_id):
+    """Contadores del usuario. Si aún no tiene fila, se calculan al vuelo sin guardarlos."""
+    user_id = int(user_id)
+    stats = UserStats.query.get(user_id)
+    if stats is None:
+        stats = UserStats(user_id=user_id, **live_counts([user_id])[user_id])
+    return stats
+
+
+def _increment(user_ids, deltas):
+    """UPDATE atómico col = col + n de los usuarios. Devuelve las filas actualizadas."""
+    return db.session.execute(
+        update(UserStats).where(UserStats.user_id.in_(user_ids)).values({
+            getattr(UserStats, field): getattr(UserStats, field) + delta
+            for field, delta in deltas.items()
+        })
+    ).rowcount
+
+
+def adjust_stats(user_id, **deltas):
+    """
+    Suma (o resta) a los contadores del usuario en la transacción actual. Llamar después de
+    la escritura: si el usuario aún no tiene fila, se crea desde los recuentos, que ya la
+    incluyen. No hace commit.
+    """
+    user_id = int(user_id)
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas or _increment([user_id], deltas):
+        return
+    db.session.flush()
+    try:
+        with db.session.begin_nested():
+            db.session.add(UserStats(user_id=user_id, **live_counts([user_id])[user_id]))
+            db.session.flush()
+    except IntegrityError:
+        # Otra transacción ha creado la fila entre tanto: sumar sobre la suya
+        _increment([user_id], deltas)
+
+
+def _apply_deltas(deltas_by_user):
+    """
+    Aplica los deltas de un borrado en cascada, con un UPDATE por cada combinación distinta de
+    deltas. Los usuarios sin fila se quedan sin ella: su fila se calculará ya sin lo borrado.
+    """
+    groups = defaultdict(list)
+    for user_id, deltas in deltas_by_user.items():
+        key = tuple(sorted((field, delta) for field, delta in deltas.items() if delta))
+        if key:
+            groups[key].append(user_id)
+    for key, user_ids in groups.items():
+        _increment(user_ids, dict(key))
+
+
+def _routine_cascade_deltas(deltas, routine_ids):
+    """Descuenta lo que se borra en cascada con las rutinas: las propias, sus likes, reseñas y guardados."""
+    grouped = (
+        ('routines_count', db.session.query(Routine.user_id, func.count()).filter(
+            Routine.id.in_(routine_ids)
+        ).group_by(Routine.user_id)),
+        ('likes_received_count', db.session.query(Routine.user_id, func.count()).select_from(RoutineLike).join(
+            Routine, Routine.id == RoutineLike.routine_id
+        ).filter(RoutineLike.routine_id.in_(routine_ids)).group_by(Routine.user_id)),
+        ('likes_given_count', db.session.query(RoutineLike.user_id, func.count()).filter(
+            RoutineLike.routine_id.in_(routine_ids)
+        ).group_by(RoutineLike.user_id)),
+        ('reviews_count', db.session.query(RoutineReview.user_id, func.count()).filter(
+            RoutineReview.routine_id.in_(routine_ids)
+        ).group_by(RoutineReview.user_id)),
+        ('saves_count', db.session.query(SavedRoutine.user_id, func.count()).filter(
+            SavedRoutine.original_routine_id.in_(routine_ids)
+        ).group_by(SavedRoutine.user_id)),
+    )
+    for field, rows in grouped:
+        for user_id, count in rows:
+            deltas[user_id][field] -= count
+
+
+def remove_routine(routine):
+    """Borra la rutina y descuenta de cada usuario afectado lo que se va con ella. No hace commit."""
+    deltas = defaultdict(Counter)
+    _routine_cascade_deltas(deltas, [routine.id])
+    db.session.delete(routine)
+    db.session.flush()
+    _apply_deltas(deltas)
+
+
+def remove_user(user):
+    """
+    Borra el usuario y descuenta de los demás sus follows, los likes que dio y lo que cuelga
+    de sus rutinas. Su propia fila se borra en cascada. No hace commit.
+    """
+    deltas = defaultdict(Counter)
+    for (follower_id,) in db.session.query(followers.c.follower_id).filter(followers.c.followed_id == user.id):
+        deltas[follower_id]['following_count'] -= 1
+    for (followed_id,) in db.session.query(followers.c.followed_id).filter(followers.c.follower_id == user.id):
+        deltas[followed_id]['followers_count'] -= 1
+    liked = db.session.query(Routine.user_id, func.count()).select_from(RoutineLike).join(
+        Routine, Routine.id == RoutineLike.routine_id
+    ).filter(RoutineLike.user_id == user.id).group_by(Routine.user_id)
+    for author_id, count in liked:
+        deltas[author_id]['likes_received_count'] -= count
+    routine_ids = [routine_id for (routine_id,) in db.session.query(Routine.id).filter(Routine.user_id == user.id)]
+    if routine_ids:
+        _routine_cascade_deltas(deltas, routine_ids)
+    deltas.pop(user.id, None)
+
+    db.session.delete(user)
+    db.session.flush()
+    _apply_deltas(deltas)
+
+
+def lock_stats(user_ids):
+    """Bloquea (SELECT ... FOR UPDATE) las filas de contadores de los usuarios: {user_id: fila}."""
+    return {
+        row.user_id: row
+        for row in UserStats.query.filter(UserStats.user_id.in_(user_ids)).with_for_update()
+    }
+
+
+def reconcile_chunk(user_ids, rows=None):
+    """
+    Recalcula los contadores de un lote de usuarios y corrige los desviados. Bloquea sus filas
+    antes de contar, para que las escrituras concurrentes sumen después sobre el valor
+    corregido. En REPEATABLE READ los COUNT leen la foto que fija la primera lectura sin
+    bloqueo de la transacción, así que el bloqueo tiene que ir antes que cualquier otra
+    lectura: llamar al empezar la transacción o pasar en rows las filas de lock_stats tomadas
+    al empezarla. No hace commit. Devuelve (creadas, corregidas, recuentos).
+    """
+    if rows is None:
+        rows = lock_stats(user_ids)
+    counts = live_counts(user_ids)
+    created = repaired = 0
+    for uid in user_ids:
+        values = counts[uid]
+        row = rows.get(uid)
+        if row is None:
+            db.session.add(UserStats(user_id=uid, **values))
+            created += 1
+        elif any(getattr(row, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(row, field, value)
+            repaired += 1
+    return created, repaired, counts
+
+
+def reconcile_user_stats(user_id=None, missing_only=False, batch_size=1000):
+    """
+    Recalcula los contadores desde las tablas y corrige los que se han desviado; crea las
+    filas que faltan. Con missing_only solo crea las que faltan. Un commit por lote.
+    Devuelve (filas creadas, filas corregidas).
+    """
+    users = db.session.query(User.id).order_by(User.id)
+    if user_id is not None:
+        users = users.filter(User.id == user_id)
+    if missing_only:
+        users = users.outerjoin(UserStats, UserStats.user_id == User.id).filter(UserStats.user_id.is_(None))
+    user_ids = [uid for (uid,) in users]
+    # Cada lote empieza transacción con sus bloqueos (ver reconcile_chunk)
+    db.session.commit()
+
+    created = repaired = 0
+    for start in range(0, len(user_ids), batch_size):
+        chunk_created, chunk_repaired, _ = reconcile_chunk(user_ids[start:start + batch_size])
+        created += chunk_created
+        repaired += chunk_repaired
+        db.session.commit()
+    return created, repaired
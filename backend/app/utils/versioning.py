@@ -0,0 +1,66 @@
+import zlib
+from functools import wraps
+from datetime import date
+from flask import request, make_response, g
+from flask_jwt_extended import get_jwt_identity
+from ..models import db, User
+
+
+def bump_data_version(user_id):
+    """
+    Marca que los datos del usuario han cambiado (incremento atómico en SQL).
+    Se llama en la misma transacción que la escritura; no hace commit.
+    """
+    User.query.filter_by(id=user_id).update(
+        {User.data_version: db.func.coalesce(User.data_version, 0) + 1},
+        synchronize_session=False
+    )
+
+    from .cache import analytics_cache
+    analytics_cache.invalidate_user(user_id)
+
+
+def bump_all_data_versions(user_id=None):
+    """Invalida ETags y cachés tras reconstruir tablas derivadas (todos los usuarios o uno). Hace commit."""
+    query = User.query
+    if user_id is not None:
+        query = query.filter_by(id=user_id)
+    query.update({User.data_version: db.func.coalesce(User.data_version, 0) + 1}, synchronize_session=False)
+    db.session.commit()
+
+
+def current_data_version(user_id):
+    return db.session.query(User.data_version).filter(User.id == user_id).scalar() or 0
+
+
+def make_etag(user_id, version):
+    """
+    ETag derivado de la versión de datos del usuario, la URL pedida y el día actual
+    (las ventanas tipo "últimos 30 días" cambian al cambiar de día aunque no haya escrituras).
+    """
+    url_hash = zlib.crc32(request.full_path.encode('utf-8'))
+    return f"u{user_id}-v{version}-{date.today().isoformat()}-{url_hash:08x}"
+
+
+def etag_by_data_version(view):
+    """
+    Decorador para GETs que solo dependen de los datos del usuario. Responde 304 a
+    If-None-Match sin ejecutar la vista. Va debajo de @jwt_required().
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = get_jwt_identity()
+        g.data_version = current_data_version(user_id)
+        etag = make_etag(user_id, g.data_version)
+
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
@@ -0,0 +1,28 @@
+"""
+Micro-benchmark: cálculo escalar del 1RM (bucle Python) frente al motor vectorizado.
+Uso: python bench_strength.py [numero_de_series]
+"""
+import sys
+import timeit
+import numpy as np
+from app.utils.strength import calculate_1rm, estimate_1rm, FORMULAS
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+rng = np.random.default_rng(42)
+weights = rng.uniform(20, 200, n).round(1).tolist()
+reps = rng.integers(1, 13, n).tolist()
+rpes = rng.integers(6, 11, n).tolist()
+
+def scalar():
+    return [calculate_1rm(w, r) for w, r in zip(weights, reps)]
+
+print(f"Series: {n}")
+t_scalar = min(timeit.repeat(scalar, number=1, repeat=3))
+print(f"  escalar (epley)        {t_scalar * 1000:8.1f} ms")
+
+# Resultado idéntico al camino escalar
+assert np.allclose(scalar(), estimate_1rm(weights, reps))
+
+for formula in FORMULAS:
+    t = min(timeit.repeat(lambda: estimate_1rm(weights, reps, rpes, formula=formula), number=1, repeat=3))
+    print(f"  vectorizado ({formula:<9}) {t * 1000:8.1f} ms  x{t_scalar / t:5.1f}")
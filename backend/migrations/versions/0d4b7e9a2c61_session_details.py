@@ -0,0 +1,34 @@
+"""Detalle serializado de sesiones finalizadas (session_details)
+
+Revision ID: 0d4b7e9a2c61
+Revises: f1a6c8e2d397
+Create Date: 2026-10-19 02:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0d4b7e9a2c61'
+down_revision = 'f1a6c8e2d397'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() puede haberla creado ya al arrancar. Se rellena sola en la primera visita.
+    if 'session_details' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'session_details',
+            sa.Column('session_id', sa.Integer(), sa.ForeignKey('workout_sessions.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('payload', sa.LargeBinary(16777215), nullable=False),
+            sa.Column('etag', sa.String(40), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+
+
+def downgrade():
+    if 'session_details' in sa.inspect(op.get_bind()).get_table_names():
+        op.drop_table('session_details')
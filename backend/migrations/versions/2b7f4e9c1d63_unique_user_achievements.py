@@ -0,0 +1,68 @@
+"""Logro único por usuario (uq_user_achievements_user_achievement) y cola persistente de eventos
+
+Revision ID: 2b7f4e9c1d63
+Revises: 6a9d2c4f8e15
+Create Date: 2026-10-20 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7f4e9c1d63'
+down_revision = '6a9d2c4f8e15'
+branch_labels = None
+depends_on = None
+
+
+def _has_unique(inspector):
+    # En MySQL las restricciones UNIQUE aparecen también como índices
+    names = {ix['name'] for ix in inspector.get_indexes('user_achievements')}
+    names |= {uq['name'] for uq in inspector.get_unique_constraints('user_achievements')}
+    return 'uq_user_achievements_user_achievement' in names
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # Evaluaciones concurrentes pudieron desbloquear dos veces el mismo logro: se conserva el primero
+    duplicates = [row[0] for row in bind.execute(sa.text(
+        "SELECT ua.id FROM user_achievements ua JOIN ("
+        "  SELECT user_id, achievement_id, MIN(id) AS keep_id FROM user_achievements"
+        "  GROUP BY user_id, achievement_id HAVING COUNT(*) > 1"
+        ") d ON d.user_id = ua.user_id AND d.achievement_id = ua.achievement_id "
+        "WHERE ua.id <> d.keep_id"
+    ))]
+    for i in range(0, len(duplicates), 1000):
+        bind.execute(
+            sa.text("DELETE FROM user_achievements WHERE id IN :ids").bindparams(sa.bindparam('ids', expanding=True)),
+            {'ids': duplicates[i:i + 1000]}
+        )
+    if not _has_unique(inspector):
+        op.create_unique_constraint(
+            'uq_user_achievements_user_achievement', 'user_achievements', ['user_id', 'achievement_id']
+        )
+
+    # db.create_all() puede haberla creado ya al arrancar
+    if 'pending_achievement_events' not in inspector.get_table_names():
+        op.create_table(
+            'pending_achievement_events',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('event', sa.String(30), nullable=False),
+            sa.Column('values', sa.JSON(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index(
+            'ix_pending_achievement_events_created_at', 'pending_achievement_events', ['created_at'], unique=False
+        )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'pending_achievement_events' in inspector.get_table_names():
+        op.drop_table('pending_achievement_events')
+    if _has_unique(inspector):
+        op.drop_constraint('uq_user_achievements_user_achievement', 'user_achievements', type_='unique')
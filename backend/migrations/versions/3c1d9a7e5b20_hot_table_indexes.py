@@ -0,0 +1,54 @@
+"""Índices compuestos y de cobertura para las tablas calientes
+
+Revision ID: 3c1d9a7e5b20
+Revises:
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1d9a7e5b20'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (nombre, tabla, columnas). Deben coincidir con los declarados en app/models.py
+INDEXES = [
+    # Historial y analíticas: filtro por usuario + rango temporal
+    ('ix_sessions_user_start', 'workout_sessions', ['user_id', 'start_time']),
+    # Agregados por sesión (volumen, ejercicios únicos) servidos solo desde el índice
+    ('ix_logs_session_exercise', 'workout_logs', ['session_id', 'exercise_id', 'weight', 'reps']),
+    # Progresión de un ejercicio en una ventana de tiempo
+    ('ix_logs_exercise_timestamp', 'workout_logs', ['exercise_id', 'timestamp']),
+    # Leaderboard ordenado por XP
+    ('ix_users_xp', 'users', ['xp']),
+    # Feed de comunidad y perfil público
+    ('ix_routines_public_created', 'routines', ['is_public', 'created_at']),
+    ('ix_routines_user_public', 'routines', ['user_id', 'is_public']),
+    ('ix_routine_likes_routine', 'routine_likes', ['routine_id']),
+    # Contador de seguidores (la PK empieza por follower_id)
+    ('ix_followers_followed', 'followers', ['followed_id']),
+    ('ix_body_metrics_user_date', 'body_metrics', ['user_id', 'date']),
+]
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    return {ix['name'] for ix in inspector.get_indexes(table)}
+
+
+def upgrade():
+    # db.create_all() puede haberlos creado ya en instalaciones nuevas
+    for name, table, columns in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,44 @@
+"""Recálculo de gamificación: multiplicador de XP por sesión y ejecuciones (recompute_runs)
+
+Revision ID: 3e8b6d2f9a71
+Revises: 7a2f9c4e1d58
+Create Date: 2026-10-19 04:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e8b6d2f9a71'
+down_revision = '7a2f9c4e1d58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # Las sesiones anteriores quedan a NULL: el recálculo las cuenta sin potenciador
+    if 'xp_multiplier' not in {c['name'] for c in inspector.get_columns('workout_sessions')}:
+        op.add_column('workout_sessions', sa.Column('xp_multiplier', sa.Float(), nullable=True))
+    if 'recompute_runs' not in inspector.get_table_names():
+        op.create_table(
+            'recompute_runs',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('status', sa.String(20), nullable=False, server_default='running'),
+            sa.Column('dry_run', sa.Boolean(), nullable=False, server_default=sa.false()),
+            sa.Column('last_user_id', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('processed', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('changed', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+        )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'recompute_runs' in inspector.get_table_names():
+        op.drop_table('recompute_runs')
+    if 'xp_multiplier' in {c['name'] for c in inspector.get_columns('workout_sessions')}:
+        op.drop_column('workout_sessions', 'xp_multiplier')
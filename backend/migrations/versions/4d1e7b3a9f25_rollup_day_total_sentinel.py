@@ -0,0 +1,51 @@
+"""Fila total del día del rollup con exercise_id = 0 en vez de NULL
+
+Revision ID: 4d1e7b3a9f25
+Revises: 9c4f2a7e6b13
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d1e7b3a9f25'
+down_revision = '9c4f2a7e6b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'daily_training_rollups' not in inspector.get_table_names():
+        return
+    # 0 no es un ejercicio: fuera la clave foránea antes de usarlo como centinela
+    for fk in inspector.get_foreign_keys('daily_training_rollups'):
+        if fk['constrained_columns'] == ['exercise_id'] and fk.get('name'):
+            op.drop_constraint(fk['name'], 'daily_training_rollups', type_='foreignkey')
+
+    # Los NULL no chocaban en la clave única: fundir los totales duplicados en una sola fila
+    op.execute(
+        "INSERT INTO daily_training_rollups "
+        "(user_id, day, exercise_id, set_count, total_reps, total_volume, best_e1rm, session_count) "
+        "SELECT user_id, day, 0, SUM(set_count), SUM(total_reps), SUM(total_volume), MAX(best_e1rm), SUM(session_count) "
+        "FROM daily_training_rollups WHERE exercise_id IS NULL GROUP BY user_id, day"
+    )
+    op.execute("DELETE FROM daily_training_rollups WHERE exercise_id IS NULL")
+    op.alter_column(
+        'daily_training_rollups', 'exercise_id',
+        existing_type=sa.Integer(), nullable=False, server_default='0'
+    )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'daily_training_rollups' not in inspector.get_table_names():
+        return
+    op.alter_column(
+        'daily_training_rollups', 'exercise_id',
+        existing_type=sa.Integer(), nullable=True, server_default=None
+    )
+    op.execute("UPDATE daily_training_rollups SET exercise_id = NULL WHERE exercise_id = 0")
+    op.create_foreign_key(None, 'daily_training_rollups', 'exercises', ['exercise_id'], ['id'])
@@ -0,0 +1,48 @@
+"""Histogramas de percentiles por cohorte (cohort_histograms, cohort_samples)
+
+Revision ID: 5b8e1f3a9c42
+Revises: d2a9c4f81e06
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e1f3a9c42'
+down_revision = 'd2a9c4f81e06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() puede haberlas creado ya al arrancar
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'cohort_histograms' not in tables:
+        op.create_table(
+            'cohort_histograms',
+            sa.Column('exercise_id', sa.Integer(), sa.ForeignKey('exercises.id'), primary_key=True),
+            sa.Column('level_band', sa.Integer(), primary_key=True),
+            sa.Column('weight_class', sa.Integer(), primary_key=True),
+            sa.Column('counts', sa.LargeBinary(), nullable=False),
+            sa.Column('total', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        )
+    if 'cohort_samples' not in tables:
+        op.create_table(
+            'cohort_samples',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('exercise_id', sa.Integer(), sa.ForeignKey('exercises.id'), primary_key=True),
+            sa.Column('level_band', sa.Integer(), nullable=False),
+            sa.Column('weight_class', sa.Integer(), nullable=False),
+            sa.Column('e1rm', sa.Float(), nullable=False),
+        )
+
+
+def downgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'cohort_samples' in tables:
+        op.drop_table('cohort_samples')
+    if 'cohort_histograms' in tables:
+        op.drop_table('cohort_histograms')
@@ -0,0 +1,100 @@
+"""Histogramas de cohorte como una fila por cubeta (cohort_bins) en vez de un blob por cohorte
+
+Revision ID: 6a9d2c4f8e15
+Revises: 4d1e7b3a9f25
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+from array import array
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a9d2c4f8e15'
+down_revision = '4d1e7b3a9f25'
+branch_labels = None
+depends_on = None
+
+
+BIN_COUNT = 200
+
+
+def _counts(blob):
+    """Contadores int32 little-endian del blob de cohort_histograms."""
+    counts = array('i')
+    counts.frombytes(blob)
+    if counts.itemsize != 4:
+        raise RuntimeError('int no es de 32 bits en esta plataforma')
+    return counts
+
+
+def upgrade():
+    # db.create_all() puede haber creado ya cohort_bins al arrancar
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'cohort_bins' not in tables:
+        op.create_table(
+            'cohort_bins',
+            sa.Column('exercise_id', sa.Integer(), sa.ForeignKey('exercises.id'), primary_key=True),
+            sa.Column('level_band', sa.Integer(), primary_key=True),
+            sa.Column('weight_class', sa.Integer(), primary_key=True),
+            sa.Column('bin', sa.Integer(), primary_key=True),
+            sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        )
+    if 'cohort_histograms' not in tables:
+        return
+
+    bind = op.get_bind()
+    bins = sa.table(
+        'cohort_bins',
+        sa.column('exercise_id', sa.Integer), sa.column('level_band', sa.Integer),
+        sa.column('weight_class', sa.Integer), sa.column('bin', sa.Integer), sa.column('count', sa.Integer)
+    )
+    bind.execute(bins.delete())
+    rows = bind.execute(sa.text(
+        "SELECT exercise_id, level_band, weight_class, counts FROM cohort_histograms"
+    )).fetchall()
+    values = [
+        {'exercise_id': exercise_id, 'level_band': band, 'weight_class': weight_class, 'bin': b, 'count': count}
+        for exercise_id, band, weight_class, blob in rows
+        for b, count in enumerate(_counts(blob))
+        if count > 0
+    ]
+    if values:
+        op.bulk_insert(bins, values)
+    op.drop_table('cohort_histograms')
+
+
+def downgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'cohort_histograms' not in tables:
+        op.create_table(
+            'cohort_histograms',
+            sa.Column('exercise_id', sa.Integer(), sa.ForeignKey('exercises.id'), primary_key=True),
+            sa.Column('level_band', sa.Integer(), primary_key=True),
+            sa.Column('weight_class', sa.Integer(), primary_key=True),
+            sa.Column('counts', sa.LargeBinary(), nullable=False),
+            sa.Column('total', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        )
+    if 'cohort_bins' not in tables:
+        return
+
+    bind = op.get_bind()
+    histograms = {}
+    for exercise_id, band, weight_class, b, count in bind.execute(sa.text(
+        "SELECT exercise_id, level_band, weight_class, bin, count FROM cohort_bins WHERE count > 0"
+    )):
+        counts = histograms.setdefault((exercise_id, band, weight_class), array('i', [0] * BIN_COUNT))
+        counts[b] = count
+    if histograms:
+        op.bulk_insert(sa.table(
+            'cohort_histograms',
+            sa.column('exercise_id', sa.Integer), sa.column('level_band', sa.Integer),
+            sa.column('weight_class', sa.Integer), sa.column('counts', sa.LargeBinary),
+            sa.column('total', sa.Integer)
+        ), [
+            {'exercise_id': e, 'level_band': band, 'weight_class': wc, 'counts': counts.tobytes(), 'total': sum(counts)}
+            for (e, band, wc), counts in histograms.items()
+        ])
+    op.drop_table('cohort_bins')
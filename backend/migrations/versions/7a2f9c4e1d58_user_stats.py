@@ -0,0 +1,64 @@
+"""Contadores por usuario mantenidos en escritura (user_stats)
+
+Revision ID: 7a2f9c4e1d58
+Revises: 0d4b7e9a2c61
+Create Date: 2026-10-19 03:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a2f9c4e1d58'
+down_revision = '0d4b7e9a2c61'
+branch_labels = None
+depends_on = None
+
+COUNTERS = (
+    'sessions_count', 'routines_count', 'following_count', 'followers_count',
+    'reviews_count', 'saves_count', 'likes_received_count', 'likes_given_count'
+)
+
+
+# Recuento de cada contador para la fila de user_stats (subconsulta correlacionada)
+COUNT_QUERIES = {
+    'sessions_count': "SELECT COUNT(*) FROM workout_sessions w WHERE w.user_id = user_stats.user_id AND w.end_time IS NOT NULL",
+    'routines_count': "SELECT COUNT(*) FROM routines r WHERE r.user_id = user_stats.user_id",
+    'following_count': "SELECT COUNT(*) FROM followers f WHERE f.follower_id = user_stats.user_id",
+    'followers_count': "SELECT COUNT(*) FROM followers f WHERE f.followed_id = user_stats.user_id",
+    'reviews_count': "SELECT COUNT(*) FROM routine_reviews v WHERE v.user_id = user_stats.user_id",
+    'saves_count': "SELECT COUNT(*) FROM saved_routines s WHERE s.user_id = user_stats.user_id",
+    'likes_received_count': (
+        "SELECT COUNT(*) FROM routine_likes l JOIN routines r ON r.id = l.routine_id "
+        "WHERE r.user_id = user_stats.user_id"
+    ),
+    'likes_given_count': "SELECT COUNT(*) FROM routine_likes l WHERE l.user_id = user_stats.user_id",
+}
+
+
+def upgrade():
+    # db.create_all() puede haberla creado ya al arrancar
+    if 'user_stats' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'user_stats',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+            *[sa.Column(name, sa.Integer(), nullable=False, server_default='0') for name in COUNTERS]
+        )
+
+    # Fila para cada usuario que no la tenga, con sus recuentos. Las que ya existían se
+    # mantienen en escritura; si se desvían, `flask gamification reconcile-stats` las corrige
+    op.execute(
+        "INSERT INTO user_stats (user_id) SELECT u.id FROM users u "
+        "WHERE NOT EXISTS (SELECT 1 FROM user_stats s WHERE s.user_id = u.id)"
+    )
+    assignments = ", ".join(f"{field} = ({query})" for field, query in COUNT_QUERIES.items())
+    op.execute(
+        f"UPDATE user_stats SET {assignments} "
+        f"WHERE {' AND '.join(f'{field} = 0' for field in COUNTERS)}"
+    )
+
+
+def downgrade():
+    if 'user_stats' in sa.inspect(op.get_bind()).get_table_names():
+        op.drop_table('user_stats')
@@ -0,0 +1,41 @@
+"""Entrenador que asignó cada rutina guardada (saved_routines.assigned_by)
+
+Revision ID: 8d3f6a1c5e72
+Revises: 2b7f4e9c1d63
+Create Date: 2026-10-20 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3f6a1c5e72'
+down_revision = '2b7f4e9c1d63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # sync_database_schema puede haber añadido ya la columna al arrancar
+    if 'assigned_by' not in {c['name'] for c in inspector.get_columns('saved_routines')}:
+        op.add_column('saved_routines', sa.Column('assigned_by', sa.Integer(), nullable=True))
+    if 'ix_saved_routines_assigned_by' not in {ix['name'] for ix in inspector.get_indexes('saved_routines')}:
+        op.create_index('ix_saved_routines_assigned_by', 'saved_routines', ['assigned_by'], unique=False)
+
+    # Las asignaciones anteriores no guardaron quién las hizo: se imputan al autor de la rutina,
+    # que es a quien las contaba el logro de entrenador hasta ahora
+    op.execute(
+        "UPDATE saved_routines SET assigned_by = ("
+        "  SELECT routines.user_id FROM routines WHERE routines.id = saved_routines.original_routine_id"
+        ") WHERE is_assigned = 1 AND assigned_by IS NULL"
+    )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'ix_saved_routines_assigned_by' in {ix['name'] for ix in inspector.get_indexes('saved_routines')}:
+        op.drop_index('ix_saved_routines_assigned_by', table_name='saved_routines')
+    if 'assigned_by' in {c['name'] for c in inspector.get_columns('saved_routines')}:
+        op.drop_column('saved_routines', 'assigned_by')
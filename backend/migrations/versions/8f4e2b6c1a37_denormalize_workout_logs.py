@@ -0,0 +1,76 @@
+"""Copia user_id y training_date de la sesión en workout_logs
+
+Revision ID: 8f4e2b6c1a37
+Revises: 3c1d9a7e5b20
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f4e2b6c1a37'
+down_revision = '3c1d9a7e5b20'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 50000
+
+INDEXES = [
+    ('ix_logs_user_exercise_timestamp', ['user_id', 'exercise_id', 'timestamp']),
+    ('ix_logs_user_date', ['user_id', 'training_date']),
+]
+
+
+def _columns():
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns('workout_logs')}
+
+
+def _indexes():
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('workout_logs')}
+
+
+def upgrade():
+    # sync_database_schema puede haber añadido ya las columnas al arrancar
+    columns = _columns()
+    if 'user_id' not in columns:
+        op.add_column('workout_logs', sa.Column('user_id', sa.Integer(), nullable=True))
+        op.create_foreign_key('fk_workout_logs_user_id', 'workout_logs', 'users', ['user_id'], ['id'])
+    if 'training_date' not in columns:
+        op.add_column('workout_logs', sa.Column('training_date', sa.Date(), nullable=True))
+
+    # Relleno por rangos de id: un UPDATE ... JOIN sobre toda la tabla bloquearía demasiado
+    bind = op.get_bind()
+    first_id, last_id = bind.execute(sa.text(
+        "SELECT MIN(id), MAX(id) FROM workout_logs WHERE user_id IS NULL"
+    )).fetchone()
+    if first_id is not None:
+        for low in range(first_id, last_id + 1, BATCH_SIZE):
+            bind.execute(sa.text(
+                "UPDATE workout_logs l JOIN workout_sessions s ON s.id = l.session_id "
+                "SET l.user_id = s.user_id, l.training_date = DATE(s.start_time) "
+                "WHERE l.user_id IS NULL AND l.id BETWEEN :low AND :high"
+            ), {'low': low, 'high': low + BATCH_SIZE - 1})
+
+    existing = _indexes()
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'workout_logs', columns, unique=False)
+
+
+def downgrade():
+    existing = _indexes()
+    for name, columns in reversed(INDEXES):
+        if name in existing:
+            op.drop_index(name, table_name='workout_logs')
+
+    foreign_keys = {fk['name'] for fk in sa.inspect(op.get_bind()).get_foreign_keys('workout_logs')}
+    if 'fk_workout_logs_user_id' in foreign_keys:
+        op.drop_constraint('fk_workout_logs_user_id', 'workout_logs', type_='foreignkey')
+    columns = _columns()
+    if 'training_date' in columns:
+        op.drop_column('workout_logs', 'training_date')
+    if 'user_id' in columns:
+        op.drop_column('workout_logs', 'user_id')
@@ -0,0 +1,38 @@
+"""Registro de XP ganada (xp_events) para las clasificaciones semanal y mensual
+
+Revision ID: 9c4f2a7e6b13
+Revises: 3e8b6d2f9a71
+Create Date: 2026-10-19 06:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4f2a7e6b13'
+down_revision = '3e8b6d2f9a71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # Empieza vacía: la clasificación total sale de users.xp y las de ventana se llenan desde ya
+    if 'xp_events' not in inspector.get_table_names():
+        op.create_table(
+            'xp_events',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('amount', sa.Integer(), nullable=False),
+            sa.Column('source', sa.String(20), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_xp_events_user_id', 'xp_events', ['user_id'])
+        op.create_index('ix_xp_events_created_at', 'xp_events', ['created_at'])
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'xp_events' in inspector.get_table_names():
+        op.drop_table('xp_events')
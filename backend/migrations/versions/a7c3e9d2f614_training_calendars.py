@@ -0,0 +1,83 @@
+"""Calendario de entrenamiento como bitset anual (training_calendars)
+
+Revision ID: a7c3e9d2f614
+Revises: 5b8e1f3a9c42
+Create Date: 2026-10-18 23:30:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9d2f614'
+down_revision = '5b8e1f3a9c42'
+branch_labels = None
+depends_on = None
+
+
+YEAR_BYTES = 46  # 366 bits redondeados a bytes
+
+
+def _backfill_days(bind):
+    """
+    Marca los días entrenados de las sesiones finalizadas (bit i = día del año i+1, LSB
+    primero), como `flask analytics rebuild-calendar` pero sin tocar las rachas de users.
+    Combina con OR las filas que ya existan, así que volver a ejecutarlo no cambia nada.
+    Los bits de escudo no se pueden reconstruir desde el historial y quedan vacíos.
+    """
+    trained = {}
+    sessions = bind.execute(sa.text(
+        "SELECT user_id, start_time FROM workout_sessions "
+        "WHERE end_time IS NOT NULL AND start_time IS NOT NULL"
+    ))
+    for user_id, start_time in sessions:
+        if isinstance(start_time, str):
+            start_time = datetime.fromisoformat(start_time)
+        index = start_time.timetuple().tm_yday - 1
+        bits = trained.setdefault((user_id, start_time.year), bytearray(YEAR_BYTES))
+        bits[index // 8] |= 1 << (index % 8)
+
+    existing = {
+        (user_id, year): days for user_id, year, days in
+        bind.execute(sa.text("SELECT user_id, year, days FROM training_calendars"))
+    }
+    now = datetime.utcnow()
+    for (user_id, year), bits in trained.items():
+        params = {'user_id': user_id, 'year': year, 'now': now}
+        if (user_id, year) in existing:
+            bits = bytes(a | b for a, b in zip(bits, existing[(user_id, year)]))
+            params.update(days=bits, day_count=sum(bin(b).count('1') for b in bits))
+            bind.execute(sa.text(
+                "UPDATE training_calendars SET days = :days, day_count = :day_count, updated_at = :now "
+                "WHERE user_id = :user_id AND year = :year"
+            ), params)
+        else:
+            params.update(days=bytes(bits), day_count=sum(bin(b).count('1') for b in bits), shielded=bytes(YEAR_BYTES))
+            bind.execute(sa.text(
+                "INSERT INTO training_calendars (user_id, year, days, shielded, day_count, updated_at) "
+                "VALUES (:user_id, :year, :days, :shielded, :day_count, :now)"
+            ), params)
+
+
+def upgrade():
+    # db.create_all() puede haberla creado ya al arrancar
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'training_calendars' not in tables:
+        op.create_table(
+            'training_calendars',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('year', sa.Integer(), primary_key=True),
+            sa.Column('days', sa.LargeBinary(46), nullable=False),
+            sa.Column('shielded', sa.LargeBinary(46), nullable=False),
+            sa.Column('day_count', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        )
+    _backfill_days(op.get_bind())
+
+
+def downgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'training_calendars' in tables:
+        op.drop_table('training_calendars')
@@ -0,0 +1,68 @@
+"""Seguimiento de cambios para la sincronización offline (updated_at, client_key, sync_tombstones)
+
+Revision ID: b9e2f5a1c703
+Revises: e4b7d1c9a258
+Create Date: 2026-10-19 00:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e2f5a1c703'
+down_revision = 'e4b7d1c9a258'
+branch_labels = None
+depends_on = None
+
+
+UPDATED_AT_INDEXES = [
+    ('workout_sessions', 'ix_sessions_user_updated'),
+    ('workout_logs', 'ix_logs_user_updated'),
+    ('routines', 'ix_routines_user_updated'),
+    ('body_metrics', 'ix_body_metrics_user_updated'),
+]
+
+
+def upgrade():
+    # sync_database_schema puede haber añadido ya columnas o tablas al arrancar.
+    # Las filas existentes quedan con updated_at NULL: solo las recibe el primer pull completo.
+    inspector = sa.inspect(op.get_bind())
+    for table, index in UPDATED_AT_INDEXES:
+        if 'updated_at' not in {c['name'] for c in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        if index not in {ix['name'] for ix in inspector.get_indexes(table)}:
+            op.create_index(index, table, ['user_id', 'updated_at'], unique=False)
+
+    if 'client_key' not in {c['name'] for c in inspector.get_columns('workout_sessions')}:
+        op.add_column('workout_sessions', sa.Column('client_key', sa.String(64), nullable=True))
+    if 'uq_sessions_user_client_key' not in {ix['name'] for ix in inspector.get_indexes('workout_sessions')}:
+        op.create_unique_constraint('uq_sessions_user_client_key', 'workout_sessions', ['user_id', 'client_key'])
+
+    if 'sync_tombstones' not in inspector.get_table_names():
+        op.create_table(
+            'sync_tombstones',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('entity', sa.String(20), nullable=False),
+            sa.Column('entity_id', sa.Integer(), nullable=False),
+            sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        )
+        op.create_index('ix_tombstones_user_deleted', 'sync_tombstones', ['user_id', 'deleted_at'], unique=False)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'sync_tombstones' in inspector.get_table_names():
+        op.drop_table('sync_tombstones')
+
+    if 'uq_sessions_user_client_key' in {ix['name'] for ix in inspector.get_indexes('workout_sessions')}:
+        op.drop_constraint('uq_sessions_user_client_key', 'workout_sessions', type_='unique')
+    if 'client_key' in {c['name'] for c in inspector.get_columns('workout_sessions')}:
+        op.drop_column('workout_sessions', 'client_key')
+
+    for table, index in reversed(UPDATED_AT_INDEXES):
+        if index in {ix['name'] for ix in inspector.get_indexes(table)}:
+            op.drop_index(index, table_name=table)
+        if 'updated_at' in {c['name'] for c in inspector.get_columns(table)}:
+            op.drop_column(table, 'updated_at')
@@ -0,0 +1,36 @@
+"""Avisos para el usuario (notifications)
+
+Revision ID: c5d8a3e7b149
+Revises: b9e2f5a1c703
+Create Date: 2026-10-19 01:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d8a3e7b149'
+down_revision = 'b9e2f5a1c703'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() puede haberla creado ya al arrancar
+    if 'notifications' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'notifications',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('kind', sa.String(30), nullable=False),
+            sa.Column('data', sa.JSON(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('read_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_notifications_user_read', 'notifications', ['user_id', 'read_at'], unique=False)
+
+
+def downgrade():
+    if 'notifications' in sa.inspect(op.get_bind()).get_table_names():
+        op.drop_table('notifications')
@@ -0,0 +1,48 @@
+"""Almacenamiento frío de series: manifiesto log_archives y workout_sessions.archived
+
+Revision ID: d2a9c4f81e06
+Revises: 8f4e2b6c1a37
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a9c4f81e06'
+down_revision = '8f4e2b6c1a37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() / sync_database_schema pueden haberlo creado ya al arrancar
+    inspector = sa.inspect(op.get_bind())
+    if 'log_archives' not in inspector.get_table_names():
+        op.create_table(
+            'log_archives',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('file_path', sa.String(length=500), nullable=False),
+            sa.Column('first_day', sa.Date(), nullable=False),
+            sa.Column('last_day', sa.Date(), nullable=False),
+            sa.Column('session_count', sa.Integer(), nullable=False),
+            sa.Column('set_count', sa.Integer(), nullable=False),
+            sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_log_archives_user_id', 'log_archives', ['user_id'], unique=False)
+
+    if 'archived' not in {c['name'] for c in inspector.get_columns('workout_sessions')}:
+        op.add_column('workout_sessions', sa.Column('archived', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    # Las series archivadas no vuelven a workout_logs: restaurarlas antes de bajar de versión
+    inspector = sa.inspect(op.get_bind())
+    if 'archived' in {c['name'] for c in inspector.get_columns('workout_sessions')}:
+        op.drop_column('workout_sessions', 'archived')
+    if 'log_archives' in inspector.get_table_names():
+        op.drop_index('ix_log_archives_user_id', table_name='log_archives')
+        op.drop_table('log_archives')
@@ -0,0 +1,34 @@
+"""Clave de idempotencia del cliente en workout_logs (registro por lotes)
+
+Revision ID: e4b7d1c9a258
+Revises: a7c3e9d2f614
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7d1c9a258'
+down_revision = 'a7c3e9d2f614'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # sync_database_schema puede haber añadido ya la columna al arrancar (pero no el índice único)
+    inspector = sa.inspect(op.get_bind())
+    if 'client_key' not in {c['name'] for c in inspector.get_columns('workout_logs')}:
+        op.add_column('workout_logs', sa.Column('client_key', sa.String(64), nullable=True))
+    # En MySQL las restricciones UNIQUE aparecen también como índices
+    if 'uq_logs_session_client_key' not in {ix['name'] for ix in inspector.get_indexes('workout_logs')}:
+        op.create_unique_constraint('uq_logs_session_client_key', 'workout_logs', ['session_id', 'client_key'])
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'uq_logs_session_client_key' in {ix['name'] for ix in inspector.get_indexes('workout_logs')}:
+        op.drop_constraint('uq_logs_session_client_key', 'workout_logs', type_='unique')
+    if 'client_key' in {c['name'] for c in inspector.get_columns('workout_logs')}:
+        op.drop_column('workout_logs', 'client_key')
@@ -0,0 +1,67 @@
+"""Resumen por sesión (total_volume, set_count, exercise_count, duration_seconds)
+
+Revision ID: f1a6c8e2d397
+Revises: c5d8a3e7b149
+Create Date: 2026-10-19 01:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a6c8e2d397'
+down_revision = 'c5d8a3e7b149'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 5000
+
+COLUMNS = [
+    ('total_volume', sa.Float()),
+    ('set_count', sa.Integer()),
+    ('exercise_count', sa.Integer()),
+    ('duration_seconds', sa.Integer()),
+]
+
+
+def _columns():
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns('workout_sessions')}
+
+
+def upgrade():
+    # sync_database_schema puede haber añadido ya las columnas al arrancar
+    existing = _columns()
+    for name, type_ in COLUMNS:
+        if name not in existing:
+            op.add_column('workout_sessions', sa.Column(name, type_, nullable=True))
+
+    # Relleno por rangos de id de las sesiones finalizadas. Las archivadas ya no tienen series en la
+    # tabla: las resume desde sus .npz `flask analytics backfill-session-summaries`
+    bind = op.get_bind()
+    first_id, last_id = bind.execute(sa.text(
+        "SELECT MIN(id), MAX(id) FROM workout_sessions "
+        "WHERE set_count IS NULL AND end_time IS NOT NULL AND archived = 0"
+    )).fetchone()
+    if first_id is not None:
+        for low in range(first_id, last_id + 1, BATCH_SIZE):
+            bind.execute(sa.text(
+                "UPDATE workout_sessions s LEFT JOIN ("
+                "  SELECT session_id, SUM(COALESCE(weight, 0) * COALESCE(reps, 0)) AS volume,"
+                "         COUNT(*) AS sets, COUNT(DISTINCT exercise_id) AS exercises"
+                "  FROM workout_logs WHERE session_id BETWEEN :low AND :high GROUP BY session_id"
+                ") a ON a.session_id = s.id "
+                "SET s.total_volume = COALESCE(a.volume, 0), s.set_count = COALESCE(a.sets, 0), "
+                "    s.exercise_count = COALESCE(a.exercises, 0), "
+                "    s.duration_seconds = GREATEST(TIMESTAMPDIFF(SECOND, s.start_time, s.end_time), 0) "
+                "WHERE s.set_count IS NULL AND s.end_time IS NOT NULL AND s.archived = 0 "
+                "AND s.id BETWEEN :low AND :high"
+            ), {'low': low, 'high': low + BATCH_SIZE - 1})
+
+
+def downgrade():
+    existing = _columns()
+    for name, _ in reversed(COLUMNS):
+        if name in existing:
+            op.drop_column('workout_sessions', name)
@@ -0,0 +1,87 @@
+"""
+Fixtures comunes: una aplicación sobre SQLite en un fichero temporal, con los ejercicios
+mínimos, un helper para registrar usuarios y obtener su cabecera JWT y otro para registrar
+sesiones con sus series.
+"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db  # noqa: E402
+from app.config import Config  # noqa: E402
+
+
+@event.listens_for(Engine, 'connect')
+def _mysql_functions(connection, record):
+    # Funciones de MySQL que usan algunas consultas agregadas y SQLite no trae
+    if hasattr(connection, 'create_function'):
+        connection.create_function('greatest', -1, lambda *a: max(a))
+        connection.create_function('year', 1, lambda d: int(str(d)[:4]) if d else None)
+        connection.create_function('week', 1, lambda d: int(datetime.fromisoformat(str(d)).strftime('%U')) if d else None)
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        TESTING = True
+        REPORTS_CACHE_DIR = str(tmp_path / 'reports')
+        LOG_ARCHIVE_DIR = str(tmp_path / 'archive')
+        COMMUNITY_CACHE_ENABLED = False
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        from app.models import Exercise
+        db.create_all()
+        for name, group in [('Press Banca', 'Pecho'), ('Sentadilla', 'Piernas'), ('Remo', 'Espalda')]:
+            db.session.add(Exercise(name=name, muscle_group=group))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def register(client):
+    """register('ana') -> cabeceras con el token del usuario recién creado."""
+    def _register(username, password='secreto'):
+        client.post('/api/auth/register', json={
+            'username': username, 'email': f'{username}@example.com', 'password': password
+        })
+        token = client.post('/api/auth/login', json={'username': username, 'password': password}).json['access_token']
+        return {'Authorization': f'Bearer {token}'}
+    return _register
+
+
+@pytest.fixture
+def log_session(client):
+    """
+    log_session(headers, [(ejercicio, peso, reps), ...]) -> id de una sesión nueva con esas
+    series (numeradas por ejercicio), finalizada salvo con finish=False.
+    """
+    def _log_session(headers, sets=(), finish=True):
+        session_id = client.post('/api/workouts/sessions', json={}, headers=headers).json['id']
+        set_numbers = {}
+        for exercise_id, weight, reps in sets:
+            set_numbers[exercise_id] = set_numbers.get(exercise_id, 0) + 1
+            client.post('/api/workouts/logs', json={
+                'session_id': session_id, 'exercise_id': exercise_id, 'set_number': set_numbers[exercise_id],
+                'weight': weight, 'reps': reps
+            }, headers=headers)
+        if finish:
+            client.post(f'/api/workouts/sessions/{session_id}/finish', headers=headers)
+        return session_id
+    return _log_session
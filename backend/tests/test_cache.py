@@ -0,0 +1,99 @@
+import threading
+import time
+
+from app import db
+from app.models import ShopItem
+from app.utils.cache import SnapshotCache
+
+
+def test_concurrent_misses_compute_once(app):
+    app.config['COMMUNITY_CACHE_ENABLED'] = True
+    cache = SnapshotCache('test')
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'feed'
+
+    results = []
+
+    def request():
+        with app.app_context():
+            results.append(cache.get_or_compute('feed:', compute))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    # Que todas lleguen mientras la primera sigue calculando
+    deadline = time.monotonic() + 5
+    while cache.coalesced < len(threads) - 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ['feed'] * len(threads)
+    assert len(calls) == 1
+    assert (cache.misses, cache.coalesced) == (len(threads), len(threads) - 1)
+
+
+def test_expired_snapshot_is_served_while_revalidating(app):
+    app.config.update(COMMUNITY_CACHE_ENABLED=True, COMMUNITY_CACHE_TTL=0, COMMUNITY_CACHE_STALE_SECONDS=60)
+    cache = SnapshotCache('test')
+    versions = iter(['v1', 'v2', 'v3'])
+    revalidated = threading.Event()
+
+    def compute():
+        value = next(versions)
+        if value == 'v2':
+            revalidated.set()
+        return value
+
+    with app.app_context():
+        assert cache.get_or_compute('feed:', compute) == 'v1'
+        # Caducada pero dentro del margen: se sirve la anterior y se recalcula en segundo plano
+        assert cache.get_or_compute('feed:', compute) == 'v1'
+        assert revalidated.wait(5)
+        deadline = time.monotonic() + 5
+        while cache._flights and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert cache.get_or_compute('feed:', compute) == 'v2'
+    assert cache.stale == 2
+
+
+def test_snapshot_invalidated_while_computing_is_not_stored(app):
+    app.config['COMMUNITY_CACHE_ENABLED'] = True
+    cache = SnapshotCache('test')
+    calls = []
+
+    def compute():
+        calls.append(1)
+        if len(calls) == 1:
+            # Una escritura confirma e invalida mientras se calcula con los datos de antes
+            cache.invalidate('feed')
+            return 'antes'
+        return 'después'
+
+    with app.app_context():
+        assert cache.get_or_compute('feed:', compute) == 'antes'
+        assert cache.get_or_compute('feed:', compute) == 'después'
+        assert cache.get_or_compute('feed:', compute) == 'después'
+    assert len(calls) == 2
+
+
+def test_title_purchase_refreshes_public_profile(app, client, register):
+    app.config['COMMUNITY_CACHE_ENABLED'] = True
+    headers = register('ana')
+    with app.app_context():
+        item = ShopItem(name='Leyenda', item_type='title', value='Leyenda', price=0)
+        db.session.add(item)
+        db.session.commit()
+        item_id = item.id
+    user_id = client.get('/api/profile', headers=headers).json['id']
+
+    assert client.get(f'/api/community/users/{user_id}', headers=headers).json['title'] != 'Leyenda'
+    client.post(f'/api/profile/shop/purchase/{item_id}', headers=headers)
+
+    assert client.get(f'/api/community/users/{user_id}', headers=headers).json['title'] == 'Leyenda'
@@ -0,0 +1,55 @@
+from app import db
+from app.models import CohortBin, CohortSample, User
+from app.utils import cohorts
+
+
+def _bins():
+    return {
+        (b.exercise_id, b.level_band, b.weight_class, b.bin): b.count
+        for b in CohortBin.query.filter(CohortBin.count > 0)
+    }
+
+
+def test_incremental_bins_match_rebuild(app, client, register, log_session):
+    for name, weight, bodyweight in [('ana', 100, 80), ('bea', 120, 82), ('carla', 60, 85)]:
+        headers = register(name)
+        client.post('/api/profile/body-metrics', json={'weight': bodyweight}, headers=headers)
+        log_session(headers, [(1, weight, 1)], finish=False)
+        # Batir el récord mueve la muestra de cubeta
+        log_session(headers, [(1, weight + 10, 1)], finish=False)
+
+    with app.app_context():
+        incremental = _bins()
+        cohorts.rebuild_cohort_histograms()
+        assert _bins() == incremental
+        assert sum(incremental.values()) == 3
+
+
+def test_bodyweight_change_moves_samples_to_new_cohort(app, client, register, log_session):
+    headers = register('ana')
+    client.post('/api/profile/body-metrics', json={'weight': 65, 'date': '2026-01-01'}, headers=headers)
+    log_session(headers, [(1, 100, 1)], finish=False)
+
+    client.post('/api/profile/body-metrics', json={'weight': 95, 'date': '2026-02-01'}, headers=headers)
+
+    with app.app_context():
+        sample = CohortSample.query.one()
+        assert sample.weight_class == cohorts.weight_class(95)
+        assert _bins() == {(1, sample.level_band, sample.weight_class, cohorts._bin(sample.e1rm)): 1}
+
+
+def test_level_up_moves_samples_to_new_band(app, client, register, log_session):
+    headers = register('ana')
+    session_id = log_session(headers, [(1, 100, 1)], finish=False)
+    with app.app_context():
+        user = User.query.filter_by(username='ana').one()
+        # Justo por debajo del nivel 3, la primera franja distinta
+        user.xp = 399
+        db.session.commit()
+
+    client.post(f'/api/workouts/sessions/{session_id}/finish', headers=headers)
+
+    with app.app_context():
+        sample = CohortSample.query.one()
+        assert sample.level_band == cohorts.level_band(User.query.filter_by(username='ana').one().level) == 1
+        assert sum(_bins().values()) == 1
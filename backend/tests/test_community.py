@@ -0,0 +1,17 @@
+def test_search_users_matches_substring(client, register):
+    headers = register('ana')
+    register('marta_fit')
+    register('tomas')
+
+    response = client.get('/api/community/search-users', query_string={'q': 'ART'}, headers=headers)
+
+    assert response.status_code == 200
+    assert [u['username'] for u in response.json] == ['marta_fit']
+
+
+def test_search_users_excludes_current_user(client, register):
+    headers = register('martina')
+
+    response = client.get('/api/community/search-users', query_string={'q': 'mart'}, headers=headers)
+
+    assert response.json == []
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from app import db
+from app.models import WorkoutSession
+
+
+def test_archived_sessions_get_summary_from_archive(app, register, log_session):
+    headers = register('ana')
+    session_id = log_session(headers, [(1, 100, 5), (1, 100, 3), (2, None, 10)])
+
+    with app.app_context():
+        session = db.session.get(WorkoutSession, session_id)
+        session.start_time -= timedelta(days=500)
+        session.end_time = session.start_time + timedelta(minutes=45)
+        db.session.commit()
+        from app.utils.archive import archive_old_logs
+        archive_old_logs()
+        # Sesión archivada antes de que existieran las columnas de resumen
+        WorkoutSession.query.filter_by(id=session_id).update({
+            'total_volume': None, 'set_count': None, 'exercise_count': None, 'duration_seconds': None
+        })
+        db.session.commit()
+
+        from app.utils.db_sync import backfill_archived_summaries
+        assert backfill_archived_summaries() == 1
+        assert backfill_archived_summaries() == 0
+
+        session = db.session.get(WorkoutSession, session_id)
+        assert session.archived
+        assert (session.total_volume, session.set_count, session.exercise_count, session.duration_seconds) == (800, 3, 2, 2700)
@@ -0,0 +1,26 @@
+import numpy as np
+
+from app.utils.downsampling import lttb
+
+
+def test_lttb_keeps_endpoints_and_threshold_points():
+    x = np.arange(1000)
+    y = np.sin(x / 25.0)
+
+    selected = lttb(x, y, 50)
+
+    assert len(selected) == 50
+    assert (selected[0], selected[-1]) == (0, 999)
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_keeps_isolated_peak():
+    y = np.zeros(300)
+    y[137] = 100
+
+    assert 137 in lttb(np.arange(300), y, 20)
+
+
+def test_lttb_returns_everything_when_nothing_to_reduce():
+    assert list(lttb([0, 1, 2, 3], [5, 1, 4, 2], 10)) == [0, 1, 2, 3]
+    assert list(lttb([0, 1, 2, 3], [5, 1, 4, 2], 2)) == [0, 1, 2, 3]
@@ -0,0 +1,188 @@
+import time
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Achievement, UserAchievement, User, PendingAchievementEvent, Notification
+from app.utils import gamification
+from app.utils import notifications
+from app.utils.notifications import run_pending_event, defer_achievement_event
+
+
+def _achievement(name='Primer paso', category='sessions', value=1, xp=50, coins=5):
+    ach = Achievement(name=name, category=category, requirement_value=value, xp_reward=xp, coins_reward=coins)
+    db.session.add(ach)
+    db.session.commit()
+    gamification.reset_rules_cache()
+    return ach
+
+
+def test_achievement_reward_paid_once(app, register):
+    register('ana')
+    with app.app_context():
+        ach = _achievement()
+        user = User.query.filter_by(username='ana').one()
+        xp, coins = user.xp or 0, user.coins or 0
+
+        first = gamification._evaluate(user.id, ['level'], {'level': 5})
+        second = gamification._evaluate(user.id, ['level'], {'level': 5})
+        assert first == [] and second == []
+
+        first = gamification._evaluate(user.id, ['sessions'], {'sessions': 1})
+        assert [a['id'] for a in first] == [ach.id]
+        # Otro hilo que llegó tarde y no vio la fila al consultar: la clave única lo salta
+        db.session.query(UserAchievement).filter_by(user_id=user.id).delete()
+        db.session.execute(UserAchievement.__table__.insert(), {'user_id': user.id, 'achievement_id': ach.id})
+        db.session.commit()
+        assert gamification._evaluate(user.id, ['sessions'], {'sessions': 1}) == []
+
+        user = db.session.get(User, user.id)
+        assert user.coins == coins + 5
+        assert user.xp >= xp + 50
+        assert UserAchievement.query.filter_by(user_id=user.id).count() == 1
+        assert Notification.query.filter_by(user_id=user.id, kind='achievement').count() == 1
+
+
+def test_pending_event_survives_until_evaluated(app, register):
+    register('ana')
+    with app.app_context():
+        ach = _achievement()
+        user = User.query.filter_by(username='ana').one()
+        pending = PendingAchievementEvent(user_id=user.id, event='session_finished', values={'sessions': 1})
+        db.session.add(pending)
+        db.session.commit()
+        pending_id = pending.id
+
+        # Si dos hilos recogen el mismo evento (p. ej. recuperado tras un reinicio) basta con uno
+        run_pending_event(pending_id)
+        run_pending_event(pending_id)
+
+        assert PendingAchievementEvent.query.count() == 0
+        assert [row.achievement_id for row in UserAchievement.query.filter_by(user_id=user.id)] == [ach.id]
+
+
+def test_stale_events_swept_while_enqueuing(app, register, monkeypatch):
+    register('ana')
+    monkeypatch.setattr(notifications, '_last_sweep', None)
+    with app.app_context():
+        ach = _achievement()
+        user = User.query.filter_by(username='ana').one()
+        # Evento que otro proceso dejó sin evaluar hace rato
+        db.session.add(PendingAchievementEvent(
+            user_id=user.id, event='session_finished', values={'sessions': 1},
+            created_at=datetime.utcnow() - timedelta(seconds=notifications.STALE_EVENT_SECONDS + 60)
+        ))
+        db.session.commit()
+
+        defer_achievement_event(user.id, 'session_finished', sessions=0)
+        deadline = time.monotonic() + 5
+        while PendingAchievementEvent.query.count() and time.monotonic() < deadline:
+            db.session.rollback()
+            time.sleep(0.05)
+
+        assert PendingAchievementEvent.query.count() == 0
+        assert [row.achievement_id for row in UserAchievement.query.filter_by(user_id=user.id)] == [ach.id]
+        # Hasta que pase el intervalo, encolar no vuelve a revisar
+        assert not notifications._sweep_due()
+
+
+def test_history_categories(app, client, register, log_session):
+    headers = register('ana')
+    coach_headers = register('coach')
+    with app.app_context():
+        from app.models import Exercise, Routine
+        db.session.add(Exercise(name='Cinta', muscle_group='Cardio'))
+        db.session.add(Exercise(name='Bici', muscle_group='Cardio'))
+        author = User.query.filter_by(username='ana').one()
+        coach = User.query.filter_by(username='coach').one()
+        coach.role = 'trainer'
+        db.session.add(Routine(user_id=author.id, name='Full body', is_public=True))
+        db.session.commit()
+        ana_id, coach_id = author.id, coach.id
+        routine_id = Routine.query.one().id
+
+    # Dos sesiones: 600 kg y 500 kg; la segunda con dos ejercicios de cardio
+    log_session(headers, [(1, 100, 6)])
+    log_session(headers, [(2, 100, 5), (4, 0, 20), (5, 0, 20)])
+    # Un coach asigna a ana una rutina que escribió ella misma
+    client.post(f'/api/admin/coach/client/{ana_id}/assign-routine', json={'routine_id': routine_id}, headers=coach_headers)
+
+    with app.app_context():
+        history = {category: resolve([ana_id, coach_id]) for category, resolve in gamification.HISTORY_VALUES.items()}
+        assert history['volume'].get(ana_id) == 600
+        assert history['volume_total'].get(ana_id) == 1100
+        assert history['cardio'].get(ana_id) == 1
+        assert history['coach'].get(coach_id) == 1
+        assert history['coach'].get(ana_id) is None
+
+
+def test_recompute_keeps_xp_and_streak_with_incomplete_history(app, client, register, log_session):
+    from datetime import timedelta
+    from app.models import WorkoutSession, TrainingCalendar, XpEvent
+    from app.utils.archive import archive_old_logs
+    from app.utils.recompute import run_recompute
+
+    headers = register('ana')
+    archived_id = log_session(headers, [(1, 100, 5), (2, 80, 5)])
+    with app.app_context():
+        # Sesión de hace 500 días, archivada antes de existir el resumen
+        session = db.session.get(WorkoutSession, archived_id)
+        session.start_time -= timedelta(days=500)
+        session.end_time -= timedelta(days=500)
+        db.session.commit()
+        archive_old_logs()
+        WorkoutSession.query.filter_by(id=archived_id).update({
+            'total_volume': None, 'set_count': None, 'exercise_count': None, 'duration_seconds': None
+        })
+        # El calendario tampoco la recoge
+        TrainingCalendar.query.delete()
+        user = User.query.filter_by(username='ana').one()
+        user.xp_booster_sessions, user.xp_booster_multiplier = 1, 3.0
+        db.session.commit()
+
+    # Sesión con potenciador anterior a xp_multiplier: la XP ganada no se puede recalcular
+    boosted_id = log_session(headers, [(1, 100, 10)])
+    with app.app_context():
+        WorkoutSession.query.filter_by(id=boosted_id).update({'xp_multiplier': None})
+        user = User.query.filter_by(username='ana').one()
+        user.longest_streak = 9
+        db.session.commit()
+        before = (user.xp, user.level, user.coins)
+
+        run_recompute(workers=1)
+
+        user = db.session.get(User, user.id)
+        assert (user.xp, user.level) >= before[:2]
+        assert user.longest_streak == 9
+        assert XpEvent.query.filter(XpEvent.source == 'recompute', XpEvent.amount < 0).count() == 0
+        assert db.session.get(WorkoutSession, archived_id).set_count == 2
+        assert TrainingCalendar.query.filter_by(user_id=user.id).count() == 2
+
+
+def test_achievement_reward_levels_up(app, register):
+    register('ana')
+    with app.app_context():
+        _achievement(xp=500, coins=5)
+        user = User.query.filter_by(username='ana').one()
+        assert (user.level or 1) == 1
+
+        gamification._evaluate(user.id, ['sessions'], {'sessions': 1})
+
+        user = db.session.get(User, user.id)
+        assert user.level == User.level_for_xp(user.xp) == 3
+        assert user.coins == 5 + 2 * 10
+
+
+def test_recompute_pays_only_achievements_it_inserts(app, register, monkeypatch):
+    register('ana')
+    with app.app_context():
+        _achievement(value=0, xp=0, coins=5)
+        user = User.query.filter_by(username='ana').one()
+        user_id, coins = user.id, user.coins or 0
+
+        # Un evento en diferido lo inserta (y lo paga) entre la lectura de logros y la escritura
+        monkeypatch.setattr(gamification, 'insert_ignore', lambda model, rows, conflict: 0)
+        _, unlocked = gamification.recompute_users([user_id])
+
+        assert unlocked == 0
+        assert (db.session.get(User, user_id).coins or 0) == coins
+        assert Notification.query.filter_by(user_id=user_id, kind='achievement').count() == 0
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from app import db
+from app.models import WorkoutSession, WorkoutLog
+
+
+def _move_back(session_id, days):
+    session = db.session.get(WorkoutSession, session_id)
+    delta = timedelta(days=days)
+    session.start_time -= delta
+    if session.end_time:
+        session.end_time -= delta
+    for log in WorkoutLog.query.filter_by(session_id=session_id):
+        log.timestamp -= delta
+        log.training_date = session.start_time.date()
+    db.session.commit()
+
+
+def test_export_interleaves_live_and_archived_sets(app, client, register, log_session):
+    headers = register('ana')
+    archived = log_session(headers, [(1, 100, 5)])
+    unfinished = log_session(headers, [(1, 60, 5)], finish=False)
+    log_session(headers, [(1, 80, 5)])
+
+    with app.app_context():
+        _move_back(archived, 500)
+        # Más antigua que la archivada, pero sin finalizar: sigue en workout_logs
+        _move_back(unfinished, 600)
+        from app.utils.archive import archive_old_logs
+        assert archive_old_logs()[1] == 1
+
+    lines = client.get('/api/analytics/export-csv', headers=headers).data.decode().strip().splitlines()
+
+    assert [line.split(',')[3] for line in lines[1:]] == ['80.0', '100.0', '60.0']
+
+
+def test_export_stream_runs_no_queries_after_it_starts(app, client, register, log_session):
+    headers = register('ana')
+    archived = log_session(headers, [(1, 100, 5)])
+    for i in range(5):
+        log_session(headers, [(1, 50 + i, 5)])
+
+    with app.app_context():
+        _move_back(archived, 500)
+        from app.utils.archive import archive_old_logs
+        assert archive_old_logs()[1] == 1
+
+        from sqlalchemy import event
+        from app.utils.history import history_rows
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        rows = history_rows(db.session.query(WorkoutSession.user_id).first()[0], batch_size=2)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            first = next(rows)
+            # En MySQL cualquier consulta con el streaming abierto se come el resto de sus filas
+            opened = len(statements)
+            rest = list(rows)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert len(statements) == opened == 1
+    assert [row.weight for row in [first] + rest] == [54, 53, 52, 51, 50, 100]
@@ -0,0 +1,95 @@
+import random
+from datetime import datetime
+
+from app import db
+from app.models import User, XpEvent
+from app.utils.leaderboard import Leaderboard, SortedSet, prune_xp_events
+
+
+def _event(user_id, amount, source, created_at=None):
+    db.session.add(XpEvent(user_id=user_id, amount=amount, source=source, created_at=created_at or datetime.utcnow()))
+
+
+def _check_ranks(board, scores):
+    expected = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    assert board.zcard() == len(expected)
+    assert board.zrevrange(0, len(expected)) == expected
+    for rank, (member, _) in enumerate(expected):
+        assert board.zrevrank(member) == rank
+    for start in range(0, len(expected), 7):
+        assert board.zrevrange(start, start + 4) == expected[start:start + 5]
+
+
+def test_sorted_set_ranks_match_sorted_after_random_updates():
+    rng = random.Random(7)
+    board, scores = SortedSet(), {}
+    for step in range(2000):
+        member = rng.randint(1, 150)
+        roll = rng.random()
+        if roll < 0.5:
+            scores[member] = rng.randint(0, 60)
+            board.zadd(member, scores[member])
+        elif roll < 0.8:
+            amount = rng.randint(-10, 30)
+            scores[member] = scores.get(member, 0) + amount
+            board.zincrby(member, amount)
+        else:
+            scores.pop(member, None)
+            board.zrem(member)
+        if step % 100 == 0:
+            _check_ranks(board, scores)
+    _check_ranks(board, scores)
+    assert board.zrevrank(10 ** 6) is None
+
+
+def test_sorted_set_bulk_build_matches_inserts():
+    rng = random.Random(11)
+    scores = {member: rng.randint(0, 40) for member in rng.sample(range(1, 10 ** 4), 500)}
+    board = SortedSet.from_items(scores.items())
+    _check_ranks(board, scores)
+
+    # Tras construirla de una vez, sigue admitiendo altas, cambios y bajas
+    for member in rng.sample(sorted(scores), 200):
+        board.zrem(member)
+        del scores[member]
+    for member in range(1, 50):
+        board.zincrby(member, 5)
+        scores[member] = scores.get(member, 0) + 5
+    _check_ranks(board, scores)
+    assert SortedSet.from_items([]).zcard() == 0
+
+
+def test_recompute_corrections_only_count_in_all_board(app, register):
+    register('ana')
+    register('ben')
+    with app.app_context():
+        app.config['LEADERBOARD_REFRESH_SECONDS'] = 0
+        ana, ben = (User.query.filter_by(username=name).one() for name in ('ana', 'ben'))
+        ana.xp, ben.xp = 1000, 100
+        _event(ana.id, 1000, 'recompute')
+        _event(ben.id, 100, 'session')
+        db.session.commit()
+
+        board = Leaderboard()
+        assert [(user_id, xp) for _, user_id, xp in board.top('all', 10)] == [(ana.id, 1000), (ben.id, 100)]
+        assert [(user_id, xp) for _, user_id, xp in board.top('week', 10)] == [(ben.id, 100)]
+
+        # Corrección aplicada después de construir la clasificación
+        _event(ben.id, 5000, 'recompute')
+        db.session.commit()
+        assert [(user_id, xp) for _, user_id, xp in board.top('month', 10)] == [(ben.id, 100)]
+        assert board.top('all', 1)[0][1:] == (ben.id, 5100)
+
+
+def test_prune_keeps_current_week_and_month(app, register):
+    register('ana')
+    with app.app_context():
+        user_id = User.query.filter_by(username='ana').one().id
+        now = datetime(2026, 10, 1, 12)  # Jueves: la semana empezó el mes anterior
+        _event(user_id, 10, 'session', datetime(2026, 8, 20))
+        _event(user_id, 20, 'session', datetime(2026, 9, 28, 9))
+        _event(user_id, 30, 'session', datetime(2026, 10, 1, 8))
+        db.session.commit()
+
+        assert prune_xp_events(now) == 1
+        assert sorted(e.amount for e in XpEvent.query) == [20, 30]
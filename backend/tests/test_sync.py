@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import WorkoutSession, WorkoutLog
+
+
+def test_pull_after_archiving_reports_moved_logs(app, client, register, log_session):
+    headers = register('ana')
+    session_id = log_session(headers, [(1, 100, 5), (1, 100, 5)])
+
+    with app.app_context():
+        session = db.session.get(WorkoutSession, session_id)
+        session.start_time -= timedelta(days=500)
+        session.end_time -= timedelta(days=500)
+        log_ids = sorted(log.id for log in WorkoutLog.query)
+        db.session.commit()
+        since = datetime.utcnow()
+        from app.utils.archive import archive_old_logs
+        archive_old_logs()
+
+    pulled = client.get('/api/sync/pull', query_string={'since': since.isoformat()}, headers=headers).json
+
+    assert [(s['id'], s['archived']) for s in pulled['sessions']] == [(session_id, True)]
+    assert sorted(pulled['deleted']['log']) == log_ids
+
+
+def test_push_conflict_rules(app, client, register):
+    headers = register('ana')
+
+    def push(*mutations):
+        response = client.post('/api/sync/push', json={'mutations': list(mutations)}, headers=headers)
+        assert response.status_code == 200
+        return [result['status'] for result in response.json['results']], response.json['results']
+
+    start = {'type': 'session.start', 'client_key': 's1'}
+    log = {'type': 'log.create', 'client_key': 'l1', 'session_key': 's1', 'exercise_id': 1, 'set_number': 1, 'weight': 100, 'reps': 5}
+    finish = {'type': 'session.finish', 'session_key': 's1'}
+    statuses, _ = push(start, log, finish, {'type': 'session.delete'}, {'type': 'log.create', 'client_key': 'l2', 'session_key': 'nada'})
+    assert statuses == ['applied', 'applied', 'applied', 'rejected', 'rejected']
+
+    # Reenviar la cola entera no duplica nada ni vuelve a dar XP
+    statuses, _ = push(start, log, finish)
+    assert statuses == ['duplicate', 'duplicate', 'duplicate']
+
+    with app.app_context():
+        WorkoutSession.query.update({'archived': True})
+        db.session.commit()
+    statuses, _ = push({**log, 'client_key': 'l3', 'set_number': 2})
+    assert statuses == ['conflict']
+
+    # Medidas: gana el servidor si cambiaron después de la versión que vio el cliente
+    metric = {'type': 'body_metric.upsert', 'date': '2026-01-05', 'weight': 80}
+    statuses, results = push(metric)
+    assert statuses == ['applied']
+    statuses, results = push({**metric, 'weight': 79})
+    assert statuses == ['conflict'] and results[0]['server']['weight'] == 80
+    statuses, _ = push({**metric, 'weight': 79, 'base_updated_at': results[0]['server']['updated_at']})
+    assert statuses == ['applied']
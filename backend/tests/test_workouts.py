@@ -0,0 +1,121 @@
+from sqlalchemy import event, insert
+
+from app import db
+from app.models import WorkoutSession, WorkoutLog, DailyTrainingRollup
+
+
+def _sets(keys, exercise_id=1):
+    return [
+        {'client_key': key, 'exercise_id': exercise_id, 'set_number': i + 1, 'weight': 100, 'reps': 5}
+        for i, key in enumerate(keys)
+    ]
+
+
+def _day_total(session_id):
+    return DailyTrainingRollup.query.filter_by(exercise_id=DailyTrainingRollup.DAY_TOTAL).one().set_count
+
+
+def test_batch_resend_skips_known_keys(app, client, register, log_session):
+    headers = register('ana')
+    session_id = log_session(headers, finish=False)
+
+    first = client.post('/api/workouts/logs/batch', json={'session_id': session_id, 'sets': _sets(['a', 'b'])}, headers=headers)
+    again = client.post('/api/workouts/logs/batch', json={'session_id': session_id, 'sets': _sets(['a', 'b', 'c'])}, headers=headers)
+
+    assert (first.status_code, first.json['inserted']) == (201, 2)
+    assert (again.json['inserted'], again.json['duplicates']) == (1, 2)
+    with app.app_context():
+        assert WorkoutLog.query.count() == 3
+        assert _day_total(session_id) == 3
+
+
+def test_batch_rejects_unknown_exercise(app, client, register, log_session):
+    headers = register('ana')
+    session_id = log_session(headers, finish=False)
+
+    response = client.post('/api/workouts/logs/batch', json={'session_id': session_id, 'sets': _sets(['a'], exercise_id=999)}, headers=headers)
+
+    assert response.status_code == 400
+    with app.app_context():
+        assert WorkoutLog.query.count() == 0
+
+
+def test_batch_concurrent_duplicate_is_not_an_error(app, client, register, log_session):
+    headers = register('ana')
+    session_id = log_session(headers, finish=False)
+
+    with app.app_context():
+        engine = db.engine
+        user_id = db.session.get(WorkoutSession, session_id).user_id
+
+    raced = []
+
+    def concurrent_insert(conn, cursor, statement, parameters, context, executemany):
+        # Otro reintento del mismo lote confirma la clave 'a' justo antes de nuestro INSERT
+        if statement.startswith('INSERT INTO workout_logs') and not raced:
+            raced.append(True)
+            with engine.connect() as other:
+                other.execute(insert(WorkoutLog), [{
+                    'session_id': session_id, 'user_id': user_id, 'exercise_id': 1,
+                    'set_number': 1, 'weight': 100, 'reps': 5, 'client_key': 'a'
+                }])
+                other.commit()
+
+    event.listen(engine, 'before_cursor_execute', concurrent_insert)
+    try:
+        response = client.post('/api/workouts/logs/batch', json={'session_id': session_id, 'sets': _sets(['a', 'b'])}, headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', concurrent_insert)
+
+    assert response.status_code == 201
+    assert (response.json['inserted'], response.json['duplicates']) == (1, 1)
+    with app.app_context():
+        assert sorted(key for (key,) in db.session.query(WorkoutLog.client_key)) == ['a', 'b']
+
+
+def test_finished_session_detail_revalidates_after_edit(app, client, register, log_session):
+    headers = register('ana')
+    session_id = log_session(headers, finish=False)
+    client.post('/api/workouts/logs/batch', json={'session_id': session_id, 'sets': _sets(['a'])}, headers=headers)
+    client.post(f'/api/workouts/sessions/{session_id}/finish', headers=headers)
+
+    first = client.get(f'/api/workouts/sessions/{session_id}', headers=headers)
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    etag = first.headers['ETag']
+    cached = client.get(f'/api/workouts/sessions/{session_id}', headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304
+
+    # Serie añadida después de finalizar: el navegador revalida y recibe el detalle nuevo
+    client.post('/api/workouts/logs/batch', json={'session_id': session_id, 'sets': _sets(['b'])}, headers=headers)
+    edited = client.get(f'/api/workouts/sessions/{session_id}', headers={**headers, 'If-None-Match': etag})
+    assert edited.status_code == 200
+    assert edited.headers['ETag'] != etag
+    assert len(edited.json['exercises'][0]['sets']) == 2
+
+
+def test_session_history_pages_by_keyset(app, client, register, log_session):
+    headers = register('ana')
+    ids = [log_session(headers, finish=False) for _ in range(7)]
+    with app.app_context():
+        # Dos sesiones con el mismo inicio: las desempata el id
+        first, second = (db.session.get(WorkoutSession, session_id) for session_id in ids[2:4])
+        second.start_time = first.start_time
+        db.session.commit()
+        expected = [s.id for s in WorkoutSession.query.order_by(WorkoutSession.start_time.desc(), WorkoutSession.id.desc())]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {'limit': 3, 'include_total': '1'}
+        if cursor:
+            params['cursor'] = cursor
+        page = client.get('/api/workouts/sessions', query_string=params, headers=headers).json
+        seen += [s['id'] for s in page['sessions']]
+        assert page['total'] == 7
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == expected
+    assert pages == 3
+    assert client.get('/api/workouts/sessions', query_string={'cursor': 'no-es-un-cursor'}, headers=headers).status_code == 400
@@ -2,28 +2,45 @@ import React, { useEffect, useState } from 'react';
 import { analyticsApi } from '../../services/api';
 import { useAuth } from '../../context/AuthContext';
 
-interface DayData {
-    date: string;
-    session_count: number;
-}
-
 const DAYS_SHORT = ['L', 'M', 'X', 'J', 'V', 'S', 'D'];
 const MONTHS = ['Enero','Febrero','Marzo','Abril','Mayo','Junio','Julio','Agosto','Septiembre','Octubre','Noviembre','Diciembre'];
 
+interface CalendarYear {
+    year: number;
+    bitmap: string;
+}
+
+// Pasa los bitsets anuales (bit i = día del año i+1, LSB primero) a días entrenados (YYYY-MM-DD).
+// El bitset solo dice si se entrenó ese día, no cuántas sesiones hubo.
+const decodeBitmaps = (years: CalendarYear[]): string[] => {
+    const days: string[] = [];
+    years.forEach(({ year, bitmap }) => {
+        const bytes = atob(bitmap);
+        for (let i = 0; i < bytes.length * 8; i++) {
+            if (bytes.charCodeAt(i >> 3) & (1 << (i & 7))) {
+                const date = new Date(Date.UTC(year, 0, 1 + i));
+                if (date.getUTCFullYear() !== year) break;
+                days.push(date.toISOString().slice(0, 10));
+            }
+        }
+    });
+    return days;
+};
+
 const TrainingCalendar: React.FC = () => {
     const { user } = useAuth();
-    const [heatmapData, setHeatmapData] = useState<DayData[]>([]);
+    const [trainedDays, setTrainedDays] = useState<string[]>([]);
     const [loading, setLoading] = useState(true);
     const [currentDate, setCurrentDate] = useState(new Date());
 
     useEffect(() => {
-        analyticsApi.getHeatmap(365).then(r => {
-            setHeatmapData(r.data);
+        analyticsApi.getHeatmapBitmap(365).then(r => {
+            setTrainedDays(decodeBitmaps(r.data.years));
         }).catch(() => {}).finally(() => setLoading(false));
     }, []);
 
     // Build a Set of trained date strings for O(1) lookup
-    const trainedDates = new Set(heatmapData.map((d: DayData) => d.date?.slice(0, 10)));
+    const trainedDates = new Set(trainedDays);
 
     const year = currentDate.getFullYear();
     const month = currentDate.getMonth();
@@ -44,10 +61,8 @@ const TrainingCalendar: React.FC = () => {
         ? Math.floor((Date.now() - new Date(lastWorkout).getTime()) / 86400000)
         : null;
 
-    const sessionsThisMonth = heatmapData.filter(d => {
-        const date = new Date(d.date);
-        return date.getFullYear() === year && date.getMonth() === month;
-    }).length;
+    const monthPrefix = `${year}-${String(month + 1).padStart(2, '0')}-`;
+    const daysThisMonth = trainedDays.filter(d => d.startsWith(monthPrefix)).length;
 
     if (loading) return (
         <div className="flex justify-center py-16">
@@ -109,7 +124,7 @@ const TrainingCalendar: React.FC = () => {
                     </button>
                     <div className="text-center">
                         <h3 className="font-black text-slate-900 uppercase tracking-tight text-sm">{MONTHS[month]} {year}</h3>
-                        <p className="text-[9px] font-bold text-slate-400 uppercase tracking-[0.2em] mt-0.5">{sessionsThisMonth} sesiones</p>
+                        <p className="text-[9px] font-bold text-slate-400 uppercase tracking-[0.2em] mt-0.5">{daysThisMonth} días entrenados</p>
                     </div>
                     <button onClick={nextMonth} className="p-2 rounded-xl bg-slate-50 hover:bg-slate-100 transition-colors border border-slate-100">
                         <span className="material-icons-round text-slate-400">chevron_right</span>
@@ -149,7 +164,7 @@ const TrainingCalendar: React.FC = () => {
             <div className="grid grid-cols-3 gap-3">
                 {[
                     { label: 'Total', value: trainedDates.size, icon: 'fitness_center', color: 'bg-emerald-50 text-emerald-500' },
-                    { label: 'Mes', value: sessionsThisMonth, icon: 'calendar_today', color: 'bg-emerald-50 text-emerald-600' },
+                    { label: 'Mes', value: daysThisMonth, icon: 'calendar_today', color: 'bg-emerald-50 text-emerald-600' },
                     { label: 'Racha', value: user?.longest_streak ?? 0, icon: 'local_fire_department', color: 'bg-orange-50 text-orange-500' },
                 ].map(s => (
                     <div key={s.label} className="bg-white border border-slate-100 rounded-2xl p-3 text-center shadow-sm">
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { communityApi, BASE_URL } from '../../services/api';
+import { communityApi, BASE_URL, LeaderboardPeriod } from '../../services/api';
 import { Heart, Bookmark, BookmarkCheck, ChevronDown, ChevronUp, Users, Star, UserPlus, Search } from 'lucide-react';
 
 interface Author { id: number; username: string; level: number; avatar_icon: string; avatar_url: string | null; username_color: string; is_followed: boolean; }
@@ -370,6 +370,41 @@ const FriendsTab: React.FC = () => {
     );
 };
 
+// ── Fila de la clasificación ─────────────────────────────────────────────────
+const LeaderboardRow: React.FC<{ user: any }> = ({ user }) => {
+    const navigate = useNavigate();
+    return (
+        <div className={`flex items-center gap-4 p-4 rounded-[2rem] transition-all shadow-sm ${user.is_current_user ? 'bg-emerald-50 border-2 border-primary/20' : 'bg-white border border-slate-100'}`}>
+            <div className="flex-shrink-0 w-10 text-center">
+                {user.rank === 1 ? <div className="text-3xl filter drop-shadow-sm">🥇</div> : user.rank === 2 ? <div className="text-3xl filter drop-shadow-sm">🥈</div> : user.rank === 3 ? <div className="text-3xl filter drop-shadow-sm">🥉</div> : <span className="text-slate-300 font-black text-lg">#{user.rank}</span>}
+            </div>
+            <div className="w-14 h-14 rounded-2xl flex items-center justify-center shadow-inner overflow-hidden relative group"
+                style={{ background: user.avatar_url ? 'none' : `${user.username_color || '#10B981'}15`, border: `1px solid ${user.username_color || '#10B981'}30` }}>
+                {user.avatar_url ? (
+                    <img src={`${BASE_URL}${user.avatar_url}`} alt="" className="w-full h-full object-cover" />
+                ) : (
+                    <span className="material-icons-round text-3xl" style={{ color: user.username_color || '#10B981' }}>{user.avatar_icon}</span>
+                )}
+                <div className="absolute inset-0 bg-black/0 group-hover:bg-black/10 transition-colors" />
+            </div>
+            <div className="flex-1 min-w-0" onClick={() => navigate(`/user/${user.id}`)}>
+                <div className="flex items-center gap-2">
+                    <h3 className="font-black text-base truncate" style={{ color: user.username_color || '#1e293b' }}>{user.username}</h3>
+                    {(user.role === 'admin' || user.role === 'trainer') && (
+                        <span className="material-icons-round text-blue-500" style={{ fontSize: '14px' }}>verified</span>
+                    )}
+                    {user.is_current_user && <span className="px-2 py-0.5 rounded-full text-[8px] font-black bg-slate-900 text-white uppercase tracking-widest shadow-lg shadow-slate-900/20">Tú</span>}
+                </div>
+                <p className="text-[10px] text-slate-400 font-black uppercase tracking-widest truncate mt-1">Nv.{user.level} {user.title && `· ${user.title}`}</p>
+            </div>
+            <div className="text-right flex-shrink-0 bg-slate-50 px-3 py-2 rounded-xl border border-slate-100 shadow-inner min-w-[70px]">
+                <p className="text-base font-black text-slate-900 leading-none">{user.xp.toLocaleString()}</p>
+                <p className="text-[8px] uppercase text-slate-400 font-black tracking-widest mt-1">XP</p>
+            </div>
+        </div>
+    );
+};
+
 // ── CommunityPage ────────────────────────────────────────────────────────────
 const CommunityPage: React.FC = () => {
     const [routines, setRoutines] = useState<CommunityRoutine[]>([]);
@@ -377,13 +412,19 @@ const CommunityPage: React.FC = () => {
     const [loading, setLoading] = useState(true);
     const [search, setSearch] = useState('');
     const [activeTab, setActiveTab] = useState<'feed' | 'leaderboard' | 'friends'>('feed');
-    const navigate = useNavigate();
+    const [period, setPeriod] = useState<LeaderboardPeriod>('all');
+    const [myRank, setMyRank] = useState<{ rank: number | null; total: number; neighbours: any[] } | null>(null);
 
     useEffect(() => {
         if (activeTab === 'feed') { setLoading(true); communityApi.getFeed().then(r => setRoutines(r.data)).catch(() => {}).finally(() => setLoading(false)); }
-        else if (activeTab === 'leaderboard') { setLoading(true); communityApi.getLeaderboard().then(r => setLeaderboard(r.data)).catch(() => {}).finally(() => setLoading(false)); }
+        else if (activeTab === 'leaderboard') {
+            setLoading(true);
+            Promise.all([communityApi.getLeaderboard(period), communityApi.getMyRank(period)])
+                .then(([top, me]) => { setLeaderboard(top.data); setMyRank(me.data); })
+                .catch(() => {}).finally(() => setLoading(false));
+        }
         else setLoading(false);
-    }, [activeTab]);
+    }, [activeTab, period]);
 
     const handleUpdate = (id: number, patch: Partial<CommunityRoutine>) =>
         setRoutines(prev => prev.map(r => r.id === id ? { ...r, ...patch } : r));
@@ -402,6 +443,12 @@ const CommunityPage: React.FC = () => {
         { id: 'leaderboard', label: 'Top', icon: 'emoji_events' },
     ] as const;
 
+    const periods: { id: LeaderboardPeriod; label: string }[] = [
+        { id: 'all', label: 'Siempre' },
+        { id: 'month', label: 'Este mes' },
+        { id: 'week', label: 'Esta semana' },
+    ];
+
     return (
         <div className="min-h-screen pb-28 text-slate-900 bg-white relative overflow-hidden">
             {/* Orbs de fondo optimizados */}
@@ -458,36 +505,27 @@ const CommunityPage: React.FC = () => {
                     </>
                 ) : (
                     <div className="space-y-3">
-                        {leaderboard.map(user => (
-                            <div key={user.id} className={`flex items-center gap-4 p-4 rounded-[2rem] transition-all shadow-sm ${user.is_current_user ? 'bg-emerald-50 border-2 border-primary/20' : 'bg-white border border-slate-100'}`}>
-                                <div className="flex-shrink-0 w-10 text-center">
-                                    {user.rank === 1 ? <div className="text-3xl filter drop-shadow-sm">🥇</div> : user.rank === 2 ? <div className="text-3xl filter drop-shadow-sm">🥈</div> : user.rank === 3 ? <div className="text-3xl filter drop-shadow-sm">🥉</div> : <span className="text-slate-300 font-black text-lg">#{user.rank}</span>}
-                                </div>
-                                <div className="w-14 h-14 rounded-2xl flex items-center justify-center shadow-inner overflow-hidden relative group"
-                                    style={{ background: user.avatar_url ? 'none' : `${user.username_color || '#10B981'}15`, border: `1px solid ${user.username_color || '#10B981'}30` }}>
-                                    {user.avatar_url ? (
-                                        <img src={`${BASE_URL}${user.avatar_url}`} alt="" className="w-full h-full object-cover" />
-                                    ) : (
-                                        <span className="material-icons-round text-3xl" style={{ color: user.username_color || '#10B981' }}>{user.avatar_icon}</span>
-                                    )}
-                                    <div className="absolute inset-0 bg-black/0 group-hover:bg-black/10 transition-colors" />
-                                </div>
-                                <div className="flex-1 min-w-0" onClick={() => navigate(`/user/${user.id}`)}>
-                                    <div className="flex items-center gap-2">
-                                        <h3 className="font-black text-base truncate" style={{ color: user.username_color || '#1e293b' }}>{user.username}</h3>
-                                        {(user.role === 'admin' || user.role === 'trainer') && (
-                                            <span className="material-icons-round text-blue-500" style={{ fontSize: '14px' }}>verified</span>
-                                        )}
-                                        {user.is_current_user && <span className="px-2 py-0.5 rounded-full text-[8px] font-black bg-slate-900 text-white uppercase tracking-widest shadow-lg shadow-slate-900/20">Tú</span>}
-                                    </div>
-                                    <p className="text-[10px] text-slate-400 font-black uppercase tracking-widest truncate mt-1">Nv.{user.level} {user.title && `· ${user.title}`}</p>
-                                </div>
-                                <div className="text-right flex-shrink-0 bg-slate-50 px-3 py-2 rounded-xl border border-slate-100 shadow-inner min-w-[70px]">
-                                    <p className="text-base font-black text-slate-900 leading-none">{user.xp.toLocaleString()}</p>
-                                    <p className="text-[8px] uppercase text-slate-400 font-black tracking-widest mt-1">XP</p>
-                                </div>
+                        <div className="flex bg-slate-50 border border-slate-100 rounded-xl p-1 gap-1 shadow-sm">
+                            {periods.map(p => (
+                                <button key={p.id} onClick={() => setPeriod(p.id)}
+                                    className={`flex-1 py-1.5 font-black text-[9px] uppercase tracking-widest rounded-lg transition-all ${period === p.id ? 'bg-white text-slate-900 shadow-sm' : 'text-slate-400 hover:text-slate-600'}`}>
+                                    {p.label}
+                                </button>
+                            ))}
+                        </div>
+                        {leaderboard.length === 0 && (
+                            <div className="text-center py-16 bg-slate-50 rounded-2xl border border-dashed border-slate-200">
+                                <p className="text-slate-400 font-bold uppercase tracking-widest text-[10px]">Nadie ha ganado XP en este periodo</p>
                             </div>
-                        ))}
+                        )}
+                        {leaderboard.map(user => <LeaderboardRow key={user.id} user={user} />)}
+                        {/* Tu posición si no entras en el top */}
+                        {myRank?.rank && !leaderboard.some(u => u.is_current_user) && (
+                            <div className="pt-3 space-y-3">
+                                <p className="text-[10px] font-black text-slate-400 uppercase tracking-[0.2em] text-center">Tu posición · #{myRank.rank} de {myRank.total}</p>
+                                {myRank.neighbours.map((user: any) => <LeaderboardRow key={user.id} user={user} />)}
+                            </div>
+                        )}
                     </div>
                 )}
             </div>
@@ -12,8 +12,10 @@ const Dashboard: React.FC = () => {
     const navigate = useNavigate();
     const [stats, setStats] = useState<any>(null);
     const [prs, setPRs] = useState<any[]>([]);
+    const [weeklyVolume, setWeeklyVolume] = useState<any[] | null>(null);
     const [routines, setRoutines] = useState<any[]>([]);
     const [sessions, setSessions] = useState<any[]>([]);
+    const [sessionTotal, setSessionTotal] = useState(0);
     const [sessionFilterDays, setSessionFilterDays] = useState<number>(30);
     const [loading, setLoading] = useState(true);
 
@@ -23,18 +25,21 @@ const Dashboard: React.FC = () => {
 
     const loadDashboardData = async () => {
         try {
-            const [statsRes, prsRes, routinesRes, sessionsRes] = await Promise.all([
-                analyticsApi.getStatsSummary(),
-                analyticsApi.getPersonalRecords(),
+            // Los widgets de analítica llegan juntos en una sola petición
+            const [dashboardRes, routinesRes, sessionsRes] = await Promise.all([
+                analyticsApi.getDashboard(['stats-summary', 'personal-records', 'weekly-volume'], { weeks: 4 }),
                 routinesApi.getAll(),
-                workoutsApi.getSessions(sessionFilterDays),
+                workoutsApi.getSessions(sessionFilterDays, { limit: 5, include_total: 1 }),
             ]);
-            setStats(statsRes.data);
-            setPRs(prsRes.data.slice(0, 3));
+            setStats(dashboardRes.data['stats-summary']);
+            setPRs(dashboardRes.data['personal-records'].slice(0, 3));
+            setWeeklyVolume(dashboardRes.data['weekly-volume']);
             setRoutines(routinesRes.data);
-            setSessions(sessionsRes.data);
+            setSessions(sessionsRes.data.sessions);
+            setSessionTotal(sessionsRes.data.total);
         } catch (error) {
             console.error('Error loading dashboard:', error);
+            setWeeklyVolume([]);
         } finally {
             setLoading(false);
         }
@@ -43,8 +48,9 @@ const Dashboard: React.FC = () => {
     useEffect(() => {
         const fetchSessions = async () => {
             try {
-                const res = await workoutsApi.getSessions(sessionFilterDays);
-                setSessions(res.data);
+                const res = await workoutsApi.getSessions(sessionFilterDays, { limit: 5, include_total: 1 });
+                setSessions(res.data.sessions);
+                setSessionTotal(res.data.total);
             } catch (e) {
                 console.error(e);
             }
@@ -312,7 +318,7 @@ const Dashboard: React.FC = () => {
                         </button>
                     </div>
                     <div className="glass-card p-3 sm:p-4 overflow-hidden">
-                        <ProgressChart />
+                        <ProgressChart weeklyData={weeklyVolume} />
                     </div>
                 </motion.section>
 
@@ -409,12 +415,12 @@ const Dashboard: React.FC = () => {
                                         </div>
                                     );
                                 })}
-                                {sessions.length > 5 && (
+                                {sessionTotal > 5 && (
                                     <button 
                                         onClick={() => navigate('/analytics')}
                                         className="w-full mt-2 text-[11px] sm:text-xs font-semibold text-primary hover:text-primary-light transition-colors"
                                     >
-                                        Ver todas ({sessions.length})
+                                        Ver todas ({sessionTotal})
                                     </button>
                                 )}
                             </div>
@@ -1,43 +1,27 @@
-import React, { useEffect, useState } from 'react';
+import React, { useMemo } from 'react';
 import { LineChart, Line, XAxis, YAxis, Tooltip, ResponsiveContainer, CartesianGrid } from 'recharts';
-import { analyticsApi } from '../../services/api';
 
-const ProgressChart: React.FC = () => {
-    const [data, setData] = useState<any[]>([]);
-    const [loading, setLoading] = useState(true);
-    const [totalVolume, setTotalVolume] = useState(0);
-    const [trend, setTrend] = useState(0);
+interface ProgressChartProps {
+    // Volumen semanal ya cargado por el panel (widget weekly-volume de /analytics/dashboard)
+    weeklyData: any[] | null;
+}
 
-    useEffect(() => {
-        loadData();
-    }, []);
+const ProgressChart: React.FC<ProgressChartProps> = ({ weeklyData }) => {
+    const loading = weeklyData === null;
 
-    const loadData = async () => {
-        try {
-            const response = await analyticsApi.getWeeklyVolume(4);
-            const weeklyData = response.data;
-
-            if (weeklyData.length > 0) {
-                const total = weeklyData.reduce((sum: number, item: any) => sum + item.volume, 0);
-                setTotalVolume(total);
-
-                // Calcular tendencia (comparar última semana con promedio)
-                if (weeklyData.length >= 2) {
-                    const lastWeek = weeklyData[weeklyData.length - 1].volume;
-                    const previousWeeks = weeklyData.slice(0, -1);
-                    const average = previousWeeks.reduce((sum: number, item: any) => sum + item.volume, 0) / previousWeeks.length;
-                    const trendPercent = ((lastWeek - average) / average) * 100;
-                    setTrend(trendPercent);
-                }
-
-                setData(weeklyData);
-            }
-        } catch (error) {
-            console.error('Error loading chart data:', error);
-        } finally {
-            setLoading(false);
+    const { data, totalVolume, trend } = useMemo(() => {
+        const data = weeklyData || [];
+        const total = data.reduce((sum: number, item: any) => sum + item.volume, 0);
+        // Calcular tendencia (comparar última semana con promedio)
+        let trendPercent = 0;
+        if (data.length >= 2) {
+            const lastWeek = data[data.length - 1].volume;
+            const previousWeeks = data.slice(0, -1);
+            const average = previousWeeks.reduce((sum: number, item: any) => sum + item.volume, 0) / previousWeeks.length;
+            trendPercent = ((lastWeek - average) / average) * 100;
         }
-    };
+        return { data, totalVolume: total, trend: trendPercent };
+    }, [weeklyData]);
 
     if (loading) {
         return (
@@ -47,24 +47,53 @@ export const exercisesApi = {
     getAll: (muscleGroup?: string) => api.get('/exercises', { params: { muscle_group: muscleGroup } }),
 };
 
+// Sincronización offline: pull de cambios desde un cursor y push de la cola de mutaciones
+export const syncApi = {
+    pull: (since?: string) => api.get('/sync/pull', { params: { since } }),
+    push: (mutations: any[]) => api.post('/sync/push', { mutations }),
+};
+
 export const workoutsApi = {
-    getSessions: (days?: number) => api.get('/workouts/sessions', { params: { days } }),
+    // Paginado por cursor: la respuesta trae sessions y next_cursor (null en la última página)
+    getSessions: (days?: number, params: { limit?: number; cursor?: string; include_total?: number } = {}) =>
+        api.get('/workouts/sessions', { params: { days, ...params } }),
     getSessionDetail: (id: number) => api.get(`/workouts/sessions/${id}`),
     startSession: (routineId: number) => api.post('/workouts/sessions', { routine_id: routineId }),
     finishSession: (sessionId: number) => api.post(`/workouts/sessions/${sessionId}/finish`),
     logSet: (data: any) => api.post('/workouts/logs', data),
+    // Varias series en una petición; cada una lleva un client_key para que reenviar no duplique
+    logSetsBatch: (sessionId: number, sets: any[]) => api.post('/workouts/logs/batch', { session_id: sessionId, sets }),
 };
 
 export const analyticsApi = {
     getVolume: (days: number = 30) => api.get('/analytics/volume', { params: { days } }),
     getProgression: (exerciseId: number, days: number = 90) =>
         api.get(`/analytics/progression/${exerciseId}`, { params: { days } }),
+    // Varias series en una sola petición, reducidas en el servidor a maxPoints puntos cada una
+    getProgressionSeries: (exerciseIds: number[], days: number = 90, maxPoints: number = 200) =>
+        api.get('/analytics/progression', { params: { exercise_ids: exerciseIds.join(','), days, max_points: maxPoints } }),
     getPersonalRecords: () => api.get('/analytics/personal-records'),
     getHeatmap: (days: number = 365) => api.get('/analytics/heatmap', { params: { days } }),
+    // Bitset anual en base64 (bit i = día del año i+1, LSB primero) más rachas
+    getHeatmapBitmap: (days: number = 365) => api.get('/analytics/heatmap', { params: { days, format: 'bitmap' } }),
     getStatsSummary: () => api.get('/analytics/stats-summary'),
     getWeeklyVolume: (weeks: number = 12) => api.get('/analytics/weekly-volume', { params: { weeks } }),
+    getTrainingLoad: () => api.get('/analytics/load'),
+    getCohortPercentiles: () => api.get('/analytics/percentiles'),
+    getDashboard: (widgets?: string[], params: Record<string, number> = {}) =>
+        api.get('/analytics/dashboard', { params: { widgets: widgets?.join(','), ...params } }),
     exportCsv: () => api.get('/analytics/export-csv', { responseType: 'blob' }),
-    exportPdf: () => api.get('/analytics/export-pdf', { responseType: 'blob' }),
+    // El PDF se genera en segundo plano: encolar, consultar estado y descargar
+    exportPdf: async () => {
+        const { data: job } = await api.post('/analytics/reports/pdf');
+        let status = job;
+        while (status.status !== 'done') {
+            if (status.status === 'failed') throw new Error(status.error || 'Error generando el PDF');
+            await new Promise((resolve) => setTimeout(resolve, 1500));
+            status = (await api.get(`/analytics/reports/${job.job_id}`)).data;
+        }
+        return api.get(`/analytics/reports/${job.job_id}/download`, { responseType: 'blob' });
+    },
 };
 
 export const profileApi = {
@@ -73,6 +102,10 @@ export const profileApi = {
     getShopItems: () => api.get('/profile/shop'),
     purchaseItem: (itemId: number) => api.post(`/profile/shop/purchase/${itemId}`),
     getAchievements: () => api.get('/profile/achievements'),
+    // Avisos generados en segundo plano (logros desbloqueados al finalizar sesión)
+    getNotifications: (unreadOnly: boolean = false) =>
+        api.get('/profile/notifications', { params: unreadOnly ? { unread: 1 } : {} }),
+    markNotificationsRead: (ids?: number[]) => api.post('/profile/notifications/read', { ids }),
     getLevelRewards: () => api.get('/profile/level-rewards'),
     getBodyMetrics: () => api.get('/profile/body-metrics'),
     addBodyMetric: (data: any) => api.post('/profile/body-metrics', data),
@@ -81,12 +114,15 @@ export const profileApi = {
     }),
 };
 
+export type LeaderboardPeriod = 'all' | 'week' | 'month';
+
 export const communityApi = {
     getFeed: () => api.get('/community'),
     toggleLike: (routineId: number) => api.post(`/community/routines/${routineId}/like`),
     saveRoutine: (routineId: number) => api.post(`/community/routines/${routineId}/save`),
     getRoutineExercises: (routineId: number) => api.get(`/community/routines/${routineId}/exercises`),
-    getLeaderboard: () => api.get('/community/leaderboard'),
+    getLeaderboard: (period: LeaderboardPeriod = 'all') => api.get('/community/leaderboard', { params: { period } }),
+    getMyRank: (period: LeaderboardPeriod = 'all') => api.get('/community/leaderboard/me', { params: { period } }),
     toggleFollow: (userId: number) => api.post(`/community/users/${userId}/follow`),
     getUserProfile: (userId: number) => api.get(`/community/users/${userId}`),
     getReviews: (routineId: number) => api.get(`/community/routines/${routineId}/reviews`),